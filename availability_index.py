@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from range_availability import find_free_slots_range
+from slot_finder import find_free_slots
+from timeutil import local_time
+
+AVAILABILITY_PREFETCH_DAYS=getattr(Config, "AVAILABILITY_PREFETCH_DAYS", 5)
+AVAILABILITY_REFRESH_SECONDS=getattr(Config, "AVAILABILITY_REFRESH_SECONDS", 60)
+
+logger=logging.getLogger(__name__)
+
+class AvailabilityIndex:
+    # free/busy for the next few business days, refreshed in the background with one ranged query and
+    # kept parsed per day, so common questions are answered without the network. on periods parsed once
+    # per refresh find_free_slots is as fast as a day bitmap (bench_day_bitmap.py), so the lists are it
+    def __init__(self, calendar_service, business_days:int=AVAILABILITY_PREFETCH_DAYS,
+                refresh_seconds:float=AVAILABILITY_REFRESH_SECONDS, calendar_id:str='primary'):
+        self.calendar_service=calendar_service
+        self.business_days=business_days
+        self.refresh_seconds=refresh_seconds
+        self.calendar_id=calendar_id
+        self.local_time=local_time()
+        self.hits=0
+        self.misses=0
+        self.refreshed_at=None
+        self._busy_by_day={}
+        self._recorded=[]
+        self._task=None
+
+    def start(self):
+        if self._task is None:
+            self._task=asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task=None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("refresh failed: %s", e)
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def refresh(self):
+        started=time.monotonic()
+        days=self._business_days(self._now().date())
+        fetched=await self.calendar_service.refresh_free_busy([self.calendar_id], days[0], days[-1])
+        if self.calendar_id not in fetched:
+            # keep serving the previous snapshot until it goes stale
+            return
+        calendar_service=self.calendar_service.calendar_service
+        busy_by_day={
+            day:calendar_service._parse_busy_periods(fetched[self.calendar_id].get(day, []))
+            for day in days
+        }
+        # bookings made while the query was in flight may be missing from its answer
+        self._recorded=[entry for entry in self._recorded if entry[0] >=started]
+        for _, start_time, end_time in self._recorded:
+            if start_time.date() in busy_by_day:
+                busy_by_day[start_time.date()].append((start_time, end_time))
+        self._busy_by_day=busy_by_day
+        self.refreshed_at=time.monotonic()
+        logger.info("indexed %d business days from %s to %s", len(days), days[0], days[-1])
+
+    def lookup(self, start_time:datetime, end_time:datetime, duration_minutes:int=60,
+            step_minutes:int=60) -> Optional[List[Dict]]:
+        # None means the window isn't covered and the caller should query the calendar
+        day=start_time.date()
+        if not self._is_fresh() or day not in self._busy_by_day or end_time.date() !=day:
+            self.misses +=1
+            return None
+        self.hits +=1
+        now=self._now()
+        if start_time <=now:
+            start_time=(now + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+        return find_free_slots(
+            start_time, end_time, self._busy_by_day[day], now,
+            duration_minutes=duration_minutes, step_minutes=step_minutes
+        )
+
+    def lookup_range(self, start_time:datetime, end_time:datetime, duration_minutes:int=60,
+                    step_minutes:int=60) -> Optional[List[Dict]]:
+        # a span of days, answered only when every business day in it is indexed
+        days=[start_time.date() + timedelta(days=offset) for offset in range((end_time.date() - start_time.date()).days + 1)]
+        if not self._is_fresh() or any(day.weekday() < 5 and day not in self._busy_by_day for day in days):
+            self.misses +=1
+            return None
+        self.hits +=1
+        now=self._now()
+        if start_time <=now:
+            start_time=(now + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+        busy_periods=[period for day in days for period in self._busy_by_day.get(day, [])]
+        return find_free_slots_range(
+            start_time, end_time, busy_periods, now,
+            duration_minutes=duration_minutes, step_minutes=step_minutes
+        )
+
+    def busy_between(self, start_time:datetime, end_time:datetime) -> List[Tuple[datetime, datetime]]:
+        # the indexed busy periods behind a lookup that just succeeded, for ranking its slots
+        return [
+            period for day, periods in self._busy_by_day.items() if start_time.date() <=day <=end_time.date()
+            for period in periods
+        ]
+
+    def record_busy(self, start_time:datetime, end_time:datetime):
+        self._recorded.append((time.monotonic(), start_time, end_time))
+        day=start_time.date()
+        if day in self._busy_by_day:
+            self._busy_by_day[day].append((start_time, end_time))
+
+    def stats(self) -> Dict:
+        lookups=self.hits + self.misses
+        return {
+            "days":sorted(day.isoformat() for day in self._busy_by_day),
+            "fresh":self._is_fresh(),
+            "hits":self.hits,
+            "misses":self.misses,
+            "hit_rate":self.hits / lookups if lookups else 0.0
+        }
+
+    def _is_fresh(self) -> bool:
+        # a missed refresh or two is tolerated; after that the live path takes over
+        return self.refreshed_at is not None and time.monotonic() - self.refreshed_at < self.refresh_seconds * 2
+
+    def _business_days(self, first_day:date) -> List[date]:
+        days=[]
+        day=first_day
+        while len(days) < self.business_days:
+            if day.weekday() < 5:
+                days.append(day)
+            day +=timedelta(days=1)
+        return days
+
+    def _now(self) -> datetime:
+        return self.local_time.now()
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking_agent import BookingAgent
+from booking_journal import BookingJournal
+from calendar_backends import FakeCalendarBackend
+from calendar_service import AsyncCalendarService, CalendarService
+from config import Config
+from freebusy_cache import FreeBusyCache
+from session_store import MemorySessionStore
+
+def fake_calendar_service(latency:float) -> CalendarService:
+    service=CalendarService(backend=FakeCalendarBackend(pattern="empty", latency_ms=latency * 1000))
+    # every lookup pays the round trip; the per-day cache would hide the latency being measured
+    service.freebusy_cache=FreeBusyCache(ttl_seconds=0)
+    return service
+
+class BlockingCalendarService(AsyncCalendarService):
+    async def _run(self, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+async def timed_chat(agent:BookingAgent, session_id:str, arrived:float) -> float:
+    await agent.process_message("check my availability on monday", [], session_id=session_id)
+    return time.perf_counter() - arrived
+
+async def run_level(agent:BookingAgent, concurrency:int) -> List[float]:
+    # every chat arrives at once, so latency includes time spent queued behind other chats
+    arrived=time.perf_counter()
+    return await asyncio.gather(*[
+        timed_chat(agent, f"bench-{concurrency}-{i}", arrived) for i in range(concurrency)
+    ])
+
+def percentile(values:List[float], pct:float) -> float:
+    ordered=sorted(values)
+    index=min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def main():
+    parser=argparse.ArgumentParser(description="p50/p99 /chat latency with a slow fake calendar")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--workers", type=int, default=getattr(Config, "CALENDAR_EXECUTOR_WORKERS", 8))
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 100])
+    args=parser.parse_args()
+
+    fake=fake_calendar_service(args.latency_ms / 1000)
+    modes={
+        "blocking":BookingAgent(
+            calendar_service=BlockingCalendarService(fake, max_workers=1),
+            session_store=MemorySessionStore(),
+            booking_journal=BookingJournal(":memory:")
+        ),
+        "executor":BookingAgent(
+            calendar_service=AsyncCalendarService(fake, max_workers=args.workers),
+            session_store=MemorySessionStore(),
+            booking_journal=BookingJournal(":memory:")
+        ),
+    }
+
+    print(f"fake calendar latency {args.latency_ms:.0f} ms, executor workers {args.workers}")
+    print(f"{'mode':<10}{'chats':>7}{'p50 ms':>10}{'p99 ms':>10}{'wall ms':>10}")
+    for name, agent in modes.items():
+        for concurrency in args.levels:
+            started=time.perf_counter()
+            latencies=asyncio.run(run_level(agent, concurrency))
+            wall=time.perf_counter() - started
+            print(f"{name:<10}{concurrency:>7}{percentile(latencies, 50) * 1000:>10.1f}"
+                f"{percentile(latencies, 99) * 1000:>10.1f}{wall * 1000:>10.1f}")
+        agent.calendar_service.shutdown()
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from config import Config
+
+def interview_requests(count:int, interviewers:int, days:int, seed:int) -> List[Dict]:
+    # each interview needs one interviewer and fits anywhere in a one to three day window
+    rng=random.Random(seed)
+    first_day=datetime.now().date() + timedelta(days=1)
+    requests=[]
+    for index in range(count):
+        start_day=first_day + timedelta(days=rng.randrange(days))
+        window_start=datetime.combine(start_day, datetime.min.time()).replace(hour=Config.BUSINESS_HOURS_START)
+        window_end=(window_start + timedelta(days=rng.randrange(1, 4))).replace(hour=Config.BUSINESS_HOURS_END)
+        requests.append({
+            "title":f"Interview {index}",
+            "duration_minutes":rng.choice([30, 45, 60]),
+            "window_start":window_start.isoformat(),
+            "window_end":window_end.isoformat(),
+            "attendees":[f"interviewer{rng.randrange(interviewers)}@example.com"],
+            "key":f"interview-{index}"
+        })
+    return requests
+
+def collisions(requests:List[Dict], results:List[Dict], outside:List[tuple]=()) -> int:
+    # overlapping bookings on the organizer's calendar or any interviewer's; outside are events on the
+    # organizer's calendar that the run didn't book
+    by_calendar={'primary':list(outside)}
+    for result in results:
+        if result["status"] not in ("booked", "already_booked"):
+            continue
+        window=(datetime.fromisoformat(result["start"]), datetime.fromisoformat(result["end"]))
+        for calendar_id in ['primary'] + requests[result["index"]]["attendees"]:
+            by_calendar.setdefault(calendar_id, []).append(window)
+    overlapping=0
+    for windows in by_calendar.values():
+        windows.sort()
+        overlapping +=sum(1 for previous, current in zip(windows, windows[1:]) if current[0] < previous[1])
+    return overlapping
+
+def api_calls(backend) -> int:
+    return sum(backend.calls.values())
+
+def one_by_one(requests:List[Dict], latency_ms:float) -> Dict:
+    # the chat flow's calendar work per booking: a slot search, then one insert
+    from calendar_backends import FakeCalendarBackend
+    from calendar_service import CalendarService
+    from freebusy_cache import FreeBusyCache
+    from rate_limit import TokenBucket
+
+    backend=FakeCalendarBackend(pattern="typical", latency_ms=latency_ms)
+    service=CalendarService(backend=backend, rate_limiter=TokenBucket(rate=0), mirror=None)
+    # every booking changes the calendar, so each search has to see the bookings before it
+    service.freebusy_cache=FreeBusyCache(ttl_seconds=0)
+    started=time.perf_counter()
+    booked=0
+    for request in requests:
+        slots=service.find_available_slots_range(
+            datetime.fromisoformat(request["window_start"]), datetime.fromisoformat(request["window_end"]),
+            request["duration_minutes"], 30, request["attendees"]
+        )
+        if slots and service.insert_event(request["title"], slots[0]['start'], slots[0]['end'], "", request["attendees"]):
+            booked +=1
+    return {"seconds":time.perf_counter() - started, "calls":api_calls(backend), "booked":booked}
+
+async def bulk(requests:List[Dict], latency_ms:float, error_rate:float) -> Dict:
+    import main
+    from booking_agent import BookingAgent
+    from booking_journal import BookingJournal
+    from calendar_backends import FakeCalendarBackend
+    from calendar_service import CalendarService
+    from rate_limit import TokenBucket
+    from session_store import MemorySessionStore
+
+    backend=FakeCalendarBackend(pattern="typical", latency_ms=latency_ms, error_rate=error_rate)
+    main.booking_agent=BookingAgent(
+        calendar_service=CalendarService(backend=backend, rate_limiter=TokenBucket(rate=0), mirror=None),
+        session_store=MemorySessionStore(), booking_journal=BookingJournal(":memory:")
+    )
+    transport=httpx.ASGITransport(app=main.app)
+    runs=[]
+    async with httpx.AsyncClient(transport=transport, base_url="http://bulk", timeout=600) as client:
+        # the second submission is a client retrying the whole request: nothing may be booked twice
+        for _ in range(2):
+            calls=api_calls(backend)
+            started=time.perf_counter()
+            results=[]
+            async with client.stream("POST", "/bookings/bulk", json={"bookings":requests}) as response:
+                async for line in response.aiter_lines():
+                    if line:
+                        results.append(json.loads(line))
+            runs.append({
+                "seconds":time.perf_counter() - started,
+                "calls":api_calls(backend) - calls,
+                "results":results,
+                "statuses":{status:sum(1 for result in results if result["status"]==status)
+                            for status in sorted({result["status"] for result in results})},
+                "collisions":collisions(requests, results)
+            })
+    main.booking_agent.calendar_service.shutdown()
+    return {"runs":runs, "retries":main.booking_agent.booking_writer.retries, "backend_calls":dict(backend.calls)}
+
+async def mixed_retry(latency_ms:float) -> Dict:
+    # a resubmission after a run that went wrong: one pending booking whose write landed before the crash,
+    # one failed booking overlapping it, one failed booking whose time someone else took since, one failed
+    # booking that still fits, and new items competing for the same two days
+    import main
+    from booking_agent import BookingAgent
+    from booking_journal import BookingJournal, booking_request_id
+    from calendar_backends import FakeCalendarBackend
+    from calendar_service import CalendarService
+    from rate_limit import TokenBucket
+    from session_store import MemorySessionStore
+
+    backend=FakeCalendarBackend(pattern="empty", latency_ms=latency_ms)
+    service=CalendarService(backend=backend, rate_limiter=TokenBucket(rate=0), mirror=None)
+    main.booking_agent=BookingAgent(
+        calendar_service=service, session_store=MemorySessionStore(), booking_journal=BookingJournal(":memory:")
+    )
+    journal=main.booking_agent.booking_writer.journal
+    day=datetime.now().date() + timedelta(days=7)
+    # two business days in a row
+    while day.weekday() >=4:
+        day +=timedelta(days=1)
+    opening=datetime.combine(day, datetime.min.time())
+    window_start=opening.replace(hour=Config.BUSINESS_HOURS_START)
+    window_end=(opening + timedelta(days=1)).replace(hour=Config.BUSINESS_HOURS_END)
+    attendees=["interviewer0@example.com"]
+
+    def request(key:str) -> Dict:
+        return {"title":key, "duration_minutes":60, "window_start":window_start.isoformat(),
+                "window_end":window_end.isoformat(), "attendees":attendees, "key":key}
+
+    retries={
+        "retry-landed":(opening.replace(hour=10), "pending"),
+        "retry-overlap":(opening.replace(hour=10, minute=30), "failed"),
+        "retry-taken":(opening.replace(hour=14), "failed"),
+        "retry-free":(opening.replace(hour=16), "failed")
+    }
+    for key, (start, status) in retries.items():
+        request_id=booking_request_id(Config.CALENDAR_ID, window_start, window_end, f"bulk|{key}")
+        journal.begin(request_id, {"title":key, "start_time":start, "end_time":start + timedelta(hours=1),
+                                "description":"", "attendees":attendees})
+        if status=="failed":
+            journal.fail(request_id, RuntimeError("503 from an earlier run"))
+        elif key=="retry-landed":
+            service.insert_event(key, start, start + timedelta(hours=1), "", attendees, request_id)
+    outside=[(opening.replace(hour=14, minute=30), opening.replace(hour=15, minute=30))]
+    service.insert_event("someone else", outside[0][0], outside[0][1])
+
+    requests=[request(key) for key in retries] + [request(f"new-{index}") for index in range(6)]
+    transport=httpx.ASGITransport(app=main.app)
+    results=[]
+    async with httpx.AsyncClient(transport=transport, base_url="http://bulk", timeout=600) as client:
+        async with client.stream("POST", "/bookings/bulk", json={"bookings":requests}) as response:
+            async for line in response.aiter_lines():
+                if line:
+                    results.append(json.loads(line))
+    main.booking_agent.calendar_service.shutdown()
+    starts={requests[result["index"]]["key"]:result["start"] for result in results}
+    return {
+        "statuses":{status:sum(1 for result in results if result["status"]==status)
+                    for status in sorted({result["status"] for result in results})},
+        "collisions":collisions(requests, results, outside),
+        "moved":sorted(key for key, (start, _) in retries.items() if starts.get(key) !=start.isoformat())
+    }
+
+def main_benchmark():
+    parser=argparse.ArgumentParser(description="bulk booking endpoint vs one search and insert per booking")
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--interviewers", type=int, default=25)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--latency-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=3)
+    args=parser.parse_args()
+
+    # main builds its BookingAgent at import time, so select the fake calendar before importing it
+    Config.CALENDAR_BACKEND="fake"
+    Config.BOOKING_JOURNAL_PATH=":memory:"
+    requests=interview_requests(args.bookings, args.interviewers, args.days, args.seed)
+    print(f"{args.bookings} interviews, {args.interviewers} interviewers, {args.latency_ms:.0f} ms per fake API call")
+
+    baseline=one_by_one(requests, args.latency_ms)
+    print(f"\none by one:  {baseline['calls']:>5} API calls  {baseline['seconds']:>7.2f} s  {baseline['booked']} booked")
+
+    result=asyncio.run(bulk(requests, args.latency_ms, args.error_rate))
+    for label, run in zip(("bulk:", "resubmit:"), result["runs"]):
+        print(f"{label:<12}{run['calls']:>5} API calls  {run['seconds']:>7.2f} s  "
+            f"{run['statuses']}  overlaps: {run['collisions']}")
+    print(f"insert retries: {result['retries']}, fake backend calls by kind: {result['backend_calls']}")
+
+    mixed=asyncio.run(mixed_retry(args.latency_ms))
+    print(f"\nretries + new: {mixed['statuses']}  overlaps: {mixed['collisions']}  moved: {', '.join(mixed['moved'])}")
+    # journaled bookings that never landed are re-checked, not resent blind
+    if mixed["collisions"] or mixed["moved"] !=["retry-overlap", "retry-taken"]:
+        raise AssertionError("journaled retries were resent without checking their time against the calendar")
+
+if __name__=="__main__":
+    main_benchmark()
@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from config import Config
+
+def next_business_day() -> str:
+    return business_days(1)[0]
+
+def business_days(count:int) -> List[str]:
+    days=[]
+    day=datetime.now().date() + timedelta(days=1)
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day.strftime("%B %d").lower())
+        day +=timedelta(days=1)
+    return days
+
+def percentile(values:List[float], pct:float) -> float:
+    ordered=sorted(values)
+    index=min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def herd(sessions:int, latency_ms:float, rate:float=0, burst:float=1, max_wait:float=0,
+            coalesce:bool=True, cache:bool=True) -> Dict:
+    import main
+    from booking_agent import BookingAgent
+    from booking_journal import BookingJournal
+    from calendar_backends import FakeCalendarBackend
+    from calendar_service import CalendarService
+    from freebusy_cache import FreeBusyCache
+    from rate_limit import TokenBucket
+    from session_store import MemorySessionStore
+
+    backend=FakeCalendarBackend(pattern="typical", latency_ms=latency_ms)
+    service=CalendarService(backend=backend, rate_limiter=TokenBucket(rate=rate, burst=burst, max_wait=max_wait))
+    if not coalesce:
+        service._query_days=service._fetch_days
+    if not cache:
+        service.freebusy_cache=FreeBusyCache(ttl_seconds=0)
+    # no availability index: every session goes to the live free/busy path at the same moment
+    main.booking_agent=BookingAgent(
+        calendar_service=service, session_store=MemorySessionStore(), booking_journal=BookingJournal(":memory:")
+    )
+    message=f"check my availability on {next_business_day()}"
+    latencies={"answered":[], "busy":[]}
+
+    async def session(client:httpx.AsyncClient, index:int):
+        started=time.perf_counter()
+        response=await client.post("/chat", json={"message":message, "session_id":f"herd-{index}"})
+        kind="busy" if response.json().get("retry_after") else "answered"
+        latencies[kind].append(time.perf_counter() - started)
+
+    transport=httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://herd", timeout=60) as client:
+        await asyncio.gather(*[session(client, index) for index in range(sessions)])
+    main.booking_agent.calendar_service.shutdown()
+    return {
+        "latencies":latencies,
+        "api_calls":backend.calls["freebusy"],
+        "coalesced":service.freebusy_inflight.stats()["shared"],
+        "limiter":service.rate_limiter.stats()
+    }
+
+async def mixed_load(sessions:int, latency_ms:float, rate:float, burst:float, max_wait:float) -> Dict:
+    # sessions asking about a day already in the cache arrive with as many asking about days that
+    # aren't: only the second kind reaches the API, so only they may be told to come back later
+    import main
+    from booking_agent import BookingAgent
+    from booking_journal import BookingJournal
+    from calendar_backends import FakeCalendarBackend
+    from calendar_service import CalendarService
+    from rate_limit import TokenBucket
+    from session_store import MemorySessionStore
+
+    backend=FakeCalendarBackend(pattern="typical", latency_ms=latency_ms)
+    service=CalendarService(backend=backend, rate_limiter=TokenBucket(rate=rate, burst=burst, max_wait=max_wait))
+    main.booking_agent=BookingAgent(
+        calendar_service=service, session_store=MemorySessionStore(), booking_journal=BookingJournal(":memory:")
+    )
+    days=business_days(sessions + 1)
+    busy={"cached":0, "uncached":0}
+
+    async def session(client:httpx.AsyncClient, kind:str, day:str, index:int):
+        response=await client.post("/chat", json={"message":f"check my availability on {day}", "session_id":f"{kind}-{index}"})
+        if response.json().get("retry_after"):
+            busy[kind] +=1
+
+    transport=httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://herd", timeout=60) as client:
+        await session(client, "cached", days[0], -1)
+        await asyncio.gather(*[
+            coroutine for index in range(sessions) for coroutine in (
+                session(client, "uncached", days[index + 1], index), session(client, "cached", days[0], index)
+            )
+        ])
+    main.booking_agent.calendar_service.shutdown()
+    return {"busy":busy, "limiter":service.rate_limiter.stats()}
+
+async def run(args):
+    print(f"{args.latency_ms:.0f} ms per fake Calendar API call, all sessions asking about the same day")
+    print(f"{'sessions':>9}{'coalescing':>12}{'api calls':>11}{'shared':>8}{'p95 ms':>9}")
+    for sessions in args.sessions:
+        for coalesce in (False, True):
+            result=await herd(sessions, args.latency_ms, coalesce=coalesce)
+            answered=result["latencies"]["answered"]
+            print(f"{sessions:>9}{'on' if coalesce else 'off':>12}{result['api_calls']:>11}"
+                f"{result['coalesced']:>8}{percentile(answered, 95) * 1000:>9.1f}")
+
+    # no cache and no coalescing, so every session spends a token: the burst beyond what the bucket
+    # can pay for within max_wait gets a "busy" reply instead of queueing until a timeout
+    print(f"\nrate limit {args.rate}/s, burst {args.burst}, max wait {args.max_wait}s, "
+        f"{args.burst_sessions} uncached sessions")
+    result=await herd(args.burst_sessions, args.latency_ms, args.rate, args.burst, args.max_wait,
+                    coalesce=False, cache=False)
+    for kind in ("answered", "busy"):
+        values=result["latencies"][kind]
+        if values:
+            print(f"  {kind:<9}{len(values):>5}  p50 {percentile(values, 50) * 1000:>7.1f} ms"
+                f"  max {max(values) * 1000:>7.1f} ms")
+    print(f"  limiter: {result['limiter']}")
+
+    print(f"\nsame limit, {args.burst_sessions} uncached sessions alongside {args.burst_sessions} on a cached day")
+    result=await mixed_load(args.burst_sessions, args.latency_ms, args.rate, args.burst, args.max_wait)
+    print(f"  busy replies: {result['busy']}  limiter: {result['limiter']}")
+    if result["busy"]["cached"]:
+        raise AssertionError(f"{result['busy']['cached']} sessions answered from the cache were refused by the rate limiter")
+
+def main_benchmark():
+    parser=argparse.ArgumentParser(description="single-flight coalescing and rate limiting of free/busy lookups")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--rate", type=float, default=10)
+    parser.add_argument("--burst", type=float, default=20)
+    parser.add_argument("--max-wait", type=float, default=2.0)
+    parser.add_argument("--burst-sessions", type=int, default=100)
+    args=parser.parse_args()
+
+    # main builds its BookingAgent at import time, so select the fake calendar before importing it
+    Config.CALENDAR_BACKEND="fake"
+    Config.BOOKING_JOURNAL_PATH=":memory:"
+    asyncio.run(run(args))
+
+if __name__=="__main__":
+    main_benchmark()
@@ -0,0 +1,184 @@
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from day_bitmap import DayBitmap, day_bitmaps
+from slot_finder import Slot, find_free_slots, merge_intervals
+
+def business_days(first_day:date, count:int) -> List[date]:
+    days=[]
+    day=first_day
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day +=timedelta(days=1)
+    return days
+
+def year_of_busy(rng:random.Random, days:List[date], meetings_per_day:int) -> List[Dict]:
+    # free/busy answers as the API sends them: ISO strings with an offset, on the five minute grid
+    busy=[]
+    for day in days:
+        for _ in range(rng.randrange(meetings_per_day // 2, meetings_per_day * 3 // 2 + 1)):
+            start=datetime.combine(day, datetime.min.time()).replace(hour=Config.BUSINESS_HOURS_START) + timedelta(
+                minutes=rng.randrange(0, (Config.BUSINESS_HOURS_END - Config.BUSINESS_HOURS_START) * 60, 5)
+            )
+            end=start + timedelta(minutes=rng.choice([15, 30, 30, 45, 60, 60, 90, 120]))
+            busy.append({"start":start.isoformat() + "+05:30", "end":end.isoformat() + "+05:30"})
+    return busy
+
+def parse(busy:List[Dict]) -> List[Tuple[datetime, datetime]]:
+    # what CalendarService._parse_busy_periods does for every query
+    return [
+        (datetime.fromisoformat(period["start"]).replace(tzinfo=None), datetime.fromisoformat(period["end"]).replace(tzinfo=None))
+        for period in busy
+    ]
+
+def measure(build) -> Tuple[object, int]:
+    tracemalloc.start()
+    value=build()
+    size=tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+def best_of(func, repeat:int) -> float:
+    timings=[]
+    for _ in range(repeat):
+        started=time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def check_equivalence(rng:random.Random, days:List[date], raw_by_day:Dict[date, List[Dict]],
+                    bitmaps:Dict[date, DayBitmap], cases:int):
+    for _ in range(cases):
+        day=rng.choice(days)
+        opening=datetime.combine(day, datetime.min.time()).replace(hour=Config.BUSINESS_HOURS_START)
+        start=opening + timedelta(minutes=rng.randrange(0, 8 * 60, 15))
+        end=min(start + timedelta(minutes=rng.randrange(60, 9 * 60, 15)), opening.replace(hour=Config.BUSINESS_HOURS_END))
+        now=opening - timedelta(minutes=rng.randrange(-6 * 60, 24 * 60))
+        duration=rng.choice([15, 30, 45, 60, 90])
+        step=rng.choice([15, 30, 60])
+        expected=find_free_slots(start, end, parse(raw_by_day[day]), now, duration, step)
+        if bitmaps[day].free_slots(start, end, now, duration, step) !=expected:
+            raise AssertionError(f"{day} {start:%H:%M}-{end:%H:%M} {duration}/{step}: bitmap slots differ")
+    print(f"equivalence: {cases} randomized day queries identical to find_free_slots")
+
+def main():
+    parser=argparse.ArgumentParser(description="busy period lists vs per-day bitmaps over a year of calendar data")
+    parser.add_argument("--days", type=int, default=260, help="business days of data (260 is a year)")
+    parser.add_argument("--meetings", type=int, default=6, help="average meetings per day")
+    parser.add_argument("--calendars", type=int, default=10, help="calendars intersected in the group query")
+    parser.add_argument("--cell-minutes", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=11)
+    args=parser.parse_args()
+
+    rng=random.Random(args.seed)
+    days=business_days(date(2030, 1, 7), args.days)
+    raw=year_of_busy(rng, days, args.meetings)
+    raw_by_day={}
+    for period in raw:
+        raw_by_day.setdefault(date.fromisoformat(period["start"][:10]), []).append(period)
+
+    periods, list_bytes=measure(lambda:{day:parse(raw_by_day.get(day, [])) for day in days})
+    bitmaps, bitmap_bytes=measure(
+        lambda:day_bitmaps([period for day in days for period in periods[day]], days, args.cell_minutes)
+    )
+    print(f"{len(days)} business days, {len(raw)} busy periods, {args.cell_minutes}-minute cells")
+    print(f"\nmemory:   parsed tuples {list_bytes / 1024:>8.1f} KiB   bitmaps {bitmap_bytes / 1024:>8.1f} KiB"
+        f"   ({list_bytes / bitmap_bytes:.1f}x smaller)")
+
+    slots=[slot for day in days for slot in find_free_slots(
+        datetime.combine(day, datetime.min.time()).replace(hour=9), datetime.combine(day, datetime.min.time()).replace(hour=18),
+        periods[day], datetime(2030, 1, 1), 30, 15
+    )]
+    _, dict_bytes=measure(lambda:[
+        {'start':slot.start, 'end':slot.end, 'start_str':slot['start_str'], 'end_str':slot['end_str']} for slot in slots
+    ])
+    _, object_bytes=measure(lambda:[Slot(slot.start, slot.end) for slot in slots])
+    print(f"slots:    {len(slots)} as dicts {dict_bytes / 1024:>8.1f} KiB   as Slot {object_bytes / 1024:>8.1f} KiB"
+        f"   ({dict_bytes / object_bytes:.1f}x smaller)")
+
+    check_equivalence(random.Random(args.seed), days, raw_by_day, bitmaps, 2000)
+    if args.cell_minutes !=5:
+        print("(events sit on a five minute grid, so coarser cells round them outwards)")
+
+    now=datetime(2030, 1, 1)
+    windows=[
+        (datetime.combine(day, datetime.min.time()).replace(hour=9), datetime.combine(day, datetime.min.time()).replace(hour=18))
+        for day in days
+    ]
+    print(f"\n{'query, whole year':<40}{'lists ms':>10}{'bitmaps ms':>12}{'speedup':>9}")
+
+    def report(label:str, lists, bits):
+        list_ms=best_of(lists, 3) * 1000
+        bitmap_ms=best_of(bits, 3) * 1000
+        print(f"{label:<40}{list_ms:>10.2f}{bitmap_ms:>12.2f}{list_ms / bitmap_ms:>8.1f}x")
+
+    # today's path re-parses the cached free/busy strings on every query
+    report(
+        "hourly slots per day, parse + find",
+        lambda:[find_free_slots(start, end, parse(raw_by_day.get(start.date(), [])), now) for start, end in windows],
+        lambda:[bitmaps[start.date()].free_slots(start, end, now) for start, end in windows]
+    )
+    # what the availability index does: its periods are parsed once per refresh, and here the bitmap
+    # doesn't pay for itself, so the index stays on find_free_slots
+    report(
+        "hourly slots per day, already parsed",
+        lambda:[find_free_slots(start, end, periods[start.date()], now) for start, end in windows],
+        lambda:[bitmaps[start.date()].free_slots(start, end, now) for start, end in windows]
+    )
+
+    def first_run_lists(day:date, minutes:int):
+        cursor=datetime.combine(day, datetime.min.time()).replace(hour=Config.BUSINESS_HOURS_START)
+        closing=cursor.replace(hour=Config.BUSINESS_HOURS_END)
+        for busy_start, busy_end in merge_intervals(periods[day]):
+            if busy_start - cursor >=timedelta(minutes=minutes):
+                return cursor
+            cursor=max(cursor, busy_end)
+        return cursor if closing - cursor >=timedelta(minutes=minutes) else None
+
+    cells=90 // args.cell_minutes
+    report(
+        "first free 90 minutes per day",
+        lambda:[first_run_lists(day, 90) for day in days],
+        lambda:[bitmaps[day].first_free_run(cells) for day in days]
+    )
+
+    # a group of calendars: one more year of data per extra calendar
+    group=[periods] + [
+        {day:parse(raw_by_day_other.get(day, [])) for day in days}
+        for raw_by_day_other in (
+            _by_day(year_of_busy(rng, days, args.meetings)) for _ in range(args.calendars - 1)
+        )
+    ]
+    group_bitmaps=[bitmaps] + [
+        day_bitmaps([period for day in days for period in calendar[day]], days, args.cell_minutes) for calendar in group[1:]
+    ]
+    report(
+        f"common 30-min slots across {args.calendars} calendars",
+        lambda:[
+            find_free_slots(start, end, [period for calendar in group for period in calendar[start.date()]], now, 30, 30)
+            for start, end in windows
+        ],
+        lambda:[
+            DayBitmap.union(*(calendar[start.date()] for calendar in group_bitmaps)).free_slots(start, end, now, 30, 30)
+            for start, end in windows
+        ]
+    )
+
+def _by_day(raw:List[Dict]) -> Dict[date, List[Dict]]:
+    by_day={}
+    for period in raw:
+        by_day.setdefault(date.fromisoformat(period["start"][:10]), []).append(period)
+    return by_day
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dateutil import parser as date_parser
+
+from entity_extractor import DateCache, EntityExtractor, ExtractedEntities, entity_extractor
+
+# the golden utterances double as the corpus; tests/test_entities.py checks what they resolve to
+GOLDEN_PATH=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "entity_golden.jsonl")
+# golden dates are resolved against a fixed Wednesday so the file never goes stale
+REFERENCE_DAY=date(2025, 1, 8)
+
+def legacy_extract_date(message:str) -> Optional[str]:
+    text=message.lower()
+    if "today" in text:
+        return "today"
+    elif "tomorrow" in text:
+        return "tomorrow"
+    days=["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+    for day in days:
+        if day in text:
+            if "next" in text:
+                return f"next {day}"
+            return day
+    date_patterns=[
+        r'\b(\d{1,2})/(\d{1,2})\b',
+        r'\b(\d{1,2})-(\d{1,2})\b',
+        r'\b(january|february|march|april|may|june|july|august|september|october|november|december)\s+(\d{1,2})\b'
+    ]
+    for pattern in date_patterns:
+        match=re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return match.group(0)
+    return None
+
+def legacy_parse_date(date_str:str, current_time:datetime) -> Optional[datetime]:
+    date_str=date_str.lower().strip()
+    try:
+        if date_str=="today":
+            return current_time
+        elif date_str=="tomorrow":
+            return current_time + timedelta(days=1)
+        days=["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+        for i, day in enumerate(days):
+            if day in date_str:
+                days_ahead=(i - current_time.weekday()) % 7
+                if days_ahead==0:
+                    days_ahead=7 if "next" in date_str else 0
+                elif "next" in date_str:
+                    days_ahead +=7
+                return current_time + timedelta(days=days_ahead)
+        return date_parser.parse(date_str, default=current_time)
+    except Exception:
+        return None
+
+def legacy_chain(message:str, current_time:datetime) -> Dict:
+    # _extract_booking_details followed by _parse_date, as the agent ran them before the extractor
+    details={}
+    text=message.lower()
+    date_str=legacy_extract_date(message)
+    if date_str:
+        details["date"]=date_str
+        details["parsed_date"]=legacy_parse_date(date_str, current_time)
+    if "morning" in text:
+        details["time_period"]="morning"
+    elif "afternoon" in text:
+        details["time_period"]="afternoon"
+    elif "evening" in text:
+        details["time_period"]="evening"
+    time_match=re.search(r'(\d{1,2}):?(\d{2})?\s*(am|pm)', text)
+    if time_match:
+        details["time"]=date_parser.parse(time_match.group(0))
+    range_match=re.search(r'between\s+(\d{1,2})\s*-?\s*(\d{1,2})', text)
+    if range_match:
+        details["time_range"]=(int(range_match.group(1)), int(range_match.group(2)))
+    return details
+
+def as_golden(result:ExtractedEntities) -> Dict:
+    return {
+        "date":result.date.isoformat() if result.date else None,
+        "date_range":[day.isoformat() for day in result.date_range] if result.date_range else None,
+        "time_period":result.time_period,
+        "start_time":result.start_time.strftime("%H:%M") if result.start_time else None,
+        "end_time":result.end_time.strftime("%H:%M") if result.end_time else None,
+        "duration_minutes":result.duration_minutes,
+        "attendees":result.attendees,
+        "confidence":result.confidence
+    }
+
+def load_golden():
+    with open(GOLDEN_PATH, encoding="utf-8") as golden_file:
+        return [json.loads(line)["text"] for line in golden_file if line.strip()]
+
+def messages_per_second(func, corpus, repeat:int) -> float:
+    best=float("inf")
+    for _ in range(repeat):
+        started=time.perf_counter()
+        for message in corpus:
+            func(message)
+        best=min(best, time.perf_counter() - started)
+    return len(corpus) / best
+
+def main():
+    arg_parser=argparse.ArgumentParser(description="legacy date/time chain vs single-pass entity extractor")
+    arg_parser.add_argument("--copies", type=int, default=200)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args=arg_parser.parse_args()
+
+    texts=load_golden()
+    corpus=texts * args.copies
+    current_time=datetime.combine(REFERENCE_DAY, datetime.min.time()).replace(hour=10)
+    legacy=messages_per_second(lambda message:legacy_chain(message, current_time), corpus, args.repeat)
+    # a cache that keeps nothing: every date phrase resolved from scratch
+    uncached_extractor=EntityExtractor(DateCache(max_entries=0))
+    for text in texts:
+        if as_golden(uncached_extractor.extract(text, REFERENCE_DAY)) !=as_golden(entity_extractor.extract(text, REFERENCE_DAY)):
+            raise AssertionError(f"{text!r}: cached date resolution differs")
+    uncached=messages_per_second(lambda message:uncached_extractor.extract(message, REFERENCE_DAY), corpus, args.repeat)
+    extractor=messages_per_second(lambda message:entity_extractor.extract(message, REFERENCE_DAY), corpus, args.repeat)
+    print(f"legacy chain: {legacy:>10.0f} msg/s")
+    print(f"no date cache:{uncached:>10.0f} msg/s ({uncached / legacy:.1f}x)")
+    print(f"extractor:    {extractor:>10.0f} msg/s ({extractor / legacy:.1f}x, {extractor / uncached:.2f}x over no date cache)")
+    stats=entity_extractor.date_cache.stats()
+    print(f"date cache:   {stats['hit_rate'] * 100:.1f}% hits, {stats['entries']} phrases held")
+    # how much a hit saves is timing and too noisy to fail on; that a second pass over the same phrases
+    # is all hits is not
+    counted=EntityExtractor(DateCache())
+    for text in texts:
+        counted.extract(text, REFERENCE_DAY)
+    first=counted.date_cache.stats()
+    for text in texts:
+        counted.extract(text, REFERENCE_DAY)
+    second=counted.date_cache.stats()
+    lookups=first["hits"] + first["misses"]
+    if second["hits"] - first["hits"] !=lookups:
+        raise AssertionError(f"second pass: {second['hits'] - first['hits']} date cache hits for {lookups} lookups")
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import email.parser
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httplib2
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from calendar_backends import GoogleCalendarBackend
+
+FREEBUSY_BODY={
+    'timeMin':'2025-01-06T00:00:00Z',
+    'timeMax':'2025-01-07T00:00:00Z',
+    'timeZone':'UTC',
+    'items':[{'id':'primary'}]
+}
+
+class MockCalendarHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests
+    protocol_version="HTTP/1.1"
+    # headers and body go out as separate writes; without this Nagle adds ~40 ms per response
+    disable_nagle_algorithm=True
+
+    def setup(self):
+        super().setup()
+        stats=self.server.stats
+        with stats["lock"]:
+            stats["connections"] +=1
+        # stands in for the TCP + TLS handshake a real connection to Google pays
+        time.sleep(self.server.connect_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        stats=self.server.stats
+        with stats["lock"]:
+            stats["requests"] +=1
+        body=self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+        if self.path.startswith('/batch/'):
+            content_type, payload=self._batch(body)
+        else:
+            content_type, payload='application/json', json.dumps(self._answer(self.path, body)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _answer(self, path:str, body:bytes) -> Dict:
+        if path.endswith('/freeBusy'):
+            return {'calendars':{'primary':{'busy':[]}}}
+        event=json.loads(body or b'{}')
+        return dict(event, id=uuid.uuid4().hex, status='confirmed')
+
+    def _batch(self, body:bytes):
+        message=email.parser.BytesParser().parsebytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + body
+        )
+        boundary=uuid.uuid4().hex
+        parts=[]
+        for part in message.get_payload():
+            request_line, _, rest=part.get_payload().partition('\n')
+            path=request_line.split(' ')[1]
+            _, _, inner_body=rest.partition('\r\n\r\n') if '\r\n\r\n' in rest else rest.partition('\n\n')
+            answer=json.dumps(self._answer(path, inner_body.encode()))
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{answer}\r\n"
+            )
+        payload=("".join(parts) + f"--{boundary}--\r\n").encode()
+        return f'multipart/mixed; boundary="{boundary}"', payload
+
+def start_server(latency:float, connect_latency:float) -> ThreadingHTTPServer:
+    server=ThreadingHTTPServer(('127.0.0.1', 0), MockCalendarHandler)
+    server.daemon_threads=True
+    server.latency=latency
+    server.connect_latency=connect_latency
+    server.stats={"connections":0, "requests":0, "lock":threading.Lock()}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def discovery_file(port:int) -> str:
+    document=json.loads(get_static_doc('calendar', 'v3'))
+    document['rootUrl']=f'http://127.0.0.1:{port}/'
+    handle, path=tempfile.mkstemp(suffix='.json')
+    with os.fdopen(handle, 'w', encoding='utf-8') as out:
+        json.dump(document, out)
+    return path
+
+def measure(server:ThreadingHTTPServer, threads:int, calls:int, call:Callable) -> Dict:
+    with server.stats["lock"]:
+        before=(server.stats["connections"], server.stats["requests"])
+    started=time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _:call(), range(calls)))
+    wall=time.perf_counter() - started
+    with server.stats["lock"]:
+        return {
+            "wall":wall,
+            "connections":server.stats["connections"] - before[0],
+            "requests":server.stats["requests"] - before[1]
+        }
+
+def event_bodies(count:int) -> List[Dict]:
+    start=datetime(2025, 1, 6, 9)
+    return [{
+        'summary':f'Meeting {index}',
+        'start':{'dateTime':(start + timedelta(hours=index)).isoformat(), 'timeZone':'UTC'},
+        'end':{'dateTime':(start + timedelta(hours=index + 1)).isoformat(), 'timeZone':'UTC'}
+    } for index in range(count)]
+
+def main():
+    parser=argparse.ArgumentParser(description="shared vs per-call vs pooled Calendar transports, and batch inserts")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=5, help="server time per request")
+    parser.add_argument("--connect-latency-ms", type=float, default=20, help="server time per new connection")
+    parser.add_argument("--events", type=int, default=120)
+    args=parser.parse_args()
+
+    server=start_server(args.latency_ms / 1000, args.connect_latency_ms / 1000)
+    path=discovery_file(server.server_address[1])
+    document=open(path, encoding='utf-8').read()
+    creds=Credentials(token='bench-token')
+    try:
+        # the old transport: one httplib2.Http for the whole process, safe only behind a lock
+        shared=build_from_document(document, http=AuthorizedHttp(creds, http=httplib2.Http(timeout=30)))
+        shared_lock=threading.Lock()
+
+        def shared_call():
+            with shared_lock:
+                shared.freebusy().query(body=FREEBUSY_BODY).execute()
+
+        # thread-safe without a pool: a fresh transport, and so a fresh connection, per call
+        def fresh_call():
+            shared.freebusy().query(body=FREEBUSY_BODY).execute(
+                http=AuthorizedHttp(creds, http=httplib2.Http(timeout=30))
+            )
+
+        backend=GoogleCalendarBackend(credentials=creds, discovery_file=path, pool_size=args.pool_size)
+        backend.warm_up()
+
+        print(f"{args.calls} free/busy calls from {args.threads} threads, "
+            f"{args.latency_ms:.0f} ms per request, {args.connect_latency_ms:.0f} ms per new connection")
+        print(f"{'transport':<12}{'calls/s':>10}{'connections':>13}")
+        for name, call in (("shared", shared_call), ("per-call", fresh_call),
+                        ("pooled", lambda:backend.query_free_busy(FREEBUSY_BODY))):
+            result=measure(server, args.threads, args.calls, call)
+            print(f"{name:<12}{args.calls / result['wall']:>10.0f}{result['connections']:>13}")
+        print(f"pool: {backend.pool.stats()}")
+
+        events=event_bodies(args.events)
+        print(f"\n{args.events} event inserts on the pooled transport")
+        print(f"{'mode':<12}{'ms':>10}{'requests':>13}")
+        sequential=measure(server, 1, 1, lambda:[backend.insert_event('primary', event) for event in events])
+        batched=measure(server, 1, 1, lambda:backend.insert_events('primary', events))
+        for name, result in (("one-by-one", sequential), ("batched", batched)):
+            print(f"{name:<12}{result['wall'] * 1000:>10.1f}{result['requests']:>13}")
+    finally:
+        server.shutdown()
+        os.remove(path)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_classifier import IntentClassifier
+
+def legacy_classify(message:str, history:List[Dict]) -> str:
+    # the per-call pattern lists and re.search loop that process_message used before the classifier
+    def last_bot_message():
+        for msg in reversed(history[-3:]):
+            if msg.get("role")=="assistant":
+                return msg.get("content", "").lower()
+        return ""
+
+    def is_slot_selection():
+        text=last_bot_message()
+        if "reply with the number" in text or "which slot" in text:
+            return bool(re.search(r'\b[1-9]\b', message))
+        return False
+
+    def is_confirmation():
+        text=last_bot_message()
+        if "confirm" in text or "say yes" in text:
+            return any(word in message.lower() for word in ["yes", "no", "confirm", "cancel"])
+        return False
+
+    def is_availability_check(text:str):
+        patterns=[
+            r'(check|show|see|what|when).*(availability|available|free|time)',
+            r'(availability|available|free).*(today|tomorrow|monday|tuesday|wednesday|thursday|friday)',
+            r'(do you have|any).*(free time|available|open)',
+            r'free time.*on',
+            r'available.*on'
+        ]
+        return any(re.search(pattern, text, re.IGNORECASE) for pattern in patterns)
+
+    def is_booking_request(text:str):
+        patterns=[
+            r'(schedule|book|set up|arrange).*(meeting|call|appointment)',
+            r'(want to|need to|would like to).*(schedule|book|meet)',
+            r'book.*meeting',
+            r'schedule.*call',
+            r'meeting.*between',
+            r'call.*tomorrow'
+        ]
+        return any(re.search(pattern, text, re.IGNORECASE) for pattern in patterns)
+
+    user_input=message.lower().strip()
+    if is_slot_selection():
+        return "slot_selection"
+    elif is_confirmation():
+        return "confirmation"
+    elif is_availability_check(user_input):
+        return "availability"
+    elif is_booking_request(user_input):
+        return "booking"
+    return "general"
+
+TEMPLATES=[
+    "check my availability {day}",
+    "What's my availability for {day}?",
+    "do you have any free time {day}",
+    "am I available on {day} {period}",
+    "show me free slots {day}",
+    "Hey, I want to schedule a call for {day} {period}",
+    "book a meeting {day} {period}",
+    "please arrange an appointment on {day}",
+    "can we set up a meeting between 2-4 {day}",
+    "I need to book something {day} with alice@example.com",
+    "schedule a call {day} at 3pm",
+    "hello there",
+    "what can you do",
+    "thanks, that's all",
+]
+DAYS=["today", "tomorrow", "monday", "next friday", "12/20", "december 5", "this week"]
+PERIODS=["", "morning", "afternoon", "evening", "at 10am"]
+SLOT_PROMPT=[{"role":"assistant", "content":"Which slot works for you? Reply with the number (1-5)."}]
+CONFIRM_PROMPT=[{"role":"assistant", "content":"Should I confirm this booking? Say 'yes' to confirm."}]
+
+def build_corpus(size:int, seed:int) -> List[Tuple[str, List[Dict]]]:
+    rng=random.Random(seed)
+    corpus=[]
+    for _ in range(size):
+        roll=rng.random()
+        if roll < 0.15:
+            corpus.append((rng.choice(["1", "2", "option 3", "the 4th one", "5 please", "none"]), SLOT_PROMPT))
+        elif roll < 0.3:
+            corpus.append((rng.choice(["yes", "yes please", "no", "cancel it", "confirm", "hmm"]), CONFIRM_PROMPT))
+        else:
+            template=rng.choice(TEMPLATES)
+            message=template.format(day=rng.choice(DAYS), period=rng.choice(PERIODS)).strip()
+            corpus.append((message, []))
+    return corpus
+
+def messages_per_second(func, corpus:List[Tuple[str, List[Dict]]], repeat:int) -> float:
+    best=float("inf")
+    for _ in range(repeat):
+        started=time.perf_counter()
+        for message, history in corpus:
+            func(message, history)
+        best=min(best, time.perf_counter() - started)
+    return len(corpus) / best
+
+def main():
+    parser=argparse.ArgumentParser(description="legacy regex chain vs precompiled intent classifier")
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=11)
+    args=parser.parse_args()
+
+    corpus=build_corpus(args.size, args.seed)
+    classifier=IntentClassifier()
+    mismatches=[
+        message for message, history in corpus
+        if legacy_classify(message, history) !=classifier.classify(message, history)["intent"]
+    ]
+    if mismatches:
+        raise AssertionError(f"{len(mismatches)} utterances classified differently, e.g. {mismatches[:3]}")
+    print(f"agreement: {len(corpus)} utterances classified identically")
+
+    legacy=messages_per_second(legacy_classify, corpus, args.repeat)
+    combined=messages_per_second(classifier.classify, corpus, args.repeat)
+    print(f"legacy chain:  {legacy:>10.0f} msg/s")
+    # every rule added to intent_rules.json is paid for by every message; this ratio is where that shows up
+    print(f"classifier:    {combined:>10.0f} msg/s ({combined / legacy:.2f}x)")
+
+if __name__=="__main__":
+    main()
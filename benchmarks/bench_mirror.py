@@ -0,0 +1,132 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz
+
+from calendar_backends import FakeCalendarBackend
+from calendar_mirror import CalendarMirror
+from calendar_service import CalendarService
+from config import Config
+from freebusy_cache import FreeBusyCache
+from rate_limit import TokenBucket
+
+def event_body(start:datetime, minutes:int, title:str) -> Dict:
+    return {
+        'summary':title,
+        'start':{'dateTime':start.isoformat(), 'timeZone':Config.TIMEZONE},
+        'end':{'dateTime':(start + timedelta(minutes=minutes)).isoformat(), 'timeZone':Config.TIMEZONE}
+    }
+
+def random_start(rng:random.Random, first_day, days:int, timezone) -> datetime:
+    day=first_day + timedelta(days=rng.randrange(days))
+    return timezone.localize(datetime.combine(day, datetime.min.time()).replace(
+        hour=rng.randrange(Config.BUSINESS_HOURS_START, Config.BUSINESS_HOURS_END), minute=rng.choice([0, 15, 30, 45])
+    ))
+
+def populate(backend:FakeCalendarBackend, count:int, first_day, days:int, rng:random.Random) -> List[str]:
+    timezone=pytz.timezone(Config.TIMEZONE)
+    bodies=[
+        event_body(random_start(rng, first_day, days, timezone), rng.choice([15, 30, 60, 90]), f"Event {index}")
+        for index in range(count)
+    ]
+    created=[]
+    for offset in range(0, count, 1000):
+        created.extend(result['id'] for result in backend.insert_events(Config.CALENDAR_ID, bodies[offset:offset + 1000]))
+    return created
+
+def mutate(backend:FakeCalendarBackend, event_ids:List[str], changes:int, first_day, days:int,
+        rng:random.Random) -> int:
+    # other clients editing the calendar: a mix of new, moved and deleted events
+    timezone=pytz.timezone(Config.TIMEZONE)
+    touched=set()
+    for index in range(changes):
+        kind=rng.choice(["insert", "update", "delete"])
+        start=random_start(rng, first_day, days, timezone)
+        if kind=="insert":
+            created=backend.insert_event(Config.CALENDAR_ID, event_body(start, 30, f"New {index}"))
+            event_ids.append(created['id'])
+            touched.add(created['id'])
+            continue
+        event_id=event_ids.pop(rng.randrange(len(event_ids)))
+        touched.add(event_id)
+        if kind=="update":
+            backend.update_event(Config.CALENDAR_ID, event_id, event_body(start, 60, f"Moved {index}"))
+            event_ids.append(event_id)
+        else:
+            backend.delete_event(Config.CALENDAR_ID, event_id)
+    return len(touched)
+
+def ground_truth(backend:FakeCalendarBackend, service:CalendarService, first_day, last_day) -> Set[Tuple]:
+    window_start, window_end=service._days_window(first_day, last_day)
+    items=backend.list_events(Config.CALENDAR_ID, window_start.isoformat(), window_end.isoformat())['items']
+    return {(event['id'], service._parse_utc(event['start']['dateTime']).timestamp() // 1) for event in items}
+
+def mirrored(service:CalendarService, first_day, last_day) -> Set[Tuple]:
+    events=service.mirror.events_between(Config.CALENDAR_ID, *service._days_window(first_day, last_day))
+    return {(event['id'], service._parse_utc(event['start']['dateTime']).timestamp() // 1) for event in events}
+
+def timed_sync(service:CalendarService, backend:FakeCalendarBackend) -> Dict:
+    calls=backend.calls["sync"]
+    started=time.perf_counter()
+    items=service.sync_mirror()
+    return {"ms":(time.perf_counter() - started) * 1000, "pages":backend.calls["sync"] - calls, "items":items}
+
+def main():
+    parser=argparse.ArgumentParser(description="calendar mirror: full sync, incremental deltas, restart and read speed")
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--changes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args=parser.parse_args()
+
+    rng=random.Random(args.seed)
+    backend=FakeCalendarBackend(pattern="empty")
+    path=os.path.join(tempfile.mkdtemp(), "mirror.db")
+    service=CalendarService(
+        backend=backend, rate_limiter=TokenBucket(rate=0), mirror=CalendarMirror(path, days=args.days)
+    )
+    first_day, last_day=service.mirror.full_sync_window(datetime.now(service.timezone).date())
+    event_ids=populate(backend, args.events, first_day, args.days, rng)
+
+    print(f"{'sync':<22}{'ms':>9}{'pages':>7}{'events sent':>13}{'in sync':>9}")
+
+    def report(label:str, result:Dict):
+        in_sync=mirrored(service, first_day, last_day)==ground_truth(backend, service, first_day, last_day)
+        print(f"{label:<22}{result['ms']:>9.1f}{result['pages']:>7}{result['items']:>13}{'yes' if in_sync else 'NO':>9}")
+
+    report(f"full ({args.events} events)", timed_sync(service, backend))
+    for changes in args.changes:
+        touched=mutate(backend, event_ids, changes, first_day, args.days, rng)
+        report(f"{touched} changed events", timed_sync(service, backend))
+    report("no changes", timed_sync(service, backend))
+
+    # a new process picks up the stored sync token and only fetches what changed while it was down
+    touched=mutate(backend, event_ids, 50, first_day, args.days, rng)
+    service.mirror=CalendarMirror(path, days=args.days)
+    started=time.perf_counter()
+    service.mirror.load()
+    load_ms=(time.perf_counter() - started) * 1000
+    report(f"restart, {touched} changed", timed_sync(service, backend))
+    print(f"  (loading {args.events} events from {os.path.getsize(path) / 1e6:.1f} MB of SQLite: {load_ms:.0f} ms)")
+
+    # no free/busy cache in front, so every lookup reads the mirror
+    service.freebusy_cache=FreeBusyCache(ttl_seconds=0)
+    days=[first_day + timedelta(days=rng.randrange(args.days)) for _ in range(args.reads)]
+    started=time.perf_counter()
+    for day in days:
+        service.get_free_busy(*service._days_window(day, day))
+    mirror_us=(time.perf_counter() - started) / args.reads * 1e6
+    print(f"\nfree/busy for one day ({args.events / args.days:.0f} events) from the mirror: {mirror_us:.0f} us "
+        f"per lookup, {service.freebusy_queries} API queries for {args.reads} lookups")
+
+if __name__=="__main__":
+    main()
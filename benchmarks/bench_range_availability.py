@@ -0,0 +1,124 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendar_backends import FakeCalendarBackend
+from calendar_service import CalendarService
+from freebusy_cache import FreeBusyCache
+from range_availability import find_free_slots_range
+from rate_limit import TokenBucket
+from slot_finder import find_free_slots
+
+def random_busy(rng:random.Random, start:datetime, end:datetime, count:int) -> List[Tuple[datetime, datetime]]:
+    span=int((end - start).total_seconds() // 60)
+    busy=[]
+    for _ in range(count):
+        busy_start=start + timedelta(minutes=rng.randrange(-120, span + 120, 5))
+        busy.append((busy_start, busy_start + timedelta(minutes=rng.choice([0, 15, 30, 45, 60, 90, 120, 240]))))
+    return busy
+
+def per_day(start:datetime, end:datetime, busy:List[Tuple[datetime, datetime]], now:datetime,
+            duration:int, step:int) -> List[Dict]:
+    # what answering "next week" one day at a time looks like: a 9-18 window per business day
+    slots=[]
+    day=start.date()
+    while day <=end.date():
+        if day.weekday() < 5:
+            day_start=max(start, datetime.combine(day, datetime.min.time()).replace(hour=9))
+            day_end=min(end, datetime.combine(day, datetime.min.time()).replace(hour=18))
+            slots.extend(find_free_slots(day_start, day_end, busy, now, duration, step))
+        day +=timedelta(days=1)
+    return slots
+
+def check_equivalence(cases:int, seed:int):
+    rng=random.Random(seed)
+    base=datetime(2025, 1, 6, 0, 0)
+    for case in range(cases):
+        start=base + timedelta(minutes=rng.randrange(0, 14 * 24 * 60, 5))
+        end=start + timedelta(hours=rng.randrange(1, 24 * 35))
+        now=start + timedelta(minutes=rng.randrange(-24 * 60, 24 * 60))
+        busy=random_busy(rng, start, end, rng.randrange(0, 300))
+        duration=rng.choice([15, 30, 45, 60, 90, 120])
+        step=rng.choice([15, 30, 60])
+        expected=find_free_slots(start, end, busy, now, duration, step)
+        actual=find_free_slots_range(start, end, busy, now, duration, step)
+        if [(s['start'], s['end'], s['start_str'], s['end_str']) for s in expected] !=\
+            [(s['start'], s['end'], s['start_str'], s['end_str']) for s in actual]:
+            raise AssertionError(f"case {case}: range returned {len(actual)} slots, per-slot finder {len(expected)}")
+    print(f"equivalence: {cases} randomized spans identical to find_free_slots")
+
+def best_of(func, repeat:int) -> float:
+    timings=[]
+    for _ in range(repeat):
+        started=time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def live_queries(days:int, latency_ms:float) -> Dict:
+    # no cache, no mirror: every free/busy lookup is a Calendar API round trip
+    start=(datetime.now() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+    end=(start + timedelta(days=days - 1)).replace(hour=18)
+    results={}
+    for label in ("per day", "range"):
+        backend=FakeCalendarBackend(pattern="typical", latency_ms=latency_ms)
+        service=CalendarService(backend=backend, rate_limiter=TokenBucket(rate=0), mirror=None)
+        service.freebusy_cache=FreeBusyCache(ttl_seconds=0)
+        started=time.perf_counter()
+        if label=="range":
+            slots=service.find_available_slots_range(start, end, 60)
+        else:
+            slots=[]
+            day=start
+            while day <=end:
+                if day.weekday() < 5:
+                    slots.extend(service.find_available_slots(day, day.replace(hour=18), 60))
+                day +=timedelta(days=1)
+        results[label]={
+            "ms":(time.perf_counter() - started) * 1000,
+            "calls":backend.calls["freebusy"],
+            "slots":[(slot['start'], slot['end']) for slot in slots]
+        }
+    return results
+
+def main():
+    parser=argparse.ArgumentParser(description="per-day loop vs one vectorized pass for multi-day availability")
+    parser.add_argument("--cases", type=int, default=500)
+    parser.add_argument("--spans", type=int, nargs="+", default=[7, 31])
+    parser.add_argument("--busy-per-day", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=11)
+    args=parser.parse_args()
+
+    check_equivalence(args.cases, args.seed)
+
+    rng=random.Random(args.seed)
+    print(f"\ncompute only, {args.busy_per_day} busy periods per day, 30 min slots on a 15 min step")
+    print(f"{'days':>6}{'slots':>8}{'per day ms':>12}{'range ms':>10}{'speedup':>9}")
+    for days in args.spans:
+        start=datetime(2025, 1, 6, 9, 0)
+        end=(start + timedelta(days=days - 1)).replace(hour=18)
+        busy=random_busy(rng, start, end, args.busy_per_day * days)
+        now=start - timedelta(days=1)
+        slots=find_free_slots_range(start, end, busy, now, 30, 15)
+        looped=best_of(lambda:per_day(start, end, busy, now, 30, 15), args.repeat)
+        ranged=best_of(lambda:find_free_slots_range(start, end, busy, now, 30, 15), args.repeat)
+        print(f"{days:>6}{len(slots):>8}{looped * 1000:>12.2f}{ranged * 1000:>10.2f}{looped / ranged:>8.1f}x")
+
+    print(f"\nend to end through CalendarService, {args.latency_ms:.0f} ms per fake free/busy call")
+    print(f"{'days':>6}{'path':>9}{'api calls':>11}{'ms':>9}{'same slots':>12}")
+    for days in args.spans:
+        results=live_queries(days, args.latency_ms)
+        same=results["per day"]["slots"]==results["range"]["slots"]
+        for label, result in results.items():
+            print(f"{days:>6}{label:>9}{result['calls']:>11}{result['ms']:>9.1f}{'yes' if same else 'NO':>12}")
+
+if __name__=="__main__":
+    main()
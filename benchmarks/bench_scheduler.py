@@ -0,0 +1,179 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from range_availability import find_free_slots_range
+from scheduler import Scheduler
+from slot_finder import merge_intervals
+from slot_ranking import slot_ranker
+
+def dense_busy(rng:random.Random, first_day:datetime, days:int, density:float) -> List[Tuple[datetime, datetime]]:
+    # meetings dropped on the half-hour grid until roughly `density` of business hours is taken
+    busy=[]
+    for offset in range(days):
+        day=first_day + timedelta(days=offset)
+        if day.weekday() >=5:
+            continue
+        minutes=0
+        while minutes < density * 9 * 60:
+            length=rng.choice([30, 30, 60, 60, 90, 120])
+            start=day.replace(hour=9) + timedelta(minutes=rng.randrange(0, 9 * 60 - length + 1, 30))
+            busy.append((start, start + timedelta(minutes=length)))
+            minutes +=length
+    return busy
+
+def random_problem(rng:random.Random, first_day:datetime, density:float) -> Dict:
+    recurring=rng.random() < 0.3
+    duration=rng.choice([30, 30, 45, 60])
+    if recurring:
+        weeks=rng.randrange(4, 9)
+        windows=[
+            (first_day + timedelta(weeks=week, hours=9), first_day + timedelta(weeks=week, days=4, hours=18))
+            for week in range(weeks)
+        ]
+        problem={"windows":windows, "min_gap":0, "max_per_day":None, "recurrence":"weekly"}
+        days=weeks * 7
+    else:
+        span=rng.choice([1, 3, 5])
+        max_per_day=rng.choice([None, None, 2, 3] if span==1 else [None, None, 1, 2, 3])
+        count=rng.randrange(2, min(10, span * (max_per_day or 5)) + 1)
+        if rng.random() < 0.5:
+            # "n check-ins this week": every meeting may go anywhere in the span
+            windows=[(first_day.replace(hour=9), first_day + timedelta(days=span - 1, hours=18))] * count
+        else:
+            # each meeting has its own few hours, overlapping the others', like a panel of interviews
+            windows=[]
+            for _ in range(count):
+                start=first_day + timedelta(days=rng.randrange(span), hours=rng.randrange(9, 15))
+                windows.append((start, min(start + timedelta(hours=rng.choice([2, 3, 4])), start.replace(hour=18))))
+        problem={
+            "windows":windows,
+            "min_gap":rng.choice([0, 30, 60, 120]),
+            "max_per_day":max_per_day,
+            "recurrence":None
+        }
+        days=span
+    busy=dense_busy(rng, first_day, days, density)
+    end=max(window_end for _, window_end in problem["windows"])
+    now=first_day - timedelta(days=1)
+    problem.update(duration=duration, busy=busy, slots=find_free_slots_range(first_day, end, busy, now, duration, 30))
+    return problem
+
+def greedy(problem:Dict) -> List[Dict]:
+    # what booking them one at a time looks like: each meeting takes the best slot still open
+    merged=merge_intervals(problem["busy"])
+    busy_starts=[start for start, _ in merged]
+    scored=sorted(problem["slots"], key=lambda slot:-slot_ranker.score(slot, merged, busy_starts))
+    picked=[]
+    for window_start, window_end in problem["windows"]:
+        for slot in scored:
+            if window_start <=slot['start'] and slot['end'] <=window_end and fits(problem, picked, slot):
+                picked.append(slot)
+                break
+    return picked
+
+def fits(problem:Dict, picked:List[Dict], slot:Dict) -> bool:
+    reach=timedelta(minutes=problem["duration"] + problem["min_gap"])
+    same_day=0
+    for other in picked:
+        if abs(other['start'] - slot['start']) < reach:
+            return False
+        same_day +=other['start'].date()==slot['start'].date()
+    return not problem["max_per_day"] or same_day < problem["max_per_day"]
+
+def list_backtracking(problem:Dict, budget_ms:float) -> Tuple[Optional[float], bool]:
+    # the textbook search over slot lists: every pick re-checks the ones before it, no forward
+    # checking and no bound. returns (best total score, finished inside the budget)
+    merged=merge_intervals(problem["busy"])
+    busy_starts=[start for start, _ in merged]
+    scores={slot['start']:slot_ranker.score(slot, merged, busy_starts) for slot in problem["slots"]}
+    candidates=[
+        [slot for slot in problem["slots"] if window_start <=slot['start'] and slot['end'] <=window_end]
+        for window_start, window_end in problem["windows"]
+    ]
+    deadline=time.perf_counter() + budget_ms / 1000
+    best=[None]
+
+    def search(depth:int, picked:List[Dict], total:float):
+        if time.perf_counter() > deadline:
+            raise TimeoutError
+        if depth==len(candidates):
+            best[0]=total if best[0] is None else max(best[0], total)
+            return
+        for slot in candidates[depth]:
+            if fits(problem, picked, slot):
+                picked.append(slot)
+                search(depth + 1, picked, total + scores[slot['start']])
+                picked.pop()
+
+    try:
+        search(0, [], 0.0)
+    except TimeoutError:
+        return best[0], False
+    return best[0], True
+
+def percentile(values:List[float], share:float) -> float:
+    values=sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+def main():
+    parser=argparse.ArgumentParser(description="multi-meeting scheduler on dense calendars")
+    parser.add_argument("--problems", type=int, default=200)
+    parser.add_argument("--density", type=float, nargs="+", default=[0.5, 0.7, 0.85])
+    parser.add_argument("--budget-ms", type=float, default=50)
+    parser.add_argument("--seed", type=int, default=5)
+    args=parser.parse_args()
+
+    solver=Scheduler(time_budget_ms=args.budget_ms)
+    first_day=datetime(2030, 1, 7)
+    print(f"{args.problems} problems per density, {args.budget_ms:.0f} ms budget")
+    print(f"{'density':>8}{'greedy':>9}{'placed':>9}{'optimal':>9}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'max ms':>9}{'score +%':>10}{'settled':>9}{'list bt':>9}")
+    for density in args.density:
+        rng=random.Random(args.seed)
+        greedy_complete=complete=optimal=finished_count=list_finished=0
+        latencies=[]
+        gains=[]
+        for _ in range(args.problems):
+            problem=random_problem(rng, first_day, density)
+            greedy_slots=greedy(problem)
+            result=solver.solve(
+                problem["slots"], problem["busy"], problem["windows"], problem["duration"],
+                problem["min_gap"], problem["max_per_day"], problem["recurrence"]
+            )
+            latencies.append(result.elapsed_ms)
+            complete +=result.complete
+            optimal +=result.optimal
+            finished_count +=not result.timed_out
+            if len(greedy_slots)==len(problem["windows"]):
+                greedy_complete +=1
+                merged=merge_intervals(problem["busy"])
+                busy_starts=[start for start, _ in merged]
+                greedy_score=sum(slot_ranker.score(slot, merged, busy_starts) for slot in greedy_slots)
+                if result.complete and not problem["recurrence"]:
+                    gains.append((result.score - greedy_score) / greedy_score * 100)
+            best, finished=list_backtracking(problem, args.budget_ms)
+            list_finished +=finished
+            if finished and best is not None and result.optimal:
+                # both searches proved an optimum, so they must agree on its score
+                assert abs(best - result.score) < 1e-6, (best, result.score)
+        share=lambda count:f"{count / args.problems * 100:.0f}%"
+        gain=f"{statistics.mean(gains):.1f}" if gains else "-"
+        print(f"{density:>8.2f}{share(greedy_complete):>9}{share(complete):>9}{share(optimal):>9}"
+            f"{percentile(latencies, 0.5):>9.2f}{percentile(latencies, 0.95):>9.2f}{max(latencies):>9.2f}"
+            f"{gain:>10}{share(finished_count):>9}{share(list_finished):>9}")
+    print("\ngreedy/placed: problems with every meeting placed, one at a time vs by the scheduler")
+    print("optimal: every meeting placed and the best total score proven inside the budget")
+    print("settled: search finished inside the budget (optimum found or proven impossible), for the scheduler and for")
+    print("         plain backtracking over slot lists with the same budget")
+    print("score +%: scheduler's total slot score over greedy's, where both placed everything (non-recurring)")
+
+if __name__=="__main__":
+    main()
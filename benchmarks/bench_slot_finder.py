@@ -0,0 +1,100 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from slot_finder import find_free_slots
+
+def legacy_find_slots(start:datetime, end:datetime, busy_periods:List[Tuple[datetime, datetime]],
+                    now:datetime, duration_minutes:int=60, step_minutes:int=60) -> List[Dict]:
+    # the pre-sweep CalendarService.find_available_slots loop, minus its per-slot prints
+    busy_periods=sorted(busy_periods, key=lambda x:x[0])
+    available_slots=[]
+    current_time=start
+    duration=timedelta(minutes=duration_minutes)
+    while current_time + duration <=end:
+        slot_end=current_time + duration
+        is_available=True
+        for busy_start, busy_end in busy_periods:
+            if (current_time < busy_end and slot_end > busy_start):
+                is_available=False
+                break
+        if is_available:
+            if (Config.BUSINESS_HOURS_START <=current_time.hour < Config.BUSINESS_HOURS_END and
+                current_time > now + timedelta(minutes=15) and
+                current_time.weekday() < 5 and
+                not (12 <=current_time.hour < 14)):
+                available_slots.append({
+                    'start':current_time,
+                    'end':slot_end,
+                    'start_str':current_time.strftime(Config.DATETIME_FORMAT),
+                    'end_str':slot_end.strftime(Config.DATETIME_FORMAT)
+                })
+        current_time +=timedelta(minutes=step_minutes)
+    return available_slots
+
+def random_busy(rng:random.Random, start:datetime, end:datetime, count:int) -> List[Tuple[datetime, datetime]]:
+    span=int((end - start).total_seconds() // 60)
+    busy=[]
+    for _ in range(count):
+        offset=rng.randrange(-120, span + 120)
+        length=rng.choice([0, 5, 15, 30, 45, 60, 90, 120, 240])
+        busy_start=start + timedelta(minutes=offset)
+        busy.append((busy_start, busy_start + timedelta(minutes=length)))
+    return busy
+
+def check_equivalence(cases:int, seed:int):
+    rng=random.Random(seed)
+    base=datetime(2025, 1, 6, 0, 0)
+    for case in range(cases):
+        start=base + timedelta(minutes=rng.randrange(0, 14 * 24 * 60, 5))
+        end=start + timedelta(hours=rng.randrange(1, 24 * 21))
+        now=start + timedelta(minutes=rng.randrange(-24 * 60, 24 * 60))
+        busy=random_busy(rng, start, end, rng.randrange(0, 200))
+        duration=rng.choice([15, 30, 45, 60, 90, 120])
+        step=rng.choice([15, 30, 60])
+        expected=legacy_find_slots(start, end, busy, now, duration, step)
+        actual=find_free_slots(start, end, busy, now, duration, step)
+        if expected !=actual:
+            raise AssertionError(f"case {case}: sweep returned {len(actual)} slots, legacy {len(expected)}")
+    print(f"equivalence: {cases} randomized cases identical")
+
+def best_of(func, repeat:int) -> float:
+    timings=[]
+    for _ in range(repeat):
+        started=time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser=argparse.ArgumentParser(description="legacy nested loop vs sweep-line slot finder")
+    parser.add_argument("--cases", type=int, default=500)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--weeks", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args=parser.parse_args()
+
+    check_equivalence(args.cases, args.seed)
+
+    rng=random.Random(args.seed)
+    start=datetime(2025, 1, 6, 0, 0)
+    end=start + timedelta(weeks=args.weeks)
+    now=start - timedelta(days=1)
+    print(f"{args.weeks}-week window, 60 min slots, 60 min step")
+    print(f"{'busy':>8}{'legacy ms':>12}{'sweep ms':>12}{'speedup':>10}")
+    for size in args.sizes:
+        busy=random_busy(rng, start, end, size)
+        legacy=best_of(lambda:legacy_find_slots(start, end, busy, now), 1 if size > 10000 else args.repeat)
+        sweep=best_of(lambda:find_free_slots(start, end, busy, now), args.repeat)
+        print(f"{size:>8}{legacy * 1000:>12.2f}{sweep * 1000:>12.2f}{legacy / sweep:>9.1f}x")
+
+if __name__=="__main__":
+    main()
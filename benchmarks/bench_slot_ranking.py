@@ -0,0 +1,103 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from range_availability import find_free_slots_range
+from slot_finder import merge_intervals
+from slot_ranking import SlotRanker
+
+def random_busy(rng:random.Random, start:datetime, end:datetime, count:int) -> List[Tuple[datetime, datetime]]:
+    span=int((end - start).total_seconds() // 60)
+    busy=[]
+    for _ in range(count):
+        busy_start=start + timedelta(minutes=rng.randrange(0, span, 15))
+        busy.append((busy_start, busy_start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90]))))
+    return busy
+
+def full_sort_rank(ranker:SlotRanker, slots:List[Dict], busy:List[Tuple[datetime, datetime]], k:int) -> List[Dict]:
+    # the reference: score everything, sort everything, and re-sort after every pick
+    merged=merge_intervals(busy)
+    busy_starts=[start for start, _ in merged]
+    scores=[ranker.score(slot, merged, busy_starts) for slot in slots]
+    remaining=list(range(len(slots)))
+    picked=[]
+    picks_per_day={}
+    while remaining and len(picked) < k:
+        remaining.sort(key=lambda index:(
+            ranker.spread_weight * picks_per_day.get(slots[index]['start'].date(), 0) - scores[index],
+            slots[index]['start'], slots[index]['end'], index
+        ))
+        index=remaining.pop(0)
+        picked.append(slots[index])
+        day=slots[index]['start'].date()
+        picks_per_day[day]=picks_per_day.get(day, 0) + 1
+    return picked
+
+def window(rng:random.Random, candidates:int, step:int) -> Tuple[List[Dict], List[Tuple[datetime, datetime]]]:
+    # grow the window a week at a time until it holds the requested number of free candidates
+    start=datetime(2025, 1, 6, 9, 0)
+    days=7
+    while True:
+        end=start + timedelta(days=days)
+        busy=random_busy(rng, start, end, days * 6)
+        slots=find_free_slots_range(start, end, busy, start - timedelta(days=1), 30, step)
+        if len(slots) >=candidates:
+            return slots[:candidates], busy
+        days +=7
+
+def check_agreement(cases:int, seed:int):
+    rng=random.Random(seed)
+    ranker=SlotRanker()
+    for case in range(cases):
+        slots, busy=window(rng, rng.randrange(1, 400), rng.choice([15, 30, 60]))
+        k=rng.randrange(1, 12)
+        expected=full_sort_rank(ranker, slots, busy, k)
+        actual=ranker.rank(slots, busy, k)
+        if [slot['start'] for slot in actual] !=[slot['start'] for slot in expected]:
+            raise AssertionError(f"case {case}: heap picks differ from the full-sort reference")
+        shuffled=list(slots)
+        rng.shuffle(shuffled)
+        if [slot['start'] for slot in ranker.rank(shuffled, list(reversed(busy)), k)] !=[slot['start'] for slot in actual]:
+            raise AssertionError(f"case {case}: ranking depends on input order")
+    print(f"agreement: {cases} randomized windows match the full-sort reference, independent of input order")
+
+def best_of(func, repeat:int) -> float:
+    timings=[]
+    for _ in range(repeat):
+        started=time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser=argparse.ArgumentParser(description="heap top-k slot ranking vs scoring and sorting every candidate")
+    parser.add_argument("--cases", type=int, default=300)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=5)
+    args=parser.parse_args()
+
+    check_agreement(args.cases, args.seed)
+
+    rng=random.Random(args.seed)
+    ranker=SlotRanker()
+    print(f"\ntop {args.k} of n candidates, 30 min slots on a 15 min step")
+    print(f"{'n':>7}{'days':>6}{'full sort ms':>14}{'heap ms':>9}{'speedup':>9}{'days in top k':>15}")
+    for candidates in args.candidates:
+        slots, busy=window(rng, candidates, 15)
+        days=(slots[-1]['start'].date() - slots[0]['start'].date()).days + 1
+        reference=best_of(lambda:full_sort_rank(ranker, slots, busy, args.k), args.repeat)
+        heap=best_of(lambda:ranker.rank(slots, busy, args.k), args.repeat)
+        picked_days=len({slot['start'].date() for slot in ranker.rank(slots, busy, args.k)})
+        print(f"{candidates:>7}{days:>6}{reference * 1000:>14.2f}{heap * 1000:>9.2f}{reference / heap:>8.1f}x"
+            f"{picked_days:>15}")
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List
+
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendar_backends import FakeCalendarBackend
+from calendar_service import CalendarService
+from rate_limit import TokenBucket
+from timeutil import LocalTime
+
+def busy_intervals(rng:random.Random, count:int, shape:str, zone) -> List[Dict]:
+    # a year and a half around now, so DST zones cross a few changes
+    base=datetime.now(UTC).replace(tzinfo=None, microsecond=0) - timedelta(days=180)
+    busy=[]
+    for _ in range(count):
+        start=base + timedelta(minutes=rng.randrange(0, 540 * 24 * 60, 15))
+        end=start + timedelta(minutes=rng.choice([15, 30, 60, 90]))
+        if shape=="utc":
+            # what free/busy sends for timeZone UTC
+            busy.append({'start':start.isoformat() + 'Z', 'end':end.isoformat() + 'Z'})
+        else:
+            # events fetched with their own zone's offset
+            busy.append({
+                'start':pytz.utc.localize(start).astimezone(zone).isoformat(),
+                'end':pytz.utc.localize(end).astimezone(zone).isoformat()
+            })
+    return busy
+
+def legacy_parse(busy_times:List[Dict], timezone_name:str) -> List[tuple]:
+    # CalendarService._parse_busy_periods before the offset tables: a zone lookup per call and a pytz
+    # astimezone per value
+    ist_tz=pytz.timezone(timezone_name)
+    busy_periods=[]
+    for busy in busy_times:
+        try:
+            start_str=busy['start']
+            end_str=busy['end']
+            if isinstance(start_str, dict):
+                start_str=start_str.get('dateTime', start_str.get('date', ''))
+                end_str=end_str.get('dateTime', end_str.get('date', ''))
+            if 'T' in start_str:
+                start=datetime.fromisoformat(start_str.replace('Z', '+00:00'))
+                end=datetime.fromisoformat(end_str.replace('Z', '+00:00'))
+                if start.tzinfo:
+                    start_ist=start.astimezone(ist_tz).replace(tzinfo=None)
+                    end_ist=end.astimezone(ist_tz).replace(tzinfo=None)
+                else:
+                    start_ist=start
+                    end_ist=end
+            else:
+                start_ist=datetime.fromisoformat(start_str)
+                end_ist=datetime.fromisoformat(end_str)
+            busy_periods.append((start_ist, end_ist))
+        except Exception:
+            continue
+    return busy_periods
+
+def best_of(func, repeat:int) -> float:
+    timings=[]
+    for _ in range(repeat):
+        started=time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser=argparse.ArgumentParser(description="busy interval parsing: per-value pytz vs precomputed offset tables")
+    parser.add_argument("--intervals", type=int, default=100000)
+    parser.add_argument("--zones", nargs="+", default=["Asia/Kolkata", "America/New_York", "Europe/London"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=3)
+    args=parser.parse_args()
+
+    service=CalendarService(backend=FakeCalendarBackend(pattern="empty"), rate_limiter=TokenBucket(rate=0), mirror=None)
+    print(f"{args.intervals} busy intervals per run, best of {args.repeat}")
+    print(f"{'zone':<20}{'format':>8}{'table ms':>10}{'legacy ms':>11}{'new ms':>9}{'speedup':>9}")
+    for zone_name in args.zones:
+        started=time.perf_counter()
+        service.local_time=LocalTime(zone_name)
+        build_ms=(time.perf_counter() - started) * 1000
+        for shape in ("utc", "offset"):
+            busy=busy_intervals(random.Random(args.seed), args.intervals, shape, pytz.timezone(zone_name))
+            expected=legacy_parse(busy, zone_name)
+            if service._parse_busy_periods(busy) !=expected:
+                raise AssertionError(f"{zone_name} {shape}: parsed intervals differ")
+            legacy_ms=best_of(lambda:legacy_parse(busy, zone_name), args.repeat) * 1000
+            new_ms=best_of(lambda:service._parse_busy_periods(busy), args.repeat) * 1000
+            print(f"{zone_name:<20}{shape:>8}{build_ms:>10.1f}{legacy_ms:>11.1f}{new_ms:>9.1f}{legacy_ms / new_ms:>8.1f}x")
+    print("\ntable ms: one-off cost of building the zone's offset table; results checked identical to the legacy parse")
+
+if __name__=="__main__":
+    main()
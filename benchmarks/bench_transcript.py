@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+# main builds its BookingAgent at import time, so select the fake calendar before importing it
+Config.CALENDAR_BACKEND="fake"
+# nothing is booked here, so no journal file is left behind either
+Config.BOOKING_JOURNAL_PATH=":memory:"
+
+from fastapi.testclient import TestClient
+
+import main
+from session_store import new_session_state
+
+ASSISTANT_REPLY=(
+    "I found available slots for Friday, December 20:\n\n1. 09:00 AM - 10:00 AM\n"
+    "2. 10:00 AM - 11:00 AM\n3. 02:00 PM - 03:00 PM\n\n which slot works for you? Reply with the number (1-3)."
+)
+
+def build_history(turns:int) -> List[Dict]:
+    history=[]
+    for turn in range(turns):
+        history.append({"role":"user", "content":f"check my availability on friday ({turn})"})
+        history.append({"role":"assistant", "content":ASSISTANT_REPLY})
+    return history
+
+def measure(client:TestClient, payloads:List[Dict]) -> Dict:
+    latencies=[]
+    request_bytes=[]
+    response_bytes=[]
+    for payload in payloads:
+        body=json.dumps(payload)
+        started=time.perf_counter()
+        response=client.post("/chat", content=body, headers={"content-type":"application/json"})
+        latencies.append(time.perf_counter() - started)
+        request_bytes.append(len(body))
+        response_bytes.append(len(response.content))
+    return {
+        "request_bytes":statistics.median(request_bytes),
+        "response_bytes":statistics.median(response_bytes),
+        "latency_ms":statistics.median(latencies) * 1000
+    }
+
+def legacy_payloads(turns:int, requests:int) -> List[Dict]:
+    history=build_history(turns)
+    return [
+        {"message":"hello", "conversation_history":history, "session_id":f"legacy-{turns}"}
+        for _ in range(requests)
+    ]
+
+def delta_payloads(turns:int, requests:int) -> List[Dict]:
+    session_id=f"delta-{turns}"
+    state=new_session_state()
+    state["messages"]=build_history(turns)
+    main.booking_agent.session_store.save(session_id, state)
+    # each hello turn appends two messages, so the cursor advances by two per request
+    return [
+        {"message":"hello", "session_id":session_id, "cursor":turns * 2 + index * 2}
+        for index in range(requests)
+    ]
+
+def main_benchmark():
+    parser=argparse.ArgumentParser(description="full-history vs server-side transcript /chat payloads")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--requests", type=int, default=20)
+    args=parser.parse_args()
+
+    client=TestClient(main.app)
+    print(f"{'mode':<8}{'turns':>7}{'request B':>12}{'response B':>12}{'p50 ms':>10}")
+    for turns in args.turns:
+        for mode, build in (("legacy", legacy_payloads), ("delta", delta_payloads)):
+            result=measure(client, build(turns, args.requests))
+            print(f"{mode:<8}{turns:>7}{result['request_bytes']:>12.0f}"
+                f"{result['response_bytes']:>12.0f}{result['latency_ms']:>10.2f}")
+
+if __name__=="__main__":
+    main_benchmark()
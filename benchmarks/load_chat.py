@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from config import Config
+
+PERIODS=["morning", "afternoon"]
+
+def business_days(count:int, after:date) -> List[date]:
+    days=[]
+    day=after
+    while len(days) < count:
+        day +=timedelta(days=1)
+        if day.weekday() < 5:
+            days.append(day)
+    return days
+
+def script_for(index:int, days:List[date]) -> List[str]:
+    # check, ask to book, pick the first slot, confirm: the full happy path of a booking
+    day=days[index % len(days)].strftime("%B %d").lower()
+    period=PERIODS[(index // len(days)) % len(PERIODS)]
+    return [
+        f"check my availability on {day}",
+        f"book a meeting on {day} {period}",
+        "1",
+        "yes"
+    ]
+
+async def run_conversation(client:httpx.AsyncClient, session_id:str, script:List[str],
+                        latencies:List[float]) -> bool:
+    cursor=0
+    for message in script:
+        started=time.perf_counter()
+        response=await client.post("/chat", json={"message":message, "session_id":session_id, "cursor":cursor})
+        latencies.append(time.perf_counter() - started)
+        result=response.json()
+        cursor=result.get("cursor") or cursor
+        if result.get("booking_confirmed"):
+            return True
+        if message.startswith("book") and "Reply with the number" not in result["response"]:
+            # no free slot left for this day and period
+            return False
+    return False
+
+async def run_level(client:httpx.AsyncClient, conversations:int, concurrency:int,
+                    days:List[date], label:str) -> Dict:
+    semaphore=asyncio.Semaphore(concurrency)
+    latencies=[]
+
+    async def limited(index:int) -> bool:
+        async with semaphore:
+            return await run_conversation(client, f"{label}-{index}", script_for(index, days), latencies)
+
+    started=time.perf_counter()
+    booked=await asyncio.gather(*[limited(index) for index in range(conversations)])
+    wall=time.perf_counter() - started
+    return {"booked":sum(booked), "latencies":latencies, "wall":wall}
+
+def percentile(values:List[float], pct:float) -> float:
+    ordered=sorted(values)
+    index=min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run(args) -> None:
+    days=business_days(args.days, datetime.now().date())
+    print(f"{'chats':>6}{'booked':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'cal/booking':>13}  calls")
+    for concurrency in args.concurrency:
+        backend=None
+        if args.url:
+            client=httpx.AsyncClient(base_url=args.url, timeout=60)
+        else:
+            import main
+            from booking_agent import BookingAgent
+            from booking_journal import BookingJournal
+            from calendar_backends import FakeCalendarBackend
+            from calendar_service import CalendarService
+            from session_store import MemorySessionStore
+
+            # a fresh calendar and agent per level so earlier bookings don't fill later runs
+            backend=FakeCalendarBackend(
+                pattern=args.pattern, seed=args.seed, latency_ms=args.latency_ms, error_rate=args.error_rate
+            )
+            main.booking_agent=BookingAgent(
+                calendar_service=CalendarService(backend=backend), session_store=MemorySessionStore(),
+                booking_journal=BookingJournal(":memory:")
+            )
+            if not args.no_index:
+                main.booking_agent.availability_index.start()
+            client=httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://load", timeout=60)
+
+        async with client:
+            result=await run_level(client, args.conversations, concurrency, days, f"load-{concurrency}")
+
+        calls=""
+        per_booking=float("nan")
+        if backend is not None:
+            await main.booking_agent.availability_index.stop()
+            main.booking_agent.calendar_service.shutdown()
+            total_calls=sum(backend.calls.values())
+            per_booking=total_calls / result["booked"] if result["booked"] else float("nan")
+            calls=" ".join(f"{name}={count}" for name, count in sorted(backend.calls.items()))
+            calls +=f" retries={main.booking_agent.booking_writer.retries}"
+        latencies=result["latencies"]
+        print(f"{concurrency:>6}{result['booked']:>8}{len(latencies) / result['wall']:>9.1f}"
+            f"{percentile(latencies, 50) * 1000:>9.1f}{percentile(latencies, 95) * 1000:>9.1f}"
+            f"{percentile(latencies, 99) * 1000:>9.1f}{per_booking:>13.2f}  {calls}")
+
+def main_benchmark(argv:Optional[List[str]]=None):
+    parser=argparse.ArgumentParser(description="scripted multi-turn booking conversations against /chat")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--latency-ms", type=float, default=50, help="fake calendar latency per API call")
+    parser.add_argument("--pattern", default="typical", help="fake calendar busy pattern")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake inserts failing with 429/503")
+    parser.add_argument("--days", type=int, default=5, help="business days the conversations book into")
+    parser.add_argument("--no-index", action="store_true", help="don't run the availability index")
+    parser.add_argument("--url", help="drive a running server instead of an in-process app with the fake calendar")
+    args=parser.parse_args(argv)
+
+    if not args.url:
+        # main builds its BookingAgent at import time, so select the fake calendar before importing it
+        Config.CALENDAR_BACKEND="fake"
+        Config.BOOKING_JOURNAL_PATH=":memory:"
+    asyncio.run(run(args))
+
+if __name__=="__main__":
+    main_benchmark()
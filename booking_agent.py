@@ -1,87 +1,106 @@
-from datetime import datetime, timedelta, timezone, UTC
-from typing import Dict, List, Optional
-import re
-import pytz
-from dateutil import parser
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+import uuid
 
-from calendar_service import CalendarService
+from availability_index import AvailabilityIndex
+from booking_journal import BookingJournal, BookingWriter, booking_request_id
+from calendar_mirror import MirrorPoller
+from calendar_service import AsyncCalendarService, CalendarService
 from config import Config
+from entity_extractor import entity_extractor
+from intent_classifier import intent_classifier
+from profiling import span
+from range_availability import slots_by_day
+from scheduler import (
+    SCHEDULER_DEFAULT_GAP_MINUTES, SCHEDULER_DEFAULT_OCCURRENCES, SCHEDULER_MAX_MEETINGS, SCHEDULER_STEP_MINUTES,
+    scheduler
+)
+from session_store import (
+    SessionStore, clear_booking_state, create_session_store, new_session_state, transcript_session_id,
+    trim_transcript
+)
+from slot_ranking import slot_ranker
+from timeutil import local_time, reset_user_zone, set_user_zone, user_now, user_zone, zone
 
 class BookingAgent:
-    def __init__(self):
-        self.calendar_service=CalendarService()
-        self.timezone=pytz.timezone(Config.TIMEZONE)
-        self.current_slots=[]
-        self.selected_slot=None
-        self.booking_details={}
-        
-    def process_message(self, message:str, conversation_history:List[Dict]=None) -> Dict:
-        history=conversation_history or []
-        user_input=message.lower().strip()
-        if self._is_slot_selection(message, history):
-            return self._handle_slot_selection(message, history)
-        elif self._is_confirmation(message, history):
-            return self._handle_confirmation(message, history)
-        elif self._is_availability_check(user_input):
-            return self._check_availability(message, history)
-        elif self._is_booking_request(user_input):
-            return self._handle_booking(message, history)
+    def __init__(self, calendar_service:Optional[CalendarService]=None,
+                session_store:Optional[SessionStore]=None,
+                booking_journal:Optional[BookingJournal]=None):
+        if isinstance(calendar_service, AsyncCalendarService):
+            self.calendar_service=calendar_service
         else:
-            return self._handle_general(message, history)
-    
-    def _is_availability_check(self, message:str) -> bool:
-        patterns=[
-            r'(check|show|see|what|when).*(availability|available|free|time)',
-            r'(availability|available|free).*(today|tomorrow|monday|tuesday|wednesday|thursday|friday)',
-            r'(do you have|any).*(free time|available|open)',
-            r'free time.*on',
-            r'available.*on'
-        ]
-        return any(re.search(pattern, message, re.IGNORECASE) for pattern in patterns)
-    
-    def _is_booking_request(self, message:str) -> bool:
-        patterns=[
-            r'(schedule|book|set up|arrange).*(meeting|call|appointment)',
-            r'(want to|need to|would like to).*(schedule|book|meet)',
-            r'book.*meeting',
-            r'schedule.*call',
-            r'meeting.*between',
-            r'call.*tomorrow'
-        ]
-        return any(re.search(pattern, message, re.IGNORECASE) for pattern in patterns)
-    
-    def _is_slot_selection(self, message:str, history:List[Dict]) -> bool:
-        last_bot_message=""
-        for msg in reversed(history[-3:]):
-            if msg.get("role")=="assistant":
-                last_bot_message=msg.get("content", "").lower()
-                break
-        if "reply with the number" in last_bot_message or "which slot" in last_bot_message:
-            return bool(re.search(r'\b[1-9]\b', message))
-        return False
-    
-    def _is_confirmation(self, message:str, history:List[Dict]) -> bool:
-        last_bot_message=""
-        for msg in reversed(history[-3:]):
-            if msg.get("role")=="assistant":
-                last_bot_message=msg.get("content", "").lower()
-                break
-        if "confirm" in last_bot_message or "say yes" in last_bot_message:
-            return any(word in message.lower() for word in ["yes", "no", "confirm", "cancel"])
-        return False
-    
-    def _check_availability(self, message:str, history:List[Dict]) -> Dict:
-        date_str=self._extract_date(message)
-        if not date_str:
-            date_str="today"
-        target_date=self._parse_date(date_str)
-        if not target_date:
-            return self._create_response(
-                "I couldn't understand the date. can you specify (e.g., 'today', 'tomorrow', 'Friday')",
-                history, message
-            )
+            self.calendar_service=AsyncCalendarService(calendar_service)
+        self.session_store=session_store or create_session_store()
+        self.availability_index=AvailabilityIndex(self.calendar_service)
+        # changes pulled into the mirror are pushed on to the index rather than waiting for its next refresh
+        self.mirror_poller=MirrorPoller(self.calendar_service, on_change=self.availability_index.refresh)
+        self.booking_writer=BookingWriter(self.calendar_service, booking_journal)
+        self.local_time=local_time()
+        
+    async def process_message(self, message:str, conversation_history:List[Dict]=None,
+                        session_id:Optional[str]=None,
+                        on_section:Optional[Callable[[str], None]]=None,
+                        timezone:Optional[str]=None) -> Dict:
+        with span("session.load"):
+            state=self.session_store.load(session_id) if session_id else new_session_state()
+            if conversation_history and state==new_session_state():
+                # a client that sends its whole history but never the session id back: found by its transcript
+                state=self.session_store.load(transcript_session_id(conversation_history))
+        # without a client-supplied history the server-side transcript is the history
+        server_history=conversation_history is None and session_id is not None
+        history=state["messages"] if server_history else (conversation_history or [])
+        # a zone sent once is kept for the session; "today" and "tomorrow" are the user's days
+        if timezone:
+            state["timezone"]=timezone
+        token=set_user_zone(state.get("timezone"))
+        try:
+            result=await self._dispatch(message, history, state, on_section)
+        finally:
+            reset_user_zone(token)
+        if server_history:
+            trim_transcript(state)
+            result["cursor"]=state["transcript_offset"] + len(state["messages"])
+        if session_id:
+            with span("session.save"):
+                self.session_store.save(session_id, state)
+                if conversation_history is not None:
+                    # the reply extended the history in place: that is the transcript the client sends next.
+                    # old keys are left to the TTL and LRU, so a retried turn still finds its state
+                    self.session_store.save(transcript_session_id(history), state)
+        return result
 
+    async def _dispatch(self, message:str, history:List[Dict], state:Dict,
+                        on_section:Optional[Callable[[str], None]]=None) -> Dict:
+        with span("intent"):
+            classified=intent_classifier.classify(message, history)
+        intent=classified["intent"]
+        with span(f"handle.{intent}"):
+            if intent=="slot_selection":
+                result=self._handle_slot_selection(message, history, state, classified["entities"])
+            elif intent=="confirmation":
+                result=await self._handle_confirmation(message, history, state)
+            elif intent=="availability":
+                result=await self._check_availability(message, history, on_section)
+            elif intent=="booking":
+                result=await self._handle_booking(message, history, state, on_section)
+            elif intent=="multi_booking":
+                result=await self._handle_multi_booking(message, history, state, on_section)
+            else:
+                result=self._handle_general(message, history)
+        # reported with the request latency in /metrics
+        result["intent"]=intent
+        return result
+    
+    async def _check_availability(self, message:str, history:List[Dict],
+                                on_section:Optional[Callable[[str], None]]=None) -> Dict:
         current_time=self._get_current_time()
+        with span("entities"):
+            entities=entity_extractor.extract(message, self._get_user_today())
+        if entities.date_range and entities.date_range[1] > entities.date_range[0]:
+            return await self._check_range_availability(entities.date_range, history, message, on_section)
+        target_date=self._to_target_date(entities.date or self._get_user_today())
+
         if target_date.date() < current_time.date():
             return self._create_response(
                 f"this is the past date!",
@@ -94,60 +113,70 @@ class BookingAgent:
                 f"It's a weekend free time! You don't have work slots for {day_name}. Enjoy your time off!",
                 history, message
             )
-        slots=self._get_available_slots(target_date)
+        slots=await self._get_available_slots(target_date)
         if not slots:
             return self._create_response(
                 f"Your calendar is fully booked for {target_date.strftime('%A, %B %d')}. Would you like to try a different day?",
                 history, message
             )
         day_name=target_date.strftime("%A, %B %d")
-        response=f"Here's your availability for {day_name}:\n\n"
+        sections=[]
+        self._emit_section(sections, f"Here's your availability for {day_name}:\n\n", on_section)
         
-        morning_slots=[s for s in slots if s["start"].hour < 12]
-        afternoon_slots=[s for s in slots if 12 <=s["start"].hour < 17]
-        evening_slots=[s for s in slots if s["start"].hour >=17]
+        morning_slots=[s for s in slots if self._on_user_clock(s["start"]).hour < 12]
+        afternoon_slots=[s for s in slots if 12 <=self._on_user_clock(s["start"]).hour < 17]
+        evening_slots=[s for s in slots if self._on_user_clock(s["start"]).hour >=17]
         
-        if morning_slots:
-            response +="Morning:\n"
-            for slot in morning_slots:
-                response +=f"  • {slot['start'].strftime('%I:%M %p')} - {slot['end'].strftime('%I:%M %p')}\n"
-            response +="\n"
+        for label, period_slots in (("Morning", morning_slots), ("Afternoon", afternoon_slots), ("Evening", evening_slots)):
+            if period_slots:
+                lines=[f"  • {self._clock(slot['start'])} - {self._clock(slot['end'], label=True)}\n" for slot in period_slots]
+                self._emit_section(sections, f"{label}:\n{''.join(lines)}\n", on_section)
         
-        if afternoon_slots:
-            response +="Afternoon:\n"
-            for slot in afternoon_slots:
-                response +=f"  • {slot['start'].strftime('%I:%M %p')} - {slot['end'].strftime('%I:%M %p')}\n"
-            response +="\n"
+        self._emit_section(sections, "would you like to book any of these times?", on_section)
         
-        if evening_slots:
-            response +="Evening:\n"
-            for slot in evening_slots:
-                response +=f"  • {slot['start'].strftime('%I:%M %p')} - {slot['end'].strftime('%I:%M %p')}\n"
-            response +="\n"
-        
-        response +="would you like to book any of these times?"
-        
-        return self._create_response(response, history, message)
+        return self._create_response("".join(sections), history, message)
     
-    def _handle_booking(self, message:str, history:List[Dict]) -> Dict:
+    async def _check_range_availability(self, date_range:Tuple[date, date], history:List[Dict], message:str,
+                                        on_section:Optional[Callable[[str], None]]=None) -> Dict:
+        first_day, last_day=date_range
+        slots=await self._get_available_slots_range(first_day, last_day)
+        range_label=f"{first_day.strftime('%A, %B %d')} to {last_day.strftime('%A, %B %d')}"
+        if not slots:
+            return self._create_response(
+                f"Your calendar is fully booked from {range_label}. Would you like to try a different week?",
+                history, message
+            )
+        sections=[]
+        self._emit_section(sections, f"Here's your availability from {range_label}:\n\n", on_section)
+
+        # one line per working day, so a week or a month still reads as a short reply
+        free_by_day=slots_by_day(slots)
+        day=first_day
+        while day <=last_day:
+            if day.weekday() < 5:
+                day_slots=free_by_day.get(day)
+                times=", ".join(self._clock(slot['start'], label=True) for slot in day_slots) if day_slots else "fully booked"
+                self._emit_section(sections, f"{day.strftime('%A, %B %d')}: {times}\n", on_section)
+            day +=timedelta(days=1)
+
+        self._emit_section(sections, "\nwould you like to book any of these times?", on_section)
+        return self._create_response("".join(sections), history, message)
+
+    async def _handle_booking(self, message:str, history:List[Dict], state:Dict,
+                            on_section:Optional[Callable[[str], None]]=None) -> Dict:
         details=self._extract_booking_details(message)
         if not details.get("date"):
             return self._create_response(
                 "I'd be happy to help you schedule a meeting! What day would you like to meet? (e.g., 'tomorrow', 'Friday', 'next Monday')",
                 history, message
             )
-        if not details.get("time") and not details.get("time_period"):
-            self.booking_details=details
+        if not details.get("time") and not details.get("time_period") and not details.get("time_range"):
+            state["booking_details"]=details
             return self._create_response(
                 f"Great! For {details['date']}, what time works best? (e.g., 'morning', '2 PM', 'between 3-5 PM')",
                 history, message
             )
-        target_date=self._parse_date(details["date"])
-        if not target_date:
-            return self._create_response(
-                "i couldn't understand the date. Could you be more specific?",
-                history, message
-            )
+        target_date=self._to_target_date(details["parsed_date"])
         
         current_time=self._get_current_time()
         if target_date.date() < current_time.date():
@@ -155,77 +184,196 @@ class BookingAgent:
                 "that date has already passed. Please choose a future date.",
                 history, message
             )
-        if target_date.weekday() >=5:
-            day_name=target_date.strftime("%A, %B %d")
+        if details.get("date_range"):
+            first_day, last_day=details["date_range"]
+            when=f"between {first_day.strftime('%A, %B %d')} and {last_day.strftime('%A, %B %d')}"
+            slots, busy_periods=await self._find_booking_slots_range(details)
+        else:
+            if target_date.weekday() >=5:
+                day_name=target_date.strftime("%A, %B %d")
+                return self._create_response(
+                    f"it's a weekend free time! You don't have work slots for {day_name}.How about choosing a weekday instead?",
+                    history, message
+                )
+            if target_date.date()==current_time.date() and current_time.hour >=18:
+                return self._create_response(
+                    f"work day has ended for you! You don't have slots after 6:00 PM. Please choose tomorrow or another day.",
+                    history, message
+                )
+            if target_date.weekday() >=5:
+                day_name=target_date.strftime("%A, %B %d")
+                return self._create_response(
+                    f"It's a weekend free time! You don't have work slots for {day_name}.how about choosing a weekday instead?",
+                    history, message
+                )
+            if target_date.date()==current_time.date() and current_time.hour >=18:
+                return self._create_response(
+                    f"work day has ended for you! You don't have slots after 6:00 PM. please choose tomorrow or another day.",
+                    history, message
+                )
+            when=f"on {target_date.strftime('%A, %B %d')}"
+            slots, busy_periods=await self._find_booking_slots(target_date, details)
+        
+        if not slots:
             return self._create_response(
-                f"it's a weekend free time! You don't have work slots for {day_name}.How about choosing a weekday instead?",
+                f"no available slots found for {details['date']} {self._describe_time(details)}. Would you like to try a different time?",
                 history, message
             )
-        if target_date.date()==current_time.date() and current_time.hour >=18:
+        # the best few by preferred hours, breathing room and spread across days, best first
+        with span("rank_slots"):
+            slots=slot_ranker.rank(slots, busy_periods)
+        state["current_slots"]=slots
+        state["booking_details"]=details
+
+        sections=[]
+        if details.get("attendees"):
+            self._emit_section(sections, f"I found slots {when} when you and {', '.join(details['attendees'])} are all free:\n\n", on_section)
+        else:
+            self._emit_section(sections, f"I found available slots {when}:\n\n", on_section)
+        
+        lines=[
+            f"{i}. {self._clock(slot['start'], day=bool(details.get('date_range')))} - {self._clock(slot['end'], label=True)}\n"
+            for i, slot in enumerate(slots, 1)
+        ]
+        self._emit_section(sections, "".join(lines), on_section)
+        self._emit_section(sections, f"\n which slot works for you? Reply with the number (1-{len(slots)}).", on_section)
+        
+        return self._create_response("".join(sections), history, message)
+    
+    async def _handle_multi_booking(self, message:str, history:List[Dict], state:Dict,
+                                    on_section:Optional[Callable[[str], None]]=None) -> Dict:
+        with span("entities"):
+            series=entity_extractor.extract_series(message, SCHEDULER_DEFAULT_GAP_MINUTES)
+        # the series phrases are gone from the remainder, so "2 hours apart" can't become the meeting length
+        details=self._extract_booking_details(series.remainder)
+        current_time=self._get_current_time()
+        meeting_days=self._series_days(series, details, self._get_user_today())
+        if not meeting_days:
+            # "daily for 2 days" from a saturday has no working day in it
             return self._create_response(
-                f"work day has ended for you! You don't have slots after 6:00 PM. Please choose tomorrow or another day.",
+                "There are no working days in that range. Would you like to try a different range of days?",
                 history, message
             )
-        if target_date.weekday() >=5:
-            day_name=target_date.strftime("%A, %B %d")
+        if len(meeting_days) > SCHEDULER_MAX_MEETINGS:
             return self._create_response(
-                f"It's a weekend free time! You don't have work slots for {day_name}.how about choosing a weekday instead?",
+                f"I can plan up to {SCHEDULER_MAX_MEETINGS} meetings at a time. Could you ask for fewer?",
                 history, message
             )
-        if target_date.date()==current_time.date() and current_time.hour >=18:
+        duration=details.get("duration_minutes", 60)
+        windows=[
+            (self._get_time_range(self._to_target_date(first_day), details)[0],
+             self._get_time_range(self._to_target_date(last_day), details)[1])
+            for first_day, last_day in meeting_days
+        ]
+        horizon_start=min(start for start, _ in windows)
+        horizon_end=max(end for _, end in windows)
+        if horizon_end <=current_time:
             return self._create_response(
-                f"work day has ended for you! You don't have slots after 6:00 PM. please choose tomorrow or another day.",
+                "that date has already passed. Please choose a future date.",
                 history, message
             )
-        start_time, end_time=self._get_time_range(target_date, details)
-        if start_time <=current_time:
-            start_time=current_time + timedelta(hours=1)
-            start_time=start_time.replace(minute=0, second=0, microsecond=0)
-        
-        slots=self.calendar_service.find_available_slots(start_time, end_time, 60)
-        
-        if not slots:
+
+        slots, busy_periods=await self.calendar_service.find_slot_candidates(
+            horizon_start, horizon_end, duration, step_minutes=SCHEDULER_STEP_MINUTES,
+            attendees=details.get("attendees"), multi_day=True
+        )
+        # multi-day windows cover whole business days; keep only the asked-for part of each one
+        first_time=horizon_start.time()
+        last_time=self._get_time_range(self._to_target_date(meeting_days[-1][1]), details)[1].time()
+        slots=[
+            slot for slot in slots
+            if first_time <=slot['start'].time() and slot['end'] <=datetime.combine(slot['start'].date(), last_time)
+        ]
+        with span("schedule"):
+            # bounded by the scheduler's time budget, but still kept off the event loop
+            result=await asyncio.to_thread(
+                scheduler.solve, slots, busy_periods, windows, duration, series.min_gap_minutes,
+                series.max_per_day, series.recurrence
+            )
+        if not result.slots:
             return self._create_response(
-                f"no available slots found for {details['date']} {details.get('time_period', details.get('time', ''))}. Would you like to try a different time?",
+                f"I couldn't fit those {len(windows)} meetings into your calendar. Would you like to try a wider range of days?",
                 history, message
             )
-        self.current_slots=slots
-        self.booking_details=details
+        state["proposed_meetings"]=result.slots
+        state["proposal_id"]=uuid.uuid4().hex
+        state["booking_details"]=details
 
-        day_name=target_date.strftime("%A, %B %d")
-        response=f"I found available slots for {day_name}:\n\n"
-        
-        for i, slot in enumerate(slots[:5], 1):
-            time_str=slot["start"].strftime("%I:%M %p")
-            end_str=slot["end"].strftime("%I:%M %p")
-            response +=f"{i}. {time_str} - {end_str}\n"
-        
-        response +=f"\n which slot works for you? Reply with the number (1-{min(len(slots), 5)})."
-        
-        return self._create_response(response, history, message)
-    
-    def _handle_slot_selection(self, message:str, history:List[Dict]) -> Dict:
-        match=re.search(r'\b([1-9])\b', message)
-        if not match:
+        sections=[]
+        if result.complete:
+            self._emit_section(sections, f"Here's a plan for all {len(result.slots)} meetings:\n\n", on_section)
+        else:
+            self._emit_section(
+                sections, f"I could only fit {len(result.slots)} of the {len(windows)} meetings:\n\n", on_section
+            )
+        lines=[
+            f"{i}. {self._clock(slot['start'], day=True)} - {self._clock(slot['end'], label=True)}\n"
+            for i, slot in enumerate(result.slots, 1)
+        ]
+        self._emit_section(sections, "".join(lines), on_section)
+        self._emit_section(sections, "\nShould I book all of these? Say 'yes' to confirm.", on_section)
+        return self._create_response("".join(sections), history, message)
+
+    def _series_days(self, series, details:Dict, today:date) -> List[Tuple[date, date]]:
+        # the days each meeting may go on, one (first_day, last_day) per meeting
+        first_day=details["date_range"][0] if details.get("date_range") else details.get("parsed_date", today)
+        if series.recurrence=="weekly":
+            count=series.count or (series.span_days // 7 if series.span_days else SCHEDULER_DEFAULT_OCCURRENCES)
+            if details.get("parsed_date") and not details.get("date_range"):
+                # "every monday", "weekly from tomorrow": the same day each week
+                return [(first_day + timedelta(weeks=week),) * 2 for week in range(max(count, 1))]
+            if first_day.weekday() >=5:
+                first_day +=timedelta(days=7 - first_day.weekday())
+            monday=first_day - timedelta(days=first_day.weekday())
+            return [
+                (max(monday + timedelta(weeks=week), first_day), monday + timedelta(weeks=week, days=4))
+                for week in range(max(count, 1))
+            ]
+        if series.recurrence=="daily":
+            # working days only: "daily for 2 weeks" is ten meetings
+            count=series.count or SCHEDULER_DEFAULT_OCCURRENCES
+            if not series.count and series.span_days:
+                count=sum(1 for offset in range(series.span_days) if (first_day + timedelta(days=offset)).weekday() < 5)
+            days=[]
+            day=first_day
+            while len(days) < count:
+                if day.weekday() < 5:
+                    days.append((day, day))
+                day +=timedelta(days=1)
+            return days
+        if details.get("date_range"):
+            window=details["date_range"]
+        elif details.get("parsed_date"):
+            window=(first_day, first_day)
+        else:
+            # no day given: the week ahead
+            window=(today, today + timedelta(days=6))
+        return [window] * (series.count or 2)
+
+    def _handle_slot_selection(self, message:str, history:List[Dict], state:Dict, entities:Dict) -> Dict:
+        if not entities.get("slot_number"):
             return self._create_response(
                 "Please select a valid slot number.",
                 history, message
             )
         
-        slot_num=int(match.group(1))
+        slot_num=int(entities["slot_number"])
+        current_slots=state["current_slots"]
         
-        if not self.current_slots or slot_num > len(self.current_slots):
+        if not current_slots or slot_num > len(current_slots):
             return self._create_response(
-                f"Please select a number between 1 and {len(self.current_slots) if self.current_slots else 1}.",
+                f"Please select a number between 1 and {len(current_slots) if current_slots else 1}.",
                 history, message
             )
     
-        self.selected_slot=self.current_slots[slot_num - 1]
-        start_time=self.selected_slot["start"]
-        end_time=self.selected_slot["end"]
-        day_name=start_time.strftime("%A, %B %d")
-        time_str=start_time.strftime("%I:%M %p")
-        end_str=end_time.strftime("%I:%M %p")
+        state["selected_slot"]=current_slots[slot_num - 1]
+        start_time=state["selected_slot"]["start"]
+        end_time=state["selected_slot"]["end"]
+        # fixed for this selection, so repeated confirmations can't create a second event
+        state["booking_request_id"]=booking_request_id(Config.CALENDAR_ID, start_time, end_time, uuid.uuid4().hex)
+        day_name=self._on_user_clock(start_time).strftime("%A, %B %d")
+        time_str=self._clock(start_time)
+        end_str=self._clock(end_time, label=True)
         
         response=f"perfect! I'll book your meeting for:\n\n"
         response +=f"{day_name}\n"
@@ -234,28 +382,37 @@ class BookingAgent:
         
         return self._create_response(response, history, message)
     
-    def _handle_confirmation(self, message:str, history:List[Dict]) -> Dict:
+    async def _handle_confirmation(self, message:str, history:List[Dict], state:Dict) -> Dict:
         user_response=message.lower().strip()
         
         if any(word in user_response for word in ["yes", "confirm", "ok", "sure"]):
-            if not self.selected_slot:
+            if state.get("proposed_meetings"):
+                return await self._confirm_proposal(message, history, state)
+            selected_slot=state["selected_slot"]
+            if not selected_slot:
                 return self._create_response(
                     "I don't have a slot selected. Please start over.",
                     history, message
                 )
     
-            event_id=self.calendar_service.create_event(
-                title="Meeting",
-                start_time=self.selected_slot["start"],
-                end_time=self.selected_slot["end"],
-                description="Scheduled via AI Booking Agent"
+            request_id=state.get("booking_request_id") or booking_request_id(
+                Config.CALENDAR_ID, selected_slot["start"], selected_slot["end"], uuid.uuid4().hex
             )
+            state["booking_request_id"]=request_id
+            event_id=await self.booking_writer.book(request_id, {
+                "title":"Meeting",
+                "start_time":selected_slot["start"],
+                "end_time":selected_slot["end"],
+                "description":"Scheduled via AI Booking Agent",
+                "attendees":state["booking_details"].get("attendees")
+            })
             
             if event_id:
-                start_time=self.selected_slot["start"]
-                day_name=start_time.strftime("%A, %B %d")
-                time_str=start_time.strftime("%I:%M %p")
-                end_str=self.selected_slot["end"].strftime("%I:%M %p")
+                self.availability_index.record_busy(selected_slot["start"], selected_slot["end"])
+                start_time=selected_slot["start"]
+                day_name=self._on_user_clock(start_time).strftime("%A, %B %d")
+                time_str=self._clock(start_time)
+                end_str=self._clock(selected_slot["end"], label=True)
                 
                 response=f"Booking Confirmed!\n\n"
                 response +=f"Your meeting is scheduled for:\n"
@@ -264,9 +421,7 @@ class BookingAgent:
                 response +="The meeting has been added to your calendar!"
                 
                 # Clear state
-                self.current_slots=[]
-                self.selected_slot=None
-                self.booking_details={}
+                clear_booking_state(state)
                 
                 return self._create_response(response, history, message, booking_confirmed=True)
             else:
@@ -276,9 +431,7 @@ class BookingAgent:
                 )
         
         elif any(word in user_response for word in ["no", "cancel"]):
-            self.current_slots=[]
-            self.selected_slot=None
-            self.booking_details={}
+            clear_booking_state(state)
             
             return self._create_response(
                 "No problem! The booking has been cancelled. Is there anything else I can help you with?",
@@ -291,6 +444,45 @@ class BookingAgent:
                 history, message
             )
     
+    async def _confirm_proposal(self, message:str, history:List[Dict], state:Dict) -> Dict:
+        # ids fixed by the proposal, so saying yes again only retries what didn't go through
+        proposal_id=state.get("proposal_id") or uuid.uuid4().hex
+        state["proposal_id"]=proposal_id
+        slots={}
+        bookings=[]
+        for index, slot in enumerate(state["proposed_meetings"]):
+            request_id=booking_request_id(Config.CALENDAR_ID, slot["start"], slot["end"], f"{proposal_id}|{index}")
+            slots[request_id]=slot
+            bookings.append((request_id, {
+                "title":"Meeting",
+                "start_time":slot["start"],
+                "end_time":slot["end"],
+                "description":"Scheduled via AI Booking Agent",
+                "attendees":state["booking_details"].get("attendees")
+            }))
+        booked=[]
+        async for request_id, event_id, error in self.booking_writer.book_many(bookings):
+            if event_id:
+                booked.append(slots[request_id])
+                self.availability_index.record_busy(slots[request_id]["start"], slots[request_id]["end"])
+        if not booked:
+            return self._create_response(
+                "There was an error creating the calendar events. Please try again.",
+                history, message
+            )
+
+        booked.sort(key=lambda slot:slot["start"])
+        response=f"Booking Confirmed!\n\n"
+        response +=f"Your {len(booked)} meetings are scheduled for:\n"
+        for slot in booked:
+            response +=f"{self._on_user_clock(slot['start']).strftime('%A, %B %d')}, {self._clock(slot['start'])} - {self._clock(slot['end'], label=True)}\n"
+        if len(booked) < len(bookings):
+            response +=f"\n{len(bookings) - len(booked)} of them couldn't be added yet. Say 'yes' to confirm the rest again."
+        else:
+            response +="\nThe meetings have been added to your calendar!"
+            clear_booking_state(state)
+        return self._create_response(response, history, message, booking_confirmed=True)
+
     def _handle_general(self, message:str, history:List[Dict]) -> Dict:
         user_input=message.lower().strip()
         
@@ -306,7 +498,8 @@ class BookingAgent:
             response="I can help you with:\n\n"
             response +="check availability:'What's my availability for Friday?'\n"
             response +="schedule meetings:'Book a meeting tomorrow afternoon'\n"
-            response +="schedule calls:'Schedule a call for next Monday morning'\n\n"
+            response +="schedule calls:'Schedule a call for next Monday morning'\n"
+            response +="schedule several:'Three 30-minute check-ins next week, not back to back' or 'a weekly 1:1 for the next 8 weeks'\n\n"
             response +="Just tell me what you need!"
 
         else:
@@ -318,94 +511,51 @@ class BookingAgent:
         
         return self._create_response(response, history, message)
     
-    def _extract_date(self, message:str) -> Optional[str]:
-        text=message.lower()
-        
-        if "today" in text:
-            return "today"
-        elif "tomorrow" in text:
-            return "tomorrow"
-        
-        days=["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-        for day in days:
-            if day in text:
-                if "next" in text:
-                    return f"next {day}"
-                return day
-            
-        date_patterns=[
-            r'\b(\d{1,2})/(\d{1,2})\b',
-            r'\b(\d{1,2})-(\d{1,2})\b',
-            r'\b(january|february|march|april|may|june|july|august|september|october|november|december)\s+(\d{1,2})\b'
-        ]
-        
-        for pattern in date_patterns:
-            match=re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(0)
-        
-        return None
-    
     def _extract_booking_details(self, message:str) -> Dict:
+        with span("entities"):
+            entities=entity_extractor.extract(message, self._get_user_today())
         details={}
-        text=message.lower()
-        
-        date_str=self._extract_date(message)
-        if date_str:
-            details["date"]=date_str
-        
-        if "morning" in text:
-            details["time_period"]="morning"
-        elif "afternoon" in text:
-            details["time_period"]="afternoon"
-        elif "evening" in text:
-            details["time_period"]="evening"
-
-
-        time_match=re.search(r'(\d{1,2}):?(\d{2})?\s*(am|pm)', text)
-        if time_match:
-            details["time"]=time_match.group(0)
-
-        range_match=re.search(r'between\s+(\d{1,2})\s*-?\s*(\d{1,2})', text)
-        if range_match:
-            details["time_range"]=(int(range_match.group(1)), int(range_match.group(2)))
-        
+        if entities.date:
+            details["date"]=entities.date_phrase
+            details["parsed_date"]=entities.date
+        if entities.date_range and entities.date_range[1] > entities.date_range[0]:
+            details["date_range"]=entities.date_range
+        if entities.time_period:
+            details["time_period"]=entities.time_period
+        if entities.start_time and entities.end_time:
+            details["time_range"]=(entities.start_time, entities.end_time)
+        elif entities.start_time:
+            details["time"]=entities.start_time
+        if entities.duration_minutes:
+            details["duration_minutes"]=entities.duration_minutes
+        if entities.attendees:
+            details["attendees"]=entities.attendees
         return details
     
-    def _parse_date(self, date_str:str) -> Optional[datetime]:
-        if not date_str:
-            return None
-        
+    def _to_target_date(self, day:date) -> datetime:
+        # keep the current clock time like the keyword dates always did; callers replace the hour
         current_time=self._get_current_time()
-        date_str=date_str.lower().strip()
-        
-        try:
-            if date_str=="today":
-                return current_time
-            elif date_str=="tomorrow":
-                return current_time + timedelta(days=1)
-            days=["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-            for i, day in enumerate(days):
-                if day in date_str:
-                    days_ahead=(i - current_time.weekday()) % 7
-                    if days_ahead==0:
-                        days_ahead=7 if "next" in date_str else 0
-                    elif "next" in date_str:
-                        days_ahead +=7
-                    
-                    return current_time + timedelta(days=days_ahead)
-            parsed=parser.parse(date_str, default=current_time)
-            return parsed
-            
-        except:
-            return None
+        return current_time + timedelta(days=(day - current_time.date()).days)
+    
+    def _describe_time(self, details:Dict) -> str:
+        if details.get("time_period"):
+            return details["time_period"]
+        if details.get("time_range"):
+            start, end=details["time_range"]
+            return f"{start.strftime('%I:%M %p')} - {end.strftime('%I:%M %p')}"
+        if details.get("time"):
+            return details["time"].strftime("%I:%M %p")
+        return ""
     
     def _get_time_range(self, target_date:datetime, details:Dict) -> tuple:
+        duration=timedelta(minutes=details.get("duration_minutes", 60))
         if details.get("time_range"):
-            start_hour, end_hour=details["time_range"]
-            end_hour=min(end_hour, 18)
-            start_time=target_date.replace(hour=start_hour, minute=0, second=0, microsecond=0)
-            end_time=target_date.replace(hour=end_hour, minute=0, second=0, microsecond=0)
+            range_start, range_end=details["time_range"]
+            start_time=self._from_user_clock(target_date, range_start)
+            end_time=min(
+                self._from_user_clock(target_date, range_end),
+                start_time.replace(hour=18, minute=0, second=0, microsecond=0)
+            )
         elif details.get("time_period")=="morning":
             start_time=target_date.replace(hour=9, minute=0, second=0, microsecond=0)
             end_time=target_date.replace(hour=12, minute=0, second=0, microsecond=0)
@@ -416,23 +566,18 @@ class BookingAgent:
             start_time=target_date.replace(hour=17, minute=0, second=0, microsecond=0)
             end_time=target_date.replace(hour=18, minute=0, second=0, microsecond=0)  
         elif details.get("time"):
-            try:
-                time_obj=parser.parse(details["time"])
-                hour=min(time_obj.hour, 17) 
-                start_time=target_date.replace(hour=hour, minute=time_obj.minute, second=0, microsecond=0)
-                end_time=start_time + timedelta(hours=1)
-                if end_time.hour > 18:
-                    end_time=target_date.replace(hour=18, minute=0, second=0, microsecond=0)
-            except:
-                start_time=target_date.replace(hour=9, minute=0, second=0, microsecond=0)
-                end_time=target_date.replace(hour=18, minute=0, second=0, microsecond=0)
+            start_time=self._from_user_clock(target_date, details["time"])
+            start_time=start_time.replace(hour=min(start_time.hour, 17))
+            end_time=start_time + duration
+            if end_time.hour > 18:
+                end_time=start_time.replace(hour=18, minute=0, second=0, microsecond=0)
         else:
             start_time=target_date.replace(hour=9, minute=0, second=0, microsecond=0)
             end_time=target_date.replace(hour=18, minute=0, second=0, microsecond=0)
         
         return start_time, end_time
     
-    def _get_available_slots(self, target_date:datetime) -> List[Dict]:
+    async def _get_available_slots(self, target_date:datetime) -> List[Dict]:
         if target_date.weekday() >=5:
             return []
         
@@ -445,24 +590,112 @@ class BookingAgent:
         if target_date.date()==current_time.date() and current_time.hour >=18:
             return []
         
-        return self.calendar_service.find_available_slots(start_time, end_time, 60)
+        slots=self.availability_index.lookup(start_time, end_time, 60)
+        if slots is not None:
+            return slots
+        return await self.calendar_service.find_available_slots(start_time, end_time, 60)
+    
+    async def _find_booking_slots(self, target_date:datetime, details:Dict) -> Tuple[List[Dict], List[tuple]]:
+        start_time, end_time=self._get_time_range(target_date, details)
+        current_time=self._get_current_time()
+        if start_time <=current_time:
+            start_time=current_time + timedelta(hours=1)
+            start_time=start_time.replace(minute=0, second=0, microsecond=0)
+        
+        duration=details.get("duration_minutes", 60)
+        if not details.get("attendees"):
+            slots=self.availability_index.lookup(start_time, end_time, duration)
+            if slots is not None:
+                return slots, self.availability_index.busy_between(start_time, end_time)
+        return await self.calendar_service.find_slot_candidates(
+            start_time, end_time, duration, attendees=details.get("attendees")
+        )
+
+    async def _find_booking_slots_range(self, details:Dict) -> Tuple[List[Dict], List[tuple]]:
+        first_day, last_day=details["date_range"]
+        start_time=self._get_time_range(self._to_target_date(first_day), details)[0]
+        end_time=self._get_time_range(self._to_target_date(last_day), details)[1]
+        duration=details.get("duration_minutes", 60)
+        if end_time <=self._get_current_time():
+            return [], []
+
+        slots=None
+        if not details.get("attendees"):
+            slots=self.availability_index.lookup_range(start_time, end_time, duration)
+            busy_periods=self.availability_index.busy_between(start_time, end_time) if slots is not None else []
+        if slots is None:
+            slots, busy_periods=await self.calendar_service.find_slot_candidates(
+                start_time, end_time, duration, attendees=details.get("attendees"), multi_day=True
+            )
+        # the range covers whole business days; keep only the asked-for part of each one
+        first_time, last_time=start_time.time(), end_time.time()
+        slots=[
+            slot for slot in slots
+            if first_time <=slot['start'].time() and slot['end'] <=datetime.combine(slot['start'].date(), last_time)
+        ]
+        return slots, busy_periods
+
+    async def _get_available_slots_range(self, first_day:date, last_day:date) -> List[Dict]:
+        start_time=self._to_target_date(first_day).replace(hour=9, minute=0, second=0, microsecond=0)
+        end_time=self._to_target_date(last_day).replace(hour=18, minute=0, second=0, microsecond=0)
+        if end_time <=self._get_current_time():
+            return []
+
+        slots=self.availability_index.lookup_range(start_time, end_time, 60)
+        if slots is not None:
+            return slots
+        return await self.calendar_service.find_available_slots_range(start_time, end_time, 60)
+
+    @staticmethod
+    def _emit_section(sections:List[str], text:str, on_section:Optional[Callable[[str], None]]):
+        # the streaming endpoint forwards each section while the reply is still being built
+        sections.append(text)
+        if on_section:
+            on_section(text)
     
+    def _on_user_clock(self, value:datetime) -> datetime:
+        # slots are naive times on the calendar's clock (Config.TIMEZONE); replies show them on the user's
+        name=user_zone()
+        if name==self.local_time.name:
+            return value
+        return self.local_time.localize(value).astimezone(zone(name))
+
+    def _clock(self, value:datetime, day:bool=False, label:bool=False) -> str:
+        shown=self._on_user_clock(value)
+        # a slot that falls on another date for the user says which one
+        text=shown.strftime('%a %b %d, %I:%M %p' if day or shown.date() !=value.date() else '%I:%M %p')
+        # the zone is named once the user's clock differs from the calendar's
+        if label and shown.tzinfo is not None:
+            text +=f" {shown.tzname()}"
+        return text
+
+    def _from_user_clock(self, target_date:datetime, clock) -> datetime:
+        # a time the user typed ("2 PM") is on their clock; business hours stay on the calendar's
+        value=target_date.replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+        name=user_zone()
+        if name==self.local_time.name:
+            return value
+        return self.local_time.to_local(local_time(name).localize(value))
+
     def _get_current_time(self) -> datetime:
-        try:
-            utc_now=datetime.now(UTC)
-            ist_time=utc_now.astimezone(self.timezone)
-            return ist_time.replace(tzinfo=None)
-        except:
-            return datetime.now()
+        # the calendar's wall clock: slots and business hours are in Config.TIMEZONE
+        return self.local_time.now()
+
+    def _get_user_today(self) -> date:
+        # relative dates resolve against the user's own date, which can be a day off the calendar's
+        return user_now().date()
     
     def _create_response(self, response:str, history:List[Dict], user_message:str, booking_confirmed:bool=False) -> Dict:
-        updated_history=history + [
+        # appended in place: the caller's list (or the session transcript) is the history
+        appended=[
             {"role":"user", "content":user_message},
             {"role":"assistant", "content":response}
         ]
+        history.extend(appended)
         
         return {
             "response":response,
-            "state":{"messages":updated_history},
+            "state":{"messages":history},
+            "appended":appended,
             "booking_confirmed":booking_confirmed
         }
\ No newline at end of file
@@ -0,0 +1,314 @@
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from config import Config
+from calendar_backends import CALENDAR_BATCH_MAX_REQUESTS
+from http_pool import HttpPoolExhausted
+from metrics import metrics
+from rate_limit import RateLimitExceeded
+
+BOOKING_JOURNAL_PATH=getattr(Config, "BOOKING_JOURNAL_PATH", "bookings.db")
+BOOKING_MAX_ATTEMPTS=getattr(Config, "BOOKING_MAX_ATTEMPTS", 6)
+BOOKING_BACKOFF_BASE_SECONDS=getattr(Config, "BOOKING_BACKOFF_BASE_SECONDS", 0.5)
+BOOKING_BACKOFF_MAX_SECONDS=getattr(Config, "BOOKING_BACKOFF_MAX_SECONDS", 16)
+
+logger=logging.getLogger(__name__)
+
+BOOKINGS=metrics.counter("booking_writes_total", "Booking writes by outcome", labels=("outcome",))
+
+RETRYABLE_STATUSES={429, 500, 502, 503, 504}
+# the Calendar API also reports rate limiting as 403 with one of these reasons
+RATE_LIMIT_REASONS={"rateLimitExceeded", "userRateLimitExceeded"}
+
+PENDING="pending"
+CONFIRMED="confirmed"
+FAILED="failed"
+
+def booking_request_id(calendar_id:str, start_time:datetime, end_time:datetime, key:str) -> str:
+    # Calendar event ids must be base32hex (a-v, 0-9), so the digest doubles as the event id:
+    # resending the same booking can only ever hit the same event
+    digest=hashlib.sha256(
+        f"{calendar_id}|{start_time.isoformat()}|{end_time.isoformat()}|{key}".encode()
+    ).digest()
+    return base64.b32hexencode(digest).decode().rstrip("=").lower()
+
+def is_retryable(error:Exception) -> bool:
+    if isinstance(error, HttpError):
+        if error.resp.status in RETRYABLE_STATUSES:
+            return True
+        if error.resp.status==403:
+            details=error.error_details if isinstance(error.error_details, list) else []
+            return any(detail.get("reason") in RATE_LIMIT_REASONS for detail in details if isinstance(detail, dict))
+        return False
+    # timeouts and dropped connections: the write may or may not have landed, the event id makes resending safe
+    return isinstance(error, (OSError, HttpPoolExhausted, RateLimitExceeded))
+
+def backoff_delay(attempt:int, error:Optional[Exception]=None) -> float:
+    if isinstance(error, HttpError):
+        retry_after=error.resp.get("retry-after")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BOOKING_BACKOFF_MAX_SECONDS)
+    if isinstance(error, RateLimitExceeded):
+        # our own limiter knows exactly when the tokens will be there
+        return min(error.retry_after, BOOKING_BACKOFF_MAX_SECONDS)
+    # full jitter keeps many workers that hit the same rate limit from retrying in lockstep
+    return random.uniform(0, min(BOOKING_BACKOFF_MAX_SECONDS, BOOKING_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+class BookingJournal:
+    # write-ahead log of event inserts: a booking is journaled before the API call and only
+    # reported confirmed once the event id is stored
+    def __init__(self, path:str=BOOKING_JOURNAL_PATH):
+        self.path=path
+        # a plain ":memory:" database is private to one connection, and the journal is used from more than
+        # one thread: in memory it is a shared-cache database named after the journal instead
+        self._memory=path==":memory:"
+        self._database=f"file:booking-journal-{id(self)}?mode=memory&cache=shared" if self._memory else path
+        self._local=threading.local()
+        # every commit waits on fsync: async callers run them here, one at a time, off the event loop
+        self._executor=ThreadPoolExecutor(max_workers=1, thread_name_prefix="booking-journal")
+        conn=self._connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bookings ("
+                "request_id TEXT PRIMARY KEY, event TEXT NOT NULL, status TEXT NOT NULL, "
+                "event_id TEXT, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS bookings_status ON bookings(status)")
+        # the in-memory database lives as long as one connection to it does
+        self._keepalive=conn if self._memory else None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn=getattr(self._local, "conn", None)
+        if conn is None:
+            conn=sqlite3.connect(self._database, timeout=5.0, isolation_level=None, uri=self._memory)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # the journal is the crash-recovery record, so it is flushed on every commit
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.row_factory=sqlite3.Row
+            self._local.conn=conn
+        return conn
+
+    async def run(self, method:str, *args):
+        # the async face of the journal: run("begin", request_id, event) is begin() on the journal's thread
+        loop=asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(getattr(self, method), *args))
+
+    def begin(self, request_id:str, event:Dict) -> Dict:
+        now=time.time()
+        conn=self._connect()
+        conn.execute(
+            "INSERT OR IGNORE INTO bookings(request_id, event, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (request_id, json.dumps(self._serialize(event)), PENDING, now, now)
+        )
+        # a booking that failed earlier is retried under the same request id
+        conn.execute(
+            "UPDATE bookings SET status=?, updated_at=? WHERE request_id=? AND status=?",
+            (PENDING, now, request_id, FAILED)
+        )
+        return self.get(request_id)
+
+    def get(self, request_id:str) -> Optional[Dict]:
+        row=self._connect().execute("SELECT * FROM bookings WHERE request_id=?", (request_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def get_many(self, request_ids:List[str]) -> List[Optional[Dict]]:
+        return [self.get(request_id) for request_id in request_ids]
+
+    def begin_many(self, entries:List[Tuple[str, Dict]]) -> List[Dict]:
+        # begin() for a whole batch in one transaction, so journaling hundreds of bookings is one flush
+        now=time.time()
+        conn=self._connect()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR IGNORE INTO bookings(request_id, event, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(request_id, json.dumps(self._serialize(event)), PENDING, now, now) for request_id, event in entries]
+            )
+            conn.executemany(
+                "UPDATE bookings SET status=?, updated_at=? WHERE request_id=? AND status=?",
+                [(PENDING, now, request_id, FAILED) for request_id, _ in entries]
+            )
+        return [self.get(request_id) for request_id, _ in entries]
+
+    def confirm_many(self, confirmed:List[Tuple[str, str]]):
+        conn=self._connect()
+        now=time.time()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "UPDATE bookings SET status=?, event_id=?, updated_at=? WHERE request_id=?",
+                [(CONFIRMED, event_id, now, request_id) for request_id, event_id in confirmed]
+            )
+
+    def reschedule(self, request_id:str, event:Dict):
+        # a booking that never landed moves to a new time; confirmed ones keep theirs
+        self._connect().execute(
+            "UPDATE bookings SET event=?, updated_at=? WHERE request_id=? AND status!=?",
+            (json.dumps(self._serialize(event)), time.time(), request_id, CONFIRMED)
+        )
+
+    def record_attempt(self, request_id:str, error:Exception):
+        self._connect().execute(
+            "UPDATE bookings SET attempts=attempts + 1, last_error=?, updated_at=? WHERE request_id=?",
+            (str(error)[:500], time.time(), request_id)
+        )
+
+    def confirm(self, request_id:str, event_id:str):
+        self._connect().execute(
+            "UPDATE bookings SET status=?, event_id=?, updated_at=? WHERE request_id=?",
+            (CONFIRMED, event_id, time.time(), request_id)
+        )
+
+    def fail(self, request_id:str, error:Exception):
+        self._connect().execute(
+            "UPDATE bookings SET status=?, attempts=attempts + 1, last_error=?, updated_at=? WHERE request_id=?",
+            (FAILED, str(error)[:500], time.time(), request_id)
+        )
+
+    def pending(self) -> List[Dict]:
+        rows=self._connect().execute(
+            "SELECT * FROM bookings WHERE status=? ORDER BY created_at", (PENDING,)
+        ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def stats(self) -> Dict:
+        rows=self._connect().execute("SELECT status, COUNT(*) FROM bookings GROUP BY status").fetchall()
+        return {status:count for status, count in rows}
+
+    @staticmethod
+    def _serialize(event:Dict) -> Dict:
+        return dict(event, start_time=event["start_time"].isoformat(), end_time=event["end_time"].isoformat())
+
+    @staticmethod
+    def _row(row:sqlite3.Row) -> Dict:
+        record=dict(row)
+        event=json.loads(record["event"])
+        event["start_time"]=datetime.fromisoformat(event["start_time"])
+        event["end_time"]=datetime.fromisoformat(event["end_time"])
+        record["event"]=event
+        return record
+
+class BookingWriter:
+    # event inserts through the journal: journaled first, resent under the same event id with
+    # exponential backoff on rate limits and server errors, confirmed once the id is recorded
+    def __init__(self, calendar_service, journal:Optional[BookingJournal]=None,
+                max_attempts:int=BOOKING_MAX_ATTEMPTS):
+        self.calendar_service=calendar_service
+        self.journal=journal or create_booking_journal()
+        self.max_attempts=max_attempts
+        self.retries=0
+
+    async def book(self, request_id:str, event:Dict) -> Optional[str]:
+        # event carries insert_event's arguments: title, start_time, end_time, description, attendees
+        record=await self.journal.run("begin", request_id, event)
+        if record["status"]==CONFIRMED:
+            BOOKINGS.inc("duplicate")
+            return record["event_id"]
+        return await self._write(request_id, record["event"])
+
+    async def _write(self, request_id:str, event:Dict) -> Optional[str]:
+        for attempt in range(self.max_attempts):
+            try:
+                event_id=await self.calendar_service.insert_event(
+                    event["title"], event["start_time"], event["end_time"],
+                    event.get("description", ""), event.get("attendees"), request_id
+                )
+            except Exception as error:
+                if not is_retryable(error) or attempt==self.max_attempts - 1:
+                    logger.error("%s failed after %d attempts: %s", request_id, attempt + 1, error)
+                    await self.journal.run("fail", request_id, error)
+                    BOOKINGS.inc("failed")
+                    return None
+                await self.journal.run("record_attempt", request_id, error)
+                self.retries +=1
+                BOOKINGS.inc("retried")
+                await asyncio.sleep(backoff_delay(attempt, error))
+                continue
+            await self.journal.run("confirm", request_id, event_id)
+            BOOKINGS.inc("confirmed")
+            return event_id
+        return None
+
+    async def book_many(self, bookings:List[Tuple[str, Dict]],
+                        batch_size:int=CALENDAR_BATCH_MAX_REQUESTS) -> AsyncIterator[Tuple[str, Optional[str], Optional[Exception]]]:
+        # the batch version of book(): journaled in one transaction, inserted batch_size per API request,
+        # and only the failed parts of a batch are resent. yields (request_id, event_id, error) as each settles
+        records=await self.journal.run("begin_many", bookings)
+        pending=[]
+        for record in records:
+            if record["status"]==CONFIRMED:
+                BOOKINGS.inc("duplicate")
+                yield record["request_id"], record["event_id"], None
+            else:
+                pending.append((record["request_id"], record["event"]))
+
+        for offset in range(0, len(pending), batch_size):
+            batch=pending[offset:offset + batch_size]
+            for attempt in range(self.max_attempts):
+                try:
+                    results=await self.calendar_service.insert_events(
+                        [dict(event, event_id=request_id) for request_id, event in batch]
+                    )
+                except Exception as error:
+                    results=[error] * len(batch)
+                confirmed=[]
+                retry=[]
+                settled=[]
+                for (request_id, event), result in zip(batch, results):
+                    if not isinstance(result, Exception):
+                        confirmed.append((request_id, result))
+                        settled.append((request_id, result, None))
+                    elif is_retryable(result) and attempt < self.max_attempts - 1:
+                        await self.journal.run("record_attempt", request_id, result)
+                        retry.append(((request_id, event), result))
+                    else:
+                        logger.error("%s failed after %d attempts: %s", request_id, attempt + 1, result)
+                        await self.journal.run("fail", request_id, result)
+                        BOOKINGS.inc("failed")
+                        settled.append((request_id, None, result))
+                if confirmed:
+                    await self.journal.run("confirm_many", confirmed)
+                    BOOKINGS.inc("confirmed", amount=len(confirmed))
+                for settled_booking in settled:
+                    yield settled_booking
+                if not retry:
+                    break
+                self.retries +=len(retry)
+                BOOKINGS.inc("retried", amount=len(retry))
+                batch=[booking for booking, _ in retry]
+                await asyncio.sleep(max(backoff_delay(attempt, error) for _, error in retry))
+
+    async def replay_pending(self) -> int:
+        # bookings journaled by a process that died mid-write; resending is safe because of the event id
+        replayed=0
+        for record in await self.journal.run("pending"):
+            logger.info("replaying pending booking %s", record['request_id'])
+            if await self._write(record["request_id"], record["event"]):
+                replayed +=1
+        return replayed
+
+    async def stats(self) -> Dict:
+        return {**await self.journal.run("stats"), "retries":self.retries}
+
+def create_booking_journal() -> BookingJournal:
+    directory=os.path.dirname(BOOKING_JOURNAL_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return BookingJournal(BOOKING_JOURNAL_PATH)
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from booking_journal import CONFIRMED, BookingWriter, booking_request_id
+from config import Config
+from range_availability import find_free_slots_range
+from slot_ranking import slot_ranker
+from timeutil import local_time
+
+BULK_BOOKING_MAX_ITEMS=getattr(Config, "BULK_BOOKING_MAX_ITEMS", 1000)
+BULK_BOOKING_STEP_MINUTES=getattr(Config, "BULK_BOOKING_STEP_MINUTES", 30)
+
+logger=logging.getLogger(__name__)
+
+def plan_bookings(items:List[Dict], busy_by_calendar:Dict[str, List[Tuple[datetime, datetime]]], now:datetime,
+                step_minutes:int=BULK_BOOKING_STEP_MINUTES) -> List[Optional[Tuple[datetime, datetime]]]:
+    # greedy, most constrained first: short windows and long meetings pick before the easy ones take
+    # their room. every placed meeting is added to the busy list of the organizer and each attendee,
+    # so later items can never land on top of it
+    busy={calendar_id:list(periods) for calendar_id, periods in busy_by_calendar.items()}
+    order=sorted(
+        range(len(items)),
+        key=lambda index:(items[index]["window_end"] - items[index]["window_start"], -items[index]["duration_minutes"], index)
+    )
+    planned=[None] * len(items)
+    for index in order:
+        item=items[index]
+        calendars=['primary'] + list(item.get("attendees") or [])
+        # only what falls near the window matters, and a months-long snapshot is mostly elsewhere
+        near_start, near_end=item["window_start"] - timedelta(days=1), item["window_end"] + timedelta(days=1)
+        item_busy=[
+            (start, end) for calendar_id in calendars for start, end in busy.get(calendar_id, [])
+            if start < near_end and end > near_start
+        ]
+        slots=find_free_slots_range(
+            item["window_start"], item["window_end"], item_busy, now,
+            duration_minutes=item["duration_minutes"], step_minutes=step_minutes
+        )
+        best=slot_ranker.rank(slots, item_busy, k=1)
+        if not best:
+            continue
+        placed=(best[0]['start'], best[0]['end'])
+        planned[index]=placed
+        for calendar_id in calendars:
+            busy.setdefault(calendar_id, []).append(placed)
+    return planned
+
+def _collides(slot:Tuple[datetime, datetime], periods:List[Tuple[datetime, datetime]]) -> bool:
+    # an identical period is the booking itself when an earlier write landed: resending it under the
+    # same event id changes nothing
+    return any(start < slot[1] and end > slot[0] and (start, end) !=slot for start, end in periods)
+
+class BulkBooker:
+    # books many meetings from one free/busy snapshot: confirmed requests keep their event, journaled ones
+    # that never landed keep their time while it is still free, the rest are planned against the snapshot
+    # and written through batched inserts
+    def __init__(self, calendar_service, booking_writer:BookingWriter, availability_index=None):
+        self.calendar_service=calendar_service
+        self.booking_writer=booking_writer
+        self.availability_index=availability_index
+        self.local_time=local_time()
+
+    def _local(self, value:datetime) -> datetime:
+        return self.local_time.to_local(value)
+
+    def _request_id(self, item:Dict) -> str:
+        # with a client key, resubmitting the same item finds its journal entry instead of booking twice
+        key=item.get("key") or uuid.uuid4().hex
+        return booking_request_id(Config.CALENDAR_ID, item["window_start"], item["window_end"], f"bulk|{key}")
+
+    async def run(self, items:List[Dict]) -> AsyncIterator[Dict]:
+        items=[
+            dict(item, window_start=self._local(item["window_start"]), window_end=self._local(item["window_end"]))
+            for item in items
+        ]
+        request_ids=[self._request_id(item) for item in items]
+        journal=self.booking_writer.journal
+        journaled=await journal.run("get_many", request_ids)
+
+        # pending or failed entries were never confirmed: the calendar may have changed since they were
+        # planned, so they are checked against the snapshot along with the new items
+        to_plan=[index for index, record in enumerate(journaled) if record is None or record["status"] !=CONFIRMED]
+        planned={}
+        unavailable=set()
+        if to_plan:
+            plan, unavailable=await self._plan(
+                [items[index] for index in to_plan],
+                [self._slot(journaled[index]) for index in to_plan]
+            )
+            planned=dict(zip(to_plan, plan))
+
+        bookings=[]
+        index_of={}
+        for index, (item, request_id, record) in enumerate(zip(items, request_ids, journaled)):
+            if record is not None and record["status"]==CONFIRMED:
+                # already booked: its time was fixed when it was first planned, and its event id with it
+                event=record["event"]
+            elif planned.get(index) is None:
+                missing=unavailable.intersection(['primary'] + list(item.get("attendees") or []))
+                error=f"free/busy unavailable for {', '.join(sorted(missing))}" if missing else None
+                if record is not None:
+                    # left pending, replay_pending would resend it at a time that is no longer free
+                    await journal.run("fail", request_id, RuntimeError(error or "no free slot in window"))
+                if missing:
+                    yield self._result(index, item, "failed", error=error)
+                else:
+                    yield self._result(index, item, "unschedulable")
+                continue
+            elif record is not None:
+                event=record["event"]
+                if planned[index] !=self._slot(record):
+                    # its old time was taken meanwhile; the event id stays, so a resubmit still finds it
+                    event=dict(event, start_time=planned[index][0], end_time=planned[index][1])
+                    await journal.run("reschedule", request_id, event)
+            else:
+                start_time, end_time=planned[index]
+                event={
+                    "title":item.get("title") or "Meeting",
+                    "start_time":start_time,
+                    "end_time":end_time,
+                    "description":item.get("description", ""),
+                    "attendees":item.get("attendees") or None
+                }
+            bookings.append((request_id, event))
+            index_of[request_id]=(index, event, record is not None and record["status"]==CONFIRMED)
+
+        async for request_id, event_id, error in self.booking_writer.book_many(bookings):
+            index, event, was_confirmed=index_of[request_id]
+            if error is not None:
+                yield self._result(index, items[index], "failed", event, error=str(error))
+                continue
+            if not was_confirmed and self.availability_index is not None:
+                self.availability_index.record_busy(event["start_time"], event["end_time"])
+            status="already_booked" if was_confirmed else "booked"
+            yield self._result(index, items[index], status, event, event_id)
+
+    @staticmethod
+    def _slot(record:Optional[Dict]) -> Optional[Tuple[datetime, datetime]]:
+        return (record["event"]["start_time"], record["event"]["end_time"]) if record else None
+
+    async def _plan(self, items:List[Dict], journaled_slots:List[Optional[Tuple[datetime, datetime]]]
+                    ) -> Tuple[List[Optional[Tuple[datetime, datetime]]], Set[str]]:
+        # one fresh snapshot for everyone: the organizer and every attendee over the union of all
+        # windows, fetched in free/busy requests of up to 50 calendars each
+        calendar_ids=['primary'] + sorted(
+            {attendee for item in items for attendee in item.get("attendees") or []} - {'primary'}
+        )
+        first_day=min(item["window_start"] for item in items).date()
+        last_day=max(item["window_end"] for item in items).date()
+        fetched=await self.calendar_service.refresh_free_busy(calendar_ids, first_day, last_day)
+        calendar_service=self.calendar_service.calendar_service
+        snapshot={}
+        for calendar_id, busy_by_day in fetched.items():
+            # an event spanning midnight is listed under both days
+            periods=calendar_service._parse_busy_periods([busy for day_busy in busy_by_day.values() for busy in day_busy])
+            snapshot[calendar_id]=sorted(set(periods))
+        # never plan around a calendar we couldn't read: its items fail instead of risking a collision
+        unavailable=set(calendar_ids) - set(snapshot)
+        schedulable=[
+            not unavailable.intersection(['primary'] + list(item.get("attendees") or [])) for item in items
+        ]
+        now=self.local_time.now()
+        planned=[None] * len(items)
+        held={}
+        for position, (item, slot) in enumerate(zip(items, journaled_slots)):
+            if slot is None or not schedulable[position] or slot[0] < now:
+                continue
+            calendars=['primary'] + list(item.get("attendees") or [])
+            if any(
+                _collides(slot, snapshot.get(calendar_id, []))
+                or any(start < slot[1] and end > slot[0] for start, end in held.get(calendar_id, []))
+                for calendar_id in calendars
+            ):
+                continue
+            # a retry that still fits keeps its time, and holds it against everything planned after it
+            planned[position]=slot
+            for calendar_id in calendars:
+                held.setdefault(calendar_id, []).append(slot)
+        kept=sum(1 for slot in planned if slot)
+        for calendar_id, slots in held.items():
+            snapshot[calendar_id]=snapshot.get(calendar_id, []) + slots
+        to_place=[position for position, ok in enumerate(schedulable) if ok and planned[position] is None]
+        # a few hundred slot searches: kept off the event loop
+        placed=await asyncio.to_thread(plan_bookings, [items[position] for position in to_place], snapshot, now)
+        for position, slot in zip(to_place, placed):
+            planned[position]=slot
+        logger.info("planned %d of %d bulk bookings (%d journaled kept their time) against %d calendars",
+                    sum(1 for slot in planned if slot), len(items), kept, len(snapshot))
+        return planned, unavailable
+
+    @staticmethod
+    def _result(index:int, item:Dict, status:str, event:Optional[Dict]=None, event_id:Optional[str]=None,
+                error:Optional[str]=None) -> Dict:
+        return {
+            "index":index,
+            "key":item.get("key"),
+            "status":status,
+            "start":event["start_time"].isoformat() if event else None,
+            "end":event["end_time"].isoformat() if event else None,
+            "event_id":event_id,
+            "error":error
+        }
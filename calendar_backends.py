@@ -0,0 +1,467 @@
+import abc
+import bisect
+import os
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta, UTC
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+
+from config import Config
+from http_pool import CALENDAR_HTTP_POOL_SIZE, CALENDAR_HTTP_TIMEOUT_SECONDS, HttpPool
+from timeutil import zone
+
+CALENDAR_BACKEND=getattr(Config, "CALENDAR_BACKEND", "google")
+GOOGLE_CALENDAR_DISCOVERY_FILE=getattr(Config, "GOOGLE_CALENDAR_DISCOVERY_FILE", "calendar_v3_discovery.json")
+GOOGLE_CREDENTIALS_REFRESH_MARGIN_SECONDS=getattr(Config, "GOOGLE_CREDENTIALS_REFRESH_MARGIN_SECONDS", 300)
+# the Calendar API accepts at most 50 calls per batch request
+CALENDAR_BATCH_MAX_REQUESTS=50
+# events.list returns at most 2500 events per page
+CALENDAR_SYNC_PAGE_SIZE=2500
+FAKE_CALENDAR_PATTERN=getattr(Config, "FAKE_CALENDAR_PATTERN", "typical")
+FAKE_CALENDAR_SEED=getattr(Config, "FAKE_CALENDAR_SEED", 0)
+FAKE_CALENDAR_LATENCY_MS=getattr(Config, "FAKE_CALENDAR_LATENCY_MS", 0)
+FAKE_CALENDAR_ERROR_RATE=getattr(Config, "FAKE_CALENDAR_ERROR_RATE", 0.0)
+
+# (min, max) seeded meetings per weekday for each fake busy pattern
+BUSY_PATTERNS={
+    "empty":(0, 0),
+    "light":(0, 2),
+    "typical":(2, 4),
+    "heavy":(5, 8)
+}
+
+class CalendarBackend(abc.ABC):
+    # the Calendar API calls CalendarService makes, in the API's own request/response shapes.
+    # warm-up, credentials and the batched calls have defaults; the single calls are the backend's own
+    ready=True
+
+    def warm_up(self):
+        pass
+
+    def refresh_credentials(self) -> Optional[float]:
+        return None
+
+    @abc.abstractmethod
+    def query_free_busy(self, body:Dict) -> Dict:
+        ...
+
+    @abc.abstractmethod
+    def insert_event(self, calendar_id:str, event:Dict) -> Dict:
+        ...
+
+    @abc.abstractmethod
+    def list_events(self, calendar_id:str, time_min:str, time_max:str) -> Dict:
+        ...
+
+    @abc.abstractmethod
+    def sync_events(self, calendar_id:str, sync_token:Optional[str]=None, page_token:Optional[str]=None,
+                    time_min:Optional[str]=None, time_max:Optional[str]=None) -> Dict:
+        # one page of events.list: a full sync over [time_min, time_max) without a sync token, the
+        # changes since the token with one. the last page carries nextSyncToken, the others nextPageToken
+        ...
+
+    # batched variants return one entry per call: the response, or the exception that call raised
+    def insert_events(self, calendar_id:str, events:List[Dict]) -> List:
+        return [self._capture(self.insert_event, calendar_id, event) for event in events]
+
+    def list_events_many(self, calendar_id:str, windows:List[Tuple[str, str]]) -> List:
+        return [self._capture(self.list_events, calendar_id, time_min, time_max) for time_min, time_max in windows]
+
+    @staticmethod
+    def _capture(func, *args):
+        try:
+            return func(*args)
+        except Exception as error:
+            return error
+
+class GoogleCalendarBackend(CalendarBackend):
+    SCOPES=['https://www.googleapis.com/auth/calendar']
+
+    def __init__(self, credentials=None, discovery_file:str=GOOGLE_CALENDAR_DISCOVERY_FILE,
+                pool_size:int=CALENDAR_HTTP_POOL_SIZE, timeout:float=CALENDAR_HTTP_TIMEOUT_SECONDS):
+        # nothing is loaded or fetched here; the client is built on first use or by warm_up()
+        self.discovery_file=discovery_file
+        self.pool_size=pool_size
+        self.timeout=timeout
+        self.pool=None
+        self._service=None
+        self._events=None
+        self._freebusy=None
+        self._creds=credentials
+        self._lock=threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._service is not None
+
+    @property
+    def service(self):
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    service=self._build_service()
+                    # each events()/freebusy() call rebuilds every method from the discovery document
+                    # (~10 ms), so the resources are built once and shared
+                    self._events=service.events()
+                    self._freebusy=service.freebusy()
+                    self._service=service
+        return self._service
+
+    @property
+    def events(self):
+        self.service
+        return self._events
+
+    @property
+    def freebusy(self):
+        self.service
+        return self._freebusy
+
+    def warm_up(self):
+        self.service
+
+    def _build_service(self):
+        # the google client libraries cost a few hundred ms to import, so they load with the client
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build, build_from_document
+
+        creds=self._creds or self._load_credentials()
+        self.pool=HttpPool(
+            lambda:AuthorizedHttp(creds, http=httplib2.Http(timeout=self.timeout)), self.pool_size
+        )
+        # requests always run on a pooled transport; this one only satisfies build()
+        http=AuthorizedHttp(creds, http=httplib2.Http(timeout=self.timeout))
+        if os.path.exists(self.discovery_file):
+            with open(self.discovery_file, encoding='utf-8') as discovery:
+                return build_from_document(discovery.read(), http=http)
+        # the discovery document bundled with google-api-python-client, no network round trip
+        return build('calendar', 'v3', http=http, static_discovery=True, cache_discovery=False)
+
+    def _load_credentials(self):
+        from google.auth.transport.requests import Request
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        creds=None
+        if os.path.exists(Config.GOOGLE_CALENDAR_TOKEN_FILE):
+            with open(Config.GOOGLE_CALENDAR_TOKEN_FILE, 'rb') as token:
+                creds=pickle.load(token)
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                if not os.path.exists(Config.GOOGLE_CALENDAR_CREDENTIALS_FILE):
+                    raise FileNotFoundError(
+                        f"calendar credentials file not found:{Config.GOOGLE_CALENDAR_CREDENTIALS_FILE}"
+                    )
+                flow=InstalledAppFlow.from_client_secrets_file(
+                    Config.GOOGLE_CALENDAR_CREDENTIALS_FILE, self.SCOPES
+                )
+                creds=flow.run_local_server(port=0)
+            self._save_credentials(creds)
+        self._creds=creds
+        return creds
+
+    @staticmethod
+    def _save_credentials(creds):
+        with open(Config.GOOGLE_CALENDAR_TOKEN_FILE, 'wb') as token:
+            pickle.dump(creds, token)
+
+    def refresh_credentials(self) -> Optional[float]:
+        # refresh ahead of expiry so requests never pay for it; returns seconds until the next check
+        creds=self._creds
+        if creds is None or not creds.refresh_token:
+            return None
+        if creds.expiry is not None:
+            remaining=(creds.expiry - datetime.now(UTC).replace(tzinfo=None)).total_seconds()
+            if remaining > GOOGLE_CREDENTIALS_REFRESH_MARGIN_SECONDS:
+                return remaining - GOOGLE_CREDENTIALS_REFRESH_MARGIN_SECONDS
+        from google.auth.transport.requests import Request
+
+        with self._lock:
+            creds.refresh(Request())
+            self._save_credentials(creds)
+        if creds.expiry is None:
+            return None
+        return max((creds.expiry - datetime.now(UTC).replace(tzinfo=None)).total_seconds() - GOOGLE_CREDENTIALS_REFRESH_MARGIN_SECONDS, 60)
+
+    def _execute(self, request) -> Dict:
+        with self.pool.connection() as http:
+            return request.execute(http=http)
+
+    def _execute_batch(self, requests:List) -> List:
+        # one multipart HTTP request per CALENDAR_BATCH_MAX_REQUESTS calls; failed parts come back as exceptions
+        results=[None] * len(requests)
+
+        def collect(request_id, response, exception):
+            results[int(request_id)]=exception if exception is not None else response
+
+        for offset in range(0, len(requests), CALENDAR_BATCH_MAX_REQUESTS):
+            batch=self.service.new_batch_http_request(callback=collect)
+            for index, request in enumerate(requests[offset:offset + CALENDAR_BATCH_MAX_REQUESTS], offset):
+                batch.add(request, request_id=str(index))
+            with self.pool.connection() as http:
+                batch.execute(http=http)
+        return results
+
+    def query_free_busy(self, body:Dict) -> Dict:
+        return self._execute(self.freebusy.query(body=body))
+
+    def insert_event(self, calendar_id:str, event:Dict) -> Dict:
+        return self._execute(self.events.insert(calendarId=calendar_id, body=event))
+
+    def insert_events(self, calendar_id:str, events:List[Dict]) -> List:
+        events_resource=self.events
+        return self._execute_batch([
+            events_resource.insert(calendarId=calendar_id, body=event) for event in events
+        ])
+
+    def list_events(self, calendar_id:str, time_min:str, time_max:str) -> Dict:
+        return self._execute(self._list_request(calendar_id, time_min, time_max))
+
+    def list_events_many(self, calendar_id:str, windows:List[Tuple[str, str]]) -> List:
+        return self._execute_batch([
+            self._list_request(calendar_id, time_min, time_max) for time_min, time_max in windows
+        ])
+
+    def sync_events(self, calendar_id:str, sync_token:Optional[str]=None, page_token:Optional[str]=None,
+                    time_min:Optional[str]=None, time_max:Optional[str]=None) -> Dict:
+        params={'calendarId':calendar_id, 'singleEvents':True, 'maxResults':CALENDAR_SYNC_PAGE_SIZE}
+        if sync_token:
+            # timeMin/timeMax can't be combined with a sync token; deletions always come back as cancelled
+            params['syncToken']=sync_token
+        else:
+            if time_min:
+                params['timeMin']=time_min
+            if time_max:
+                params['timeMax']=time_max
+        if page_token:
+            params['pageToken']=page_token
+        return self._execute(self.events.list(**params))
+
+    def _list_request(self, calendar_id:str, time_min:str, time_max:str):
+        return self.events.list(
+            calendarId=calendar_id,
+            timeMin=time_min,
+            timeMax=time_max,
+            singleEvents=True,
+            orderBy='startTime'
+        )
+
+class FakeCalendarBackend(CalendarBackend):
+    # in-memory calendars for benchmarks and local runs: every calendar id exists, weekdays get
+    # a seeded, repeatable set of meetings, and inserted events show up in later queries. changes to
+    # stored events are logged so sync_events can answer incremental syncs from a sync token
+    def __init__(self, pattern:str=FAKE_CALENDAR_PATTERN, seed:int=FAKE_CALENDAR_SEED,
+                latency_ms:float=FAKE_CALENDAR_LATENCY_MS, error_rate:float=FAKE_CALENDAR_ERROR_RATE):
+        if pattern not in BUSY_PATTERNS:
+            raise ValueError(f"unknown fake calendar pattern:{pattern}")
+        self.pattern=pattern
+        self.seed=seed
+        self.latency=latency_ms / 1000
+        # share of inserts that fail with a retryable 429/503, half of them after the write landed
+        self.error_rate=error_rate
+        self._errors=random.Random(seed)
+        self.timezone=zone()
+        self.calls=Counter()
+        self._events={}
+        self._ids={}
+        self._seeded={}
+        self._seq=0
+        self._changes={}
+        self._deleted={}
+        self._listing=(None, None)
+        self._lock=threading.Lock()
+
+    def query_free_busy(self, body:Dict) -> Dict:
+        self._call("freebusy")
+        time_min, time_max=self._parse(body['timeMin']), self._parse(body['timeMax'])
+        calendars={}
+        for item in body.get('items', []):
+            busy=[
+                {'start':self._format_utc(event_start), 'end':self._format_utc(event_end)}
+                for event_start, event_end, _ in self._events_between(item['id'], time_min, time_max)
+            ]
+            calendars[item['id']]={'busy':busy}
+        return {'timeMin':body['timeMin'], 'timeMax':body['timeMax'], 'calendars':calendars}
+
+    def insert_event(self, calendar_id:str, event:Dict) -> Dict:
+        self._call("insert")
+        return self._insert(calendar_id, event)
+
+    def insert_events(self, calendar_id:str, events:List[Dict]) -> List:
+        # a batch costs one round trip however many calls it carries
+        self._call("batch")
+        return [self._capture(self._insert, calendar_id, event) for event in events]
+
+    def list_events(self, calendar_id:str, time_min:str, time_max:str) -> Dict:
+        self._call("list")
+        return self._list(calendar_id, time_min, time_max)
+
+    def list_events_many(self, calendar_id:str, windows:List[Tuple[str, str]]) -> List:
+        self._call("batch")
+        return [self._list(calendar_id, time_min, time_max) for time_min, time_max in windows]
+
+    def sync_events(self, calendar_id:str, sync_token:Optional[str]=None, page_token:Optional[str]=None,
+                    time_min:Optional[str]=None, time_max:Optional[str]=None) -> Dict:
+        self._call("sync")
+        # page tokens carry the offset and the change sequence the first page was answered at
+        if page_token:
+            offset, snapshot=(int(part) for part in page_token.split(":"))
+        else:
+            with self._lock:
+                offset, snapshot=0, self._seq
+        # the listing is built once per sync and paged from there, like a server-side cursor
+        key=(calendar_id, sync_token, time_min, time_max, snapshot)
+        if self._listing[0]==key:
+            items=self._listing[1]
+        elif sync_token is None:
+            if time_min and time_max:
+                events=self._events_between(calendar_id, self._parse(time_min), self._parse(time_max))
+            else:
+                with self._lock:
+                    events=sorted(self._events.get(calendar_id, {}).values(), key=lambda event:event[0])
+            items=[event for _, _, event in events]
+        else:
+            if not sync_token.isdigit() or int(sync_token) > snapshot:
+                raise self._http_error(410)
+            items=self._changed_since(calendar_id, int(sync_token), snapshot)
+        self._listing=(key, items)
+        page=items[offset:offset + CALENDAR_SYNC_PAGE_SIZE]
+        result={'items':page}
+        if offset + len(page) < len(items):
+            result['nextPageToken']=f"{offset + len(page)}:{snapshot}"
+        else:
+            result['nextSyncToken']=str(snapshot)
+        return result
+
+    def update_event(self, calendar_id:str, event_id:str, event:Dict) -> Dict:
+        # events.update and events.delete stand in for other clients editing the calendar
+        self._call("update")
+        start, end=self._parse(event['start']['dateTime']), self._parse(event['end']['dateTime'])
+        with self._lock:
+            if event_id not in self._events.get(calendar_id, {}):
+                raise self._http_error(404)
+            updated=dict(event, id=event_id, status='confirmed')
+            self._events[calendar_id][event_id]=(start, end, updated)
+            self._log_change(calendar_id, event_id)
+        return updated
+
+    def delete_event(self, calendar_id:str, event_id:str):
+        self._call("delete")
+        with self._lock:
+            if self._events.get(calendar_id, {}).pop(event_id, None) is None:
+                raise self._http_error(410)
+            self._deleted.setdefault(calendar_id, set()).add(event_id)
+            self._log_change(calendar_id, event_id)
+
+    def _log_change(self, calendar_id:str, event_id:str):
+        self._seq +=1
+        self._changes.setdefault(calendar_id, []).append((self._seq, event_id))
+
+    def _changed_since(self, calendar_id:str, since:int, snapshot:int) -> List[Dict]:
+        with self._lock:
+            changes=self._changes.get(calendar_id, [])
+            first=bisect.bisect_right(changes, since, key=lambda change:change[0])
+            last=bisect.bisect_right(changes, snapshot, key=lambda change:change[0])
+            items=[]
+            for event_id in dict.fromkeys(event_id for _, event_id in changes[first:last]):
+                stored=self._events.get(calendar_id, {}).get(event_id)
+                if stored is not None:
+                    items.append(stored[2])
+                elif event_id in self._deleted.get(calendar_id, ()):
+                    items.append({'id':event_id, 'status':'cancelled'})
+        return items
+
+    def _insert(self, calendar_id:str, event:Dict) -> Dict:
+        with self._lock:
+            failure=self._errors.random() < self.error_rate
+            fail_after_write=failure and self._errors.random() < 0.5
+        if failure and not fail_after_write:
+            raise self._http_error(self._errors.choice([429, 503]))
+        created=dict(event, id=event.get('id') or uuid.uuid4().hex, status='confirmed')
+        start, end=self._parse(event['start']['dateTime']), self._parse(event['end']['dateTime'])
+        with self._lock:
+            ids=self._ids.setdefault(calendar_id, set())
+            if event.get('id') and event['id'] in ids:
+                raise self._http_error(409)
+            ids.add(created['id'])
+            self._events.setdefault(calendar_id, {})[created['id']]=(start, end, created)
+            self._log_change(calendar_id, created['id'])
+        if fail_after_write:
+            # the write happened but the caller never hears about it, like a timed-out response
+            raise self._http_error(503)
+        return created
+
+    @staticmethod
+    def _http_error(status:int):
+        import httplib2
+        from googleapiclient.errors import HttpError
+
+        return HttpError(httplib2.Response({'status':status}), b'{"error":{"message":"fake calendar error"}}')
+
+    def _list(self, calendar_id:str, time_min:str, time_max:str) -> Dict:
+        events=self._events_between(calendar_id, self._parse(time_min), self._parse(time_max))
+        return {'items':[event for _, _, event in events]}
+
+    def _call(self, name:str):
+        with self._lock:
+            self.calls[name] +=1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _events_between(self, calendar_id:str, time_min:datetime, time_max:datetime) -> List[tuple]:
+        first_day=time_min.astimezone(self.timezone).date()
+        last_day=time_max.astimezone(self.timezone).date()
+        events=[]
+        with self._lock:
+            for offset in range((last_day - first_day).days + 1):
+                events.extend(self._seeded_day(calendar_id, first_day + timedelta(days=offset)))
+            events.extend(self._events.get(calendar_id, {}).values())
+        events=[event for event in events if event[0] < time_max and event[1] > time_min]
+        events.sort(key=lambda event:event[0])
+        return events
+
+    def _seeded_day(self, calendar_id:str, day:date) -> List[tuple]:
+        key=(calendar_id, day)
+        if key not in self._seeded:
+            events=[]
+            if day.weekday() < 5:
+                rng=random.Random(f"{self.seed}:{calendar_id}:{day.isoformat()}")
+                low, high=BUSY_PATTERNS[self.pattern]
+                for index in range(rng.randint(low, high)):
+                    start=self.timezone.localize(datetime.combine(day, datetime.min.time()).replace(
+                        hour=rng.randrange(Config.BUSINESS_HOURS_START, Config.BUSINESS_HOURS_END),
+                        minute=rng.choice([0, 30])
+                    ))
+                    end=start + timedelta(minutes=rng.choice([30, 60, 60, 90]))
+                    events.append((start, end, {
+                        'id':f"seed{day.strftime('%Y%m%d')}{index}",
+                        'summary':'Busy',
+                        'start':{'dateTime':start.isoformat()},
+                        'end':{'dateTime':end.isoformat()}
+                    }))
+            self._seeded[key]=events
+        return self._seeded[key]
+
+    @staticmethod
+    def _parse(value:str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    @staticmethod
+    def _format_utc(value:datetime) -> str:
+        return value.astimezone(pytz.UTC).isoformat().replace('+00:00', 'Z')
+
+def create_calendar_backend(backend:Optional[str]=None) -> CalendarBackend:
+    backend=(backend or CALENDAR_BACKEND).lower()
+    if backend=="google":
+        return GoogleCalendarBackend()
+    if backend=="fake":
+        return FakeCalendarBackend()
+    raise ValueError(f"unknown calendar backend:{backend}")
@@ -0,0 +1,366 @@
+import asyncio
+import bisect
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import pytz
+
+from config import Config
+from timeutil import zone
+
+# opt-in: a full sync of CALENDAR_MIRROR_DAYS runs at startup and the copy is kept on disk
+CALENDAR_MIRROR_ENABLED=getattr(Config, "CALENDAR_MIRROR_ENABLED", False)
+CALENDAR_MIRROR_PATH=getattr(Config, "CALENDAR_MIRROR_PATH", "calendar_mirror.db")
+CALENDAR_MIRROR_DAYS=getattr(Config, "CALENDAR_MIRROR_DAYS", 90)
+CALENDAR_MIRROR_POLL_SECONDS=getattr(Config, "CALENDAR_MIRROR_POLL_SECONDS", 30)
+CALENDAR_MIRROR_WEBHOOK_TOKEN=getattr(Config, "CALENDAR_MIRROR_WEBHOOK_TOKEN", None)
+
+logger=logging.getLogger(__name__)
+
+class _MirroredCalendar:
+    def __init__(self):
+        # event id -> (start, end, busy, all_day, summary), times in epoch seconds
+        self.events={}
+        # (start, event id), sorted, for range lookups
+        self.starts=[]
+        self.max_duration=0
+        self.sync_token=None
+        self.first_day=None
+        self.last_day=None
+        # monotonic time of the last sync in this process; a token loaded from disk doesn't count
+        self.synced_at=None
+
+class CalendarMirror:
+    # local copy of the mirrored calendars kept current with events.list sync tokens. reads come from
+    # an in-memory interval index; SQLite keeps a compact copy (integer times, no raw JSON) plus the
+    # sync token, so a restart resumes with an incremental sync instead of a full one
+    def __init__(self, path:str=CALENDAR_MIRROR_PATH, calendar_ids:Optional[List[str]]=None,
+                days:int=CALENDAR_MIRROR_DAYS, poll_seconds:float=CALENDAR_MIRROR_POLL_SECONDS):
+        self.path=path
+        self.calendar_ids=list(calendar_ids or [Config.CALENDAR_ID])
+        self.days=days
+        self.poll_seconds=poll_seconds
+        self.timezone=zone()
+        self.full_syncs=0
+        self.incremental_syncs=0
+        self.items_received=0
+        self.reads=0
+        self._calendars={calendar_id:_MirroredCalendar() for calendar_id in self.calendar_ids}
+        self._lock=threading.Lock()
+        # the database is opened by the first sync, so an unused mirror never touches the disk
+        self._db=None
+        self._db_lock=threading.Lock()
+
+    def load(self):
+        with self._db_lock:
+            if self._db is not None:
+                return
+            directory=os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn=sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "calendar_id TEXT NOT NULL, event_id TEXT NOT NULL, start INTEGER NOT NULL, end INTEGER NOT NULL, "
+                "busy INTEGER NOT NULL, all_day INTEGER NOT NULL, summary TEXT, "
+                "PRIMARY KEY (calendar_id, event_id)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                "calendar_id TEXT PRIMARY KEY, sync_token TEXT NOT NULL, first_day TEXT NOT NULL, last_day TEXT NOT NULL)"
+            )
+            for calendar_id, calendar in self._calendars.items():
+                state=conn.execute(
+                    "SELECT sync_token, first_day, last_day FROM sync_state WHERE calendar_id=?", (calendar_id,)
+                ).fetchone()
+                if state is None:
+                    continue
+                rows=conn.execute(
+                    "SELECT event_id, start, end, busy, all_day, summary FROM events WHERE calendar_id=?",
+                    (calendar_id,)
+                ).fetchall()
+                events={row[0]:(row[1], row[2], bool(row[3]), bool(row[4]), row[5]) for row in rows}
+                with self._lock:
+                    self._replace(calendar, events)
+                    calendar.sync_token=state[0]
+                    calendar.first_day=date.fromisoformat(state[1])
+                    calendar.last_day=date.fromisoformat(state[2])
+            self._db=conn
+
+    def sync_token(self, calendar_id:str) -> Optional[str]:
+        return self._calendars[calendar_id].sync_token
+
+    def needs_full_sync(self, calendar_id:str, today:date) -> bool:
+        # incremental syncs never widen the window, so it is rebuilt once half of it has gone by
+        calendar=self._calendars[calendar_id]
+        if calendar.sync_token is None:
+            return True
+        return calendar.first_day > today or (calendar.last_day - today).days < self.days // 2
+
+    def full_sync_window(self, today:date) -> Tuple[date, date]:
+        return today, today + timedelta(days=self.days)
+
+    def apply(self, calendar_id:str, items:List[Dict], sync_token:str,
+            window:Optional[Tuple[date, date]]=None) -> Optional[Set[date]]:
+        # window is set for a full sync, which replaces the calendar and returns None; an incremental
+        # sync returns the local days its changes touched
+        calendar=self._calendars[calendar_id]
+        rows={}
+        for event in items:
+            rows[event['id']]=self._row(event)
+        changed_days=None
+        with self._lock:
+            if window is not None:
+                self._replace(calendar, {event_id:row for event_id, row in rows.items() if row is not None})
+                calendar.first_day, calendar.last_day=window
+                self.full_syncs +=1
+            else:
+                changed_days=set()
+                for event_id, row in rows.items():
+                    old=self._put(calendar, event_id, row)
+                    for changed in (old, row):
+                        if changed is not None:
+                            changed_days.update(self._days(changed))
+                self.incremental_syncs +=1
+            calendar.sync_token=sync_token
+            calendar.synced_at=time.monotonic()
+            self.items_received +=len(items)
+            first_day, last_day=calendar.first_day, calendar.last_day
+        self._persist(calendar_id, rows, sync_token, first_day, last_day, full=window is not None)
+        return changed_days
+
+    def upsert(self, calendar_id:str, event:Dict):
+        # write-through for events this process created; the next sync brings them back unchanged
+        calendar=self._calendars.get(calendar_id)
+        if calendar is None or calendar.sync_token is None:
+            return
+        row=self._row(event)
+        with self._lock:
+            self._put(calendar, event['id'], row)
+        self._persist(calendar_id, {event['id']:row}, None, None, None, full=False)
+
+    def forget(self, calendar_id:str):
+        # the server refused the sync token (410 Gone): the next sync starts over with a full one
+        with self._lock:
+            self._calendars[calendar_id]=_MirroredCalendar()
+
+    def covers(self, calendar_ids:List[str], first_day:date, last_day:date) -> bool:
+        stale_after=self.poll_seconds * 2
+        now=time.monotonic()
+        for calendar_id in calendar_ids:
+            calendar=self._calendars.get(calendar_id)
+            if calendar is None or calendar.synced_at is None or now - calendar.synced_at > stale_after:
+                return False
+            if first_day < calendar.first_day or last_day > calendar.last_day:
+                return False
+        return True
+
+    def busy_by_day(self, calendar_id:str, first_day:date, last_day:date) -> Dict[date, List[Dict]]:
+        # busy periods in freeBusy's shape, grouped by the local days they touch. days are found by
+        # comparing against the day boundaries, with no per-event timezone conversion
+        days=[first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+        boundaries=[
+            int(self.timezone.localize(datetime.combine(day, datetime.min.time())).timestamp())
+            for day in days + [last_day + timedelta(days=1)]
+        ]
+        busy_by_day={}
+        for _, row in self._between(calendar_id, boundaries[0], boundaries[-1]):
+            if not row[2]:
+                continue
+            busy={'start':_format_utc(row[0]), 'end':_format_utc(row[1])}
+            first=max(bisect.bisect_right(boundaries, row[0]) - 1, 0)
+            last=min(bisect.bisect_left(boundaries, row[1]) - 1, len(days) - 1)
+            for index in range(first, last + 1):
+                busy_by_day.setdefault(days[index], []).append(busy)
+        return busy_by_day
+
+    def events_between(self, calendar_id:str, start_time:datetime, end_time:datetime) -> List[Dict]:
+        events=[]
+        for event_id, (start, end, _, all_day, summary) in self._between(
+            calendar_id, start_time.timestamp(), end_time.timestamp()
+        ):
+            if all_day:
+                start_field={'date':self._local(start).date().isoformat()}
+                end_field={'date':self._local(end).date().isoformat()}
+            else:
+                start_field={'dateTime':self._local(start).isoformat(), 'timeZone':Config.TIMEZONE}
+                end_field={'dateTime':self._local(end).isoformat(), 'timeZone':Config.TIMEZONE}
+            events.append({'id':event_id, 'summary':summary, 'start':start_field, 'end':end_field})
+        return events
+
+    def stats(self) -> Dict:
+        with self._lock:
+            now=time.monotonic()
+            return {
+                "events":sum(len(calendar.events) for calendar in self._calendars.values()),
+                "synced_seconds_ago":{
+                    calendar_id:round(now - calendar.synced_at, 1) if calendar.synced_at is not None else None
+                    for calendar_id, calendar in self._calendars.items()
+                },
+                "full_syncs":self.full_syncs,
+                "incremental_syncs":self.incremental_syncs,
+                "items_received":self.items_received,
+                "reads":self.reads
+            }
+
+    def _between(self, calendar_id:str, start:float, end:float) -> Iterator[Tuple[str, tuple]]:
+        calendar=self._calendars[calendar_id]
+        with self._lock:
+            self.reads +=1
+            # nothing starting earlier than the longest event can still overlap the window
+            low=bisect.bisect_left(calendar.starts, (start - calendar.max_duration,))
+            high=bisect.bisect_left(calendar.starts, (end,))
+            matches=[
+                (event_id, calendar.events[event_id]) for _, event_id in calendar.starts[low:high]
+                if calendar.events[event_id][1] > start
+            ]
+        return iter(matches)
+
+    @staticmethod
+    def _replace(calendar:_MirroredCalendar, events:Dict[str, tuple]):
+        calendar.events=events
+        calendar.starts=sorted((row[0], event_id) for event_id, row in events.items())
+        calendar.max_duration=max((row[1] - row[0] for row in events.values()), default=0)
+
+    @staticmethod
+    def _put(calendar:_MirroredCalendar, event_id:str, row:Optional[tuple]) -> Optional[tuple]:
+        old=calendar.events.pop(event_id, None)
+        if old is not None:
+            del calendar.starts[bisect.bisect_left(calendar.starts, (old[0], event_id))]
+        if row is not None:
+            calendar.events[event_id]=row
+            bisect.insort(calendar.starts, (row[0], event_id))
+            calendar.max_duration=max(calendar.max_duration, row[1] - row[0])
+        return old
+
+    def _persist(self, calendar_id:str, rows:Dict[str, Optional[tuple]], sync_token:Optional[str],
+                first_day:Optional[date], last_day:Optional[date], full:bool):
+        with self._db_lock:
+            conn=self._db
+            if conn is None:
+                return
+            conn.execute("BEGIN")
+            try:
+                if full:
+                    conn.execute("DELETE FROM events WHERE calendar_id=?", (calendar_id,))
+                else:
+                    conn.executemany(
+                        "DELETE FROM events WHERE calendar_id=? AND event_id=?",
+                        [(calendar_id, event_id) for event_id, row in rows.items() if row is None]
+                    )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(calendar_id, event_id, *row) for event_id, row in rows.items() if row is not None]
+                )
+                if sync_token is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+                        (calendar_id, sync_token, first_day.isoformat(), last_day.isoformat())
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _row(self, event:Dict) -> Optional[tuple]:
+        if event.get('status')=='cancelled':
+            return None
+        start, end=event.get('start', {}), event.get('end', {})
+        if 'dateTime' in start:
+            start_time, end_time=self._parse(start['dateTime']), self._parse(end['dateTime'])
+            all_day=False
+        elif 'date' in start:
+            start_time=self.timezone.localize(datetime.combine(date.fromisoformat(start['date']), datetime.min.time()))
+            end_time=self.timezone.localize(datetime.combine(date.fromisoformat(end['date']), datetime.min.time()))
+            all_day=True
+        else:
+            return None
+        # free/busy ignores events marked free and invitations the calendar owner declined
+        declined=any(
+            attendee.get('self') and attendee.get('responseStatus')=='declined'
+            for attendee in event.get('attendees', [])
+        )
+        busy=event.get('transparency') !='transparent' and not declined
+        return (int(start_time.timestamp()), int(end_time.timestamp()), busy, all_day, event.get('summary', ''))
+
+    def _days(self, row:tuple) -> List[date]:
+        first_day=self._local(row[0]).date()
+        last_day=max(first_day, self._local(row[1] - 1).date())
+        return [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+
+    def _local(self, timestamp:float) -> datetime:
+        return datetime.fromtimestamp(timestamp, self.timezone)
+
+    @staticmethod
+    def _parse(value:str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+@functools.lru_cache(maxsize=65536)
+def _format_utc(timestamp:int) -> str:
+    # meetings start and end on a small set of round times, so most of these are cache hits
+    return datetime.fromtimestamp(timestamp, pytz.UTC).isoformat().replace('+00:00', 'Z')
+
+class MirrorPoller:
+    # keeps the mirror in sync: a pass every poll_seconds, and one right away when a push notification
+    # arrives. notifications during a pass are folded into a single follow-up pass
+    def __init__(self, calendar_service, poll_seconds:float=CALENDAR_MIRROR_POLL_SECONDS, on_change=None):
+        self.calendar_service=calendar_service
+        self.poll_seconds=poll_seconds
+        self.on_change=on_change
+        self.notifications=0
+        self._wake=None
+        self._task=None
+
+    @property
+    def enabled(self) -> bool:
+        return self.calendar_service.calendar_service.mirror is not None
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._wake=asyncio.Event()
+            self._task=asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task=None
+
+    def notify(self):
+        self.notifications +=1
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _poll_loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                changed=await self.calendar_service.sync_mirror()
+                if changed and self.on_change is not None:
+                    await self.on_change()
+            except Exception as e:
+                logger.warning("sync failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+def create_calendar_mirror() -> Optional[CalendarMirror]:
+    if not CALENDAR_MIRROR_ENABLED:
+        return None
+    directory=os.path.dirname(CALENDAR_MIRROR_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return CalendarMirror(CALENDAR_MIRROR_PATH)
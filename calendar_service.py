@@ -1,197 +1,562 @@
-import os
-import pickle
-from datetime import datetime, timedelta, UTC
-from typing import List, Dict, Optional
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, UTC
+from typing import List, Dict, Optional, Tuple
 from googleapiclient.errors import HttpError
-import pytz
+from calendar_backends import CalendarBackend, create_calendar_backend
+from calendar_mirror import CalendarMirror, create_calendar_mirror
 from config import Config
+from freebusy_cache import FreeBusyCache
+from metrics import COUNT_BUCKETS, metrics
+from profiling import record, span
+from rate_limit import SingleFlight, TokenBucket, set_queued_seconds
+from range_availability import find_free_slots_range
+from slot_finder import find_free_slots
+from timeutil import local_time
+
+logger=logging.getLogger(__name__)
+
+FREEBUSY_SECONDS=metrics.histogram(
+    "calendar_freebusy_request_seconds", "Calendar API free/busy request latency", labels=("outcome",)
+)
+SLOTS_EVALUATED=metrics.histogram(
+    "calendar_slots_evaluated", "Candidate slots tested per availability query", labels=("finder",),
+    buckets=COUNT_BUCKETS
+)
 
 class CalendarService:
-    SCOPES=['https://www.googleapis.com/auth/calendar']
-    
-    def __init__(self):
-        self.service=None
-        self.timezone=pytz.timezone(Config.TIMEZONE)
-        self._authenticate()
-    
-    def _authenticate(self):
-        creds=None
-        if os.path.exists(Config.GOOGLE_CALENDAR_TOKEN_FILE):
-            with open(Config.GOOGLE_CALENDAR_TOKEN_FILE, 'rb') as token:
-                creds=pickle.load(token)
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                if not os.path.exists(Config.GOOGLE_CALENDAR_CREDENTIALS_FILE):
-                    raise FileNotFoundError(
-                        f"calendar credentials file not found:{Config.GOOGLE_CALENDAR_CREDENTIALS_FILE}"
-                    )
-                flow=InstalledAppFlow.from_client_secrets_file(
-                    Config.GOOGLE_CALENDAR_CREDENTIALS_FILE, self.SCOPES
-                )
-                creds=flow.run_local_server(port=0)
-            with open(Config.GOOGLE_CALENDAR_TOKEN_FILE, 'wb') as token:
-                pickle.dump(creds, token)
-        
-        self.service=build('calendar', 'v3', credentials=creds)
+    FREEBUSY_MAX_ITEMS=50
+    
+    def __init__(self, backend:Optional[CalendarBackend]=None, rate_limiter:Optional[TokenBucket]=None,
+                mirror:Optional[CalendarMirror]=None):
+        self.backend=backend or create_calendar_backend()
+        self.local_time=local_time()
+        self.timezone=self.local_time.zone
+        self.freebusy_cache=FreeBusyCache()
+        self.freebusy_queries=0
+        # every Calendar API request draws from one bucket; identical free/busy queries in flight share one request
+        self.rate_limiter=rate_limiter or TokenBucket()
+        self.freebusy_inflight=SingleFlight()
+        # once synced, free/busy and event listings inside the mirror window are answered locally
+        self.mirror=mirror or create_calendar_mirror()
+    
+    def get_free_busy(self, start_time:datetime, end_time:datetime,
+                    calendar_id:str='primary') -> List[Dict]:
+        return self.get_free_busy_multi([calendar_id], start_time, end_time).get(calendar_id, [])
     
-    def get_free_busy(self, start_time:datetime, end_time:datetime) -> List[Dict]:
+    def get_free_busy_multi(self, calendar_ids:List[str], start_time:datetime, end_time:datetime,
+                            attendees:Optional[List[str]]=None) -> Dict[str, List[Dict]]:
+        calendar_ids=list(dict.fromkeys(list(calendar_ids) + list(attendees or [])))
         try:
-            if start_time.tzinfo is None:
-                ist_tz=pytz.timezone(Config.TIMEZONE)
-                start_time=ist_tz.localize(start_time).astimezone(pytz.UTC)
-            if end_time.tzinfo is None:
-                ist_tz=pytz.timezone(Config.TIMEZONE)
-                end_time=ist_tz.localize(end_time).astimezone(pytz.UTC)
+            start_time, end_time=self.local_time.to_utc(start_time), self.local_time.to_utc(end_time)
             
-            body={
-                'timeMin':start_time.isoformat(),
-                'timeMax':end_time.isoformat(),
-                'timeZone':'UTC',
-                'items':[{'id':'primary'}]
-            }
-            freebusy=self.service.freebusy().query(body=body).execute()
-            busy_times=freebusy['calendars']['primary'].get('busy', [])
-            return busy_times
+            days=self._local_days(start_time, end_time)
+            busy_by_day={}
+            missing_days={}
+            for calendar_id in calendar_ids:
+                for day in days:
+                    cached=self.freebusy_cache.get(calendar_id, day)
+                    if cached is None:
+                        missing_days.setdefault(calendar_id, []).append(day)
+                    else:
+                        busy_by_day[(calendar_id, day)]=cached
+            if missing_days:
+                first_day=min(calendar_days[0] for calendar_days in missing_days.values())
+                last_day=max(calendar_days[-1] for calendar_days in missing_days.values())
+                missing_ids=list(missing_days)
+                for offset in range(0, len(missing_ids), self.FREEBUSY_MAX_ITEMS):
+                    chunk=missing_ids[offset:offset + self.FREEBUSY_MAX_ITEMS]
+                    fetched=self._query_days(chunk, first_day, last_day)
+                    for calendar_id in chunk:
+                        if calendar_id not in fetched:
+                            continue
+                        for day in missing_days[calendar_id]:
+                            busy=fetched[calendar_id].get(day, [])
+                            busy_by_day[(calendar_id, day)]=busy
+                            self.freebusy_cache.put(calendar_id, day, busy)
+            
+            result={}
+            for calendar_id in calendar_ids:
+                busy_times=[]
+                seen=set()
+                for day in days:
+                    for busy in busy_by_day.get((calendar_id, day), []):
+                        key=(busy['start'], busy['end'])
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        busy_start, busy_end=self._parse_utc(busy['start']), self._parse_utc(busy['end'])
+                        if busy_start < end_time and busy_end > start_time:
+                            busy_times.append((busy_start, busy))
+                busy_times.sort(key=lambda item:item[0])
+                result[calendar_id]=[busy for _, busy in busy_times]
+            return result
         except HttpError as error:
-            print(f"error getting free/busy info:{error}")
-            return []
+            logger.error("error getting free/busy info: %s", error)
+            return {calendar_id:[] for calendar_id in calendar_ids}
+    
+    def refresh_free_busy(self, calendar_ids:List[str], first_day:date, last_day:date) -> Dict[str, Dict[date, List[Dict]]]:
+        # one ranged query regardless of what is cached; the results refresh the per-day cache too
+        fetched={}
+        try:
+            for offset in range(0, len(calendar_ids), self.FREEBUSY_MAX_ITEMS):
+                chunk=calendar_ids[offset:offset + self.FREEBUSY_MAX_ITEMS]
+                fetched.update(self._query_days(chunk, first_day, last_day))
+        except HttpError as error:
+            logger.error("error refreshing free/busy info: %s", error)
+            return {}
+        for calendar_id, busy_by_day in fetched.items():
+            for offset in range((last_day - first_day).days + 1):
+                day=first_day + timedelta(days=offset)
+                self.freebusy_cache.put(calendar_id, day, busy_by_day.get(day, []))
+        return fetched
+    
+    def _query_days(self, calendar_ids:List[str], first_day:date, last_day:date) -> Dict[str, Dict[date, List[Dict]]]:
+        if self.mirror is not None and self.mirror.covers(calendar_ids, first_day, last_day):
+            return {calendar_id:self.mirror.busy_by_day(calendar_id, first_day, last_day) for calendar_id in calendar_ids}
+        # sessions asking about the same day at once all miss the cache together; only the first one queries
+        return self.freebusy_inflight.do(
+            (tuple(calendar_ids), first_day, last_day), self._fetch_days, calendar_ids, first_day, last_day
+        )
+    
+    def _fetch_days(self, calendar_ids:List[str], first_day:date, last_day:date) -> Dict[str, Dict[date, List[Dict]]]:
+        window_start, window_end=self._days_window(first_day, last_day)
+        body={
+            'timeMin':window_start.astimezone(UTC).isoformat(),
+            'timeMax':window_end.astimezone(UTC).isoformat(),
+            'timeZone':'UTC',
+            'items':[{'id':calendar_id} for calendar_id in calendar_ids]
+        }
+        started=time.perf_counter()
+        try:
+            freebusy=self._api(1, self.backend.query_free_busy, body)
+        except Exception:
+            FREEBUSY_SECONDS.observe(time.perf_counter() - started, "error")
+            raise
+        FREEBUSY_SECONDS.observe(time.perf_counter() - started, "ok")
+        self.freebusy_queries +=1
+        
+        fetched={}
+        for calendar_id in calendar_ids:
+            calendar=freebusy['calendars'].get(calendar_id, {})
+            if calendar.get('errors'):
+                # unknown or private calendars come back with errors instead of busy data
+                logger.warning("free/busy unavailable for %s: %s", calendar_id, calendar['errors'])
+                continue
+            fetched[calendar_id]=self._busy_by_day(calendar.get('busy', []))
+        return fetched
+    
+    def _busy_by_day(self, busy_times:List[Dict]) -> Dict[date, List[Dict]]:
+        busy_by_day={}
+        for busy in busy_times:
+            for day in self._local_days(self._parse_utc(busy['start']), self._parse_utc(busy['end'])):
+                busy_by_day.setdefault(day, []).append(busy)
+        return busy_by_day
+    
+    def _days_window(self, first_day:date, last_day:date) -> tuple:
+        window_start=self.local_time.localize(datetime.combine(first_day, datetime.min.time()))
+        window_end=self.local_time.localize(datetime.combine(last_day + timedelta(days=1), datetime.min.time()))
+        return window_start, window_end
+    
+    def sync_mirror(self) -> int:
+        # one pass over the mirrored calendars; returns how many changed events came back
+        self.mirror.load()
+        return sum(self._sync_calendar(calendar_id) for calendar_id in self.mirror.calendar_ids)
+    
+    def _sync_calendar(self, calendar_id:str) -> int:
+        today=self.local_time.now().date()
+        window=None
+        time_min=time_max=None
+        sync_token=self.mirror.sync_token(calendar_id)
+        if self.mirror.needs_full_sync(calendar_id, today):
+            sync_token=None
+            window=self.mirror.full_sync_window(today)
+            window_start, window_end=self._days_window(*window)
+            time_min=window_start.astimezone(UTC).isoformat()
+            time_max=window_end.astimezone(UTC).isoformat()
+        items=[]
+        page_token=None
+        while True:
+            try:
+                page=self._api(1, self.backend.sync_events, calendar_id, sync_token, page_token, time_min, time_max)
+            except HttpError as error:
+                if sync_token is None or error.resp.status !=410:
+                    raise
+                logger.info("mirror sync token for %s expired, running a full sync", calendar_id)
+                self.mirror.forget(calendar_id)
+                return self._sync_calendar(calendar_id)
+            items.extend(page.get('items', []))
+            page_token=page.get('nextPageToken')
+            if not page_token:
+                break
+        changed_days=self.mirror.apply(calendar_id, items, page['nextSyncToken'], window)
+        
+        # cached free/busy for the changed days is out of date now
+        cached_ids=[calendar_id, 'primary'] if calendar_id==Config.CALENDAR_ID else [calendar_id]
+        for cached_id in cached_ids:
+            if changed_days is None:
+                self.freebusy_cache.invalidate(cached_id)
+            for day in changed_days or []:
+                self.freebusy_cache.invalidate(cached_id, day)
+        if window is not None:
+            logger.info("mirror full sync of %s: %d events %s to %s", calendar_id, len(items), window[0], window[1])
+        return len(items)
+    
+    def _local_days(self, start_time:datetime, end_time:datetime) -> List[date]:
+        first_day=self.local_time.to_local(start_time).date()
+        last_day=max(first_day, self.local_time.to_local(end_time - timedelta(microseconds=1)).date())
+        return [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+    
+    @staticmethod
+    def _parse_utc(value:str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
     
     def find_available_slots(self, start_date:datetime, end_date:datetime, 
-                        duration_minutes:int=60) -> List[Dict]:
-        ist_tz=pytz.timezone(Config.TIMEZONE)
-        current_time_utc=datetime.now(UTC)
-        current_time_ist=current_time_utc.astimezone(ist_tz).replace(tzinfo=None)
+                        duration_minutes:int=60, step_minutes:int=60,
+                        attendees:Optional[List[str]]=None) -> List[Dict]:
+        return self._find_slots(find_free_slots, start_date, end_date, duration_minutes, step_minutes, attendees)[0]
+    
+    def find_available_slots_range(self, start_date:datetime, end_date:datetime,
+                                duration_minutes:int=60, step_minutes:int=60,
+                                attendees:Optional[List[str]]=None) -> List[Dict]:
+        # any span of days: one free/busy query and one vectorized pass over the whole slot grid
+        return self._find_slots(
+            find_free_slots_range, start_date, end_date, duration_minutes, step_minutes, attendees
+        )[0]
+    
+    def find_slot_candidates(self, start_date:datetime, end_date:datetime, duration_minutes:int=60,
+                            step_minutes:int=60, attendees:Optional[List[str]]=None,
+                            multi_day:bool=False) -> Tuple[List[Dict], List[tuple]]:
+        # the free slots together with the busy periods they were cut from, for ranking
+        finder=find_free_slots_range if multi_day else find_free_slots
+        return self._find_slots(finder, start_date, end_date, duration_minutes, step_minutes, attendees)
+    
+    def _find_slots(self, finder, start_date:datetime, end_date:datetime, duration_minutes:int,
+                    step_minutes:int, attendees:Optional[List[str]]) -> Tuple[List[Dict], List[tuple]]:
+        current_time_ist=self.local_time.now()
     
         if start_date <=current_time_ist:
             start_date=current_time_ist + timedelta(hours=1)
             start_date=start_date.replace(minute=0, second=0, microsecond=0)
         
-        print(f"[CALENDAR] checking slots from {start_date} to {end_date}")
+        logger.debug("checking slots from %s to %s", start_date, end_date)
     
-        busy_times=self.get_free_busy(start_date, end_date)
-        print(f"[CALENDAR] found {len(busy_times)} busy periods")
+        busy_by_calendar=self.get_free_busy_multi(['primary'], start_date, end_date, attendees)
+        busy_times=[busy for calendar_busy in busy_by_calendar.values() for busy in calendar_busy]
+        logger.debug("found %d busy periods across %d calendars", len(busy_times), len(busy_by_calendar))
         
-        available_slots=[]
-        busy_periods=[]
+        with span("parse_busy"):
+            busy_periods=self._parse_busy_periods(busy_times)
+        # every grid point in the window is a candidate, whichever way the finder gets through them
+        candidates=(end_date - start_date - timedelta(minutes=duration_minutes)) // timedelta(minutes=step_minutes) + 1
+        SLOTS_EVALUATED.observe(max(candidates, 0), "range" if finder is find_free_slots_range else "day")
+        with span("slot_finder"):
+            available_slots=finder(
+                start_date, end_date, busy_periods, current_time_ist,
+                duration_minutes=duration_minutes, step_minutes=step_minutes
+            )
+        
+        logger.debug("returning %d available slots", len(available_slots))
+        return available_slots, busy_periods
+    
+    def _parse_busy_periods(self, busy_times:List[Dict]) -> List[tuple]:
+        starts=[]
+        ends=[]
         for busy in busy_times:
+            start_str=busy['start']
+            end_str=busy['end']
+            if isinstance(start_str, dict):
+                start_str=start_str.get('dateTime', start_str.get('date', ''))
+                end_str=end_str.get('dateTime', end_str.get('date', ''))
+            starts.append(start_str)
+            ends.append(end_str)
+        try:
+            # the whole batch through one offset table
+            return list(zip(self.local_time.parse_many(starts), self.local_time.parse_many(ends)))
+        except (ValueError, TypeError):
+            pass
+        # something malformed in there: go one by one and skip just the bad ones
+        busy_periods=[]
+        for start_str, end_str in zip(starts, ends):
             try:
-                start_str=busy['start']
-                end_str=busy['end']
-                if isinstance(start_str, dict):
-                    start_str=start_str.get('dateTime', start_str.get('date', ''))
-                    end_str=end_str.get('dateTime', end_str.get('date', ''))
-                if 'T' in start_str:
-                    start=datetime.fromisoformat(start_str.replace('Z', '+00:00'))
-                    end=datetime.fromisoformat(end_str.replace('Z', '+00:00'))
-                    if start.tzinfo:
-                        start_ist=start.astimezone(ist_tz).replace(tzinfo=None)
-                        end_ist=end.astimezone(ist_tz).replace(tzinfo=None)
-                    else:
-                        start_ist=start
-                        end_ist=end
-                else:
-                    start_ist=datetime.fromisoformat(start_str)
-                    end_ist=datetime.fromisoformat(end_str)
-                
-                busy_periods.append((start_ist, end_ist))
-                print(f"[CALENDAR] busy:{start_ist} to {end_ist}")
-                
+                busy_periods.append(tuple(self.local_time.parse_many([start_str, end_str])))
             except Exception as e:
-                print(f"[CALENDAR] error parsing busy time:{e}")
-                continue
-        
-        busy_periods.sort(key=lambda x:x[0])
-        current_time=start_date
-        duration=timedelta(minutes=duration_minutes)
-        
-        while current_time + duration <=end_date:
-            slot_end=current_time + duration
-            is_available=True
-            for busy_start, busy_end in busy_periods:
-                if (current_time < busy_end and slot_end > busy_start):
-                    is_available=False
-                    print(f"[CALENDAR] slot {current_time} conflicts with busy period {busy_start}-{busy_end}")
-                    break
-            
-            if is_available:
-                if (Config.BUSINESS_HOURS_START <=current_time.hour < Config.BUSINESS_HOURS_END and 
-                    current_time > current_time_ist + timedelta(minutes=15) and
-                    current_time.weekday() < 5 and
-                    not (12 <=current_time.hour < 14)):
-                    
-                    available_slots.append({
-                        'start':current_time,
-                        'end':slot_end,
-                        'start_str':current_time.strftime(Config.DATETIME_FORMAT),
-                        'end_str':slot_end.strftime(Config.DATETIME_FORMAT)
-                    })
-                    print(f"[CALENDAR] available slot:{current_time} to {slot_end}")
-            
-            current_time +=timedelta(hours=1)
-        
-        print(f"[CALENDAR] returning {len(available_slots)} available slots")
-        return available_slots
+                logger.warning("error parsing busy time: %s", e)
+        return busy_periods
     
     def create_event(self, title:str, start_time:datetime, end_time:datetime, 
                     description:str="", attendees:List[str]=None) -> Optional[str]:
 
         try:
-            if start_time.tzinfo is None:
-                ist_tz=pytz.timezone(Config.TIMEZONE)
-                start_time=ist_tz.localize(start_time)
-            if end_time.tzinfo is None:
-                ist_tz=pytz.timezone(Config.TIMEZONE)
-                end_time=ist_tz.localize(end_time)
-            
-            event={
-                'summary':title,
-                'description':description,
-                'start':{
-                    'dateTime':start_time.isoformat(),
-                    'timeZone':Config.TIMEZONE,
-                },
-                'end':{
-                    'dateTime':end_time.isoformat(),
-                    'timeZone':Config.TIMEZONE,
-                },
-            }
-            
-            if attendees:
-                event['attendees']=[{'email':email} for email in attendees]
-            
-            event=self.service.events().insert(
-                calendarId=Config.CALENDAR_ID, body=event
-            ).execute()
-            
-            return event.get('id')
+            return self.insert_event(title, start_time, end_time, description, attendees)
         except HttpError as error:
-            print(f"Error creating event:{error}")
+            logger.error("error creating event: %s", error)
             return None
     
+    def insert_event(self, title:str, start_time:datetime, end_time:datetime,
+                    description:str="", attendees:List[str]=None, event_id:Optional[str]=None) -> str:
+        # raises HttpError; with an event_id the write is idempotent and a 409 means it already exists
+        start_time, end_time=self._localize(start_time), self._localize(end_time)
+        body=self._event_body(title, start_time, end_time, description, attendees, event_id)
+        try:
+            created_id=self._api(1, self.backend.insert_event, Config.CALENDAR_ID, body).get('id')
+        except HttpError as error:
+            if event_id is None or error.resp.status !=409:
+                raise
+            created_id=event_id
+        self._after_insert(start_time, end_time, attendees, dict(body, id=created_id))
+        return created_id
+    
+    def create_events(self, events:List[Dict]) -> List[Optional[str]]:
+        # each dict carries insert_event's arguments; inserts go out as batch requests
+        try:
+            results=self.insert_events(events)
+        except HttpError as error:
+            logger.error("error creating events: %s", error)
+            return [None] * len(events)
+        event_ids=[]
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("error creating event: %s", result)
+                event_ids.append(None)
+                continue
+            event_ids.append(result)
+        return event_ids
+    
+    def insert_events(self, events:List[Dict]) -> List:
+        # like create_events, but each failed insert comes back as its exception so callers can retry it;
+        # raises when the batch request as a whole fails
+        bodies=[]
+        windows=[]
+        for event in events:
+            start_time, end_time=self._localize(event['start_time']), self._localize(event['end_time'])
+            windows.append((start_time, end_time))
+            bodies.append(self._event_body(
+                event['title'], start_time, end_time, event.get('description', ""),
+                event.get('attendees'), event.get('event_id')
+            ))
+        results=self._api(len(bodies), self.backend.insert_events, Config.CALENDAR_ID, bodies)
+        
+        outcomes=[]
+        for event, body, (start_time, end_time), result in zip(events, bodies, windows, results):
+            if isinstance(result, HttpError) and event.get('event_id') and result.resp.status==409:
+                result={'id':event['event_id']}
+            if isinstance(result, Exception):
+                outcomes.append(result)
+                continue
+            self._after_insert(start_time, end_time, event.get('attendees'), dict(body, id=result.get('id')))
+            outcomes.append(result.get('id'))
+        return outcomes
+    
+    def _api(self, cost:int, func, *args):
+        # raises RateLimitExceeded when the bucket can't pay for the call within its max wait
+        with span("rate_limit"):
+            self.rate_limiter.acquire(cost)
+        with span(f"api.{func.__name__}"):
+            return func(*args)
+    
+    def _localize(self, value:datetime) -> datetime:
+        return self.local_time.localize(value)
+    
+    def _event_body(self, title:str, start_time:datetime, end_time:datetime,
+                    description:str="", attendees:List[str]=None, event_id:Optional[str]=None) -> Dict:
+        event={
+            'summary':title,
+            'description':description,
+            'start':{
+                'dateTime':start_time.isoformat(),
+                'timeZone':Config.TIMEZONE,
+            },
+            'end':{
+                'dateTime':end_time.isoformat(),
+                'timeZone':Config.TIMEZONE,
+            },
+        }
+        
+        if attendees:
+            event['attendees']=[{'email':email} for email in attendees]
+        if event_id:
+            event['id']=event_id
+        return event
+    
+    def _after_insert(self, start_time:datetime, end_time:datetime, attendees:List[str]=None,
+                    event:Optional[Dict]=None):
+        self._record_busy(Config.CALENDAR_ID, start_time, end_time)
+        if self.mirror is not None and event is not None:
+            self.mirror.upsert(Config.CALENDAR_ID, event)
+        for email in attendees or []:
+            for day in self._local_days(start_time, end_time):
+                self.freebusy_cache.invalidate(email, day)
+    
+    def _record_busy(self, calendar_id:str, start_time:datetime, end_time:datetime):
+        interval={
+            'start':start_time.astimezone(UTC).isoformat().replace('+00:00', 'Z'),
+            'end':end_time.astimezone(UTC).isoformat().replace('+00:00', 'Z')
+        }
+        for day in self._local_days(start_time, end_time):
+            self.freebusy_cache.add_busy(calendar_id, day, interval)
+            if calendar_id !='primary':
+                self.freebusy_cache.invalidate('primary', day)
+    
     def get_events_for_day(self, date:datetime) -> List[Dict]:
+        mirrored=self._mirrored_events([date])
+        if mirrored is not None:
+            return mirrored[0]
         try:
-            if date.tzinfo is None:
-                ist_tz=pytz.timezone(Config.TIMEZONE)
-                date=ist_tz.localize(date)
-            
-            start_of_day=date.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_of_day=date.replace(hour=23, minute=59, second=59, microsecond=999999)
-            events_result=self.service.events().list(
-                calendarId=Config.CALENDAR_ID,
-                timeMin=start_of_day.isoformat(),
-                timeMax=end_of_day.isoformat(),
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
+            events_result=self._api(1, self.backend.list_events, Config.CALENDAR_ID, *self._day_window(date))
             
             events=events_result.get('items', [])
             return events
         except HttpError as error:
-            print(f"Error getting events:{error}")
-            return []
\ No newline at end of file
+            logger.error("error getting events: %s", error)
+            return []
+    
+    def get_events_for_days(self, dates:List[datetime]) -> List[List[Dict]]:
+        mirrored=self._mirrored_events(dates)
+        if mirrored is not None:
+            return mirrored
+        try:
+            results=self._api(
+                len(dates), self.backend.list_events_many, Config.CALENDAR_ID, [self._day_window(date) for date in dates]
+            )
+        except HttpError as error:
+            logger.error("error getting events: %s", error)
+            return [[] for _ in dates]
+        events=[]
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("error getting events: %s", result)
+                events.append([])
+            else:
+                events.append(result.get('items', []))
+        return events
+    
+    def _mirrored_events(self, dates:List[datetime]) -> Optional[List[List[Dict]]]:
+        if self.mirror is None or not dates:
+            return None
+        days=[self._localize(date).date() for date in dates]
+        if not self.mirror.covers([Config.CALENDAR_ID], min(days), max(days)):
+            return None
+        return [self.mirror.events_between(Config.CALENDAR_ID, *self._days_window(day, day)) for day in days]
+    
+    def _day_window(self, date:datetime) -> tuple:
+        date=self._localize(date)
+        start_of_day=date.replace(hour=0, minute=0, second=0, microsecond=0)
+        end_of_day=date.replace(hour=23, minute=59, second=59, microsecond=999999)
+        return start_of_day.isoformat(), end_of_day.isoformat()
+
+class AsyncCalendarService:
+    def __init__(self, calendar_service:Optional[CalendarService]=None, max_workers:Optional[int]=None):
+        self.calendar_service=calendar_service or CalendarService()
+        self.max_workers=max_workers or getattr(Config, "CALENDAR_EXECUTOR_WORKERS", 8)
+        self._executor=ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="calendar"
+        )
+    
+    async def _run(self, func, *args, **kwargs):
+        loop=asyncio.get_running_loop()
+        # the worker runs in a copy of this context, so a profiled request keeps its spans
+        context=contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args, **kwargs))
+    
+    async def _call(self, func, *args):
+        # the rate limiter is only consulted in CalendarService._api, once a call really goes to the API:
+        # lookups answered by the free/busy cache, the mirror or a coalesced query never spend a token.
+        # time spent queued for a worker counts against the limiter's max wait, so a backed-up pool
+        # still turns API work away instead of holding it for the whole queue
+        submitted=time.perf_counter()
+        
+        def started():
+            queued_seconds=time.perf_counter() - submitted
+            record("executor_queue", queued_seconds)
+            set_queued_seconds(queued_seconds)
+            return func(*args)
+        
+        with span(f"calendar.{func.__name__}"):
+            return await self._run(started)
+    
+    async def get_free_busy(self, start_time:datetime, end_time:datetime,
+                            calendar_id:str='primary') -> List[Dict]:
+        return await self._call(self.calendar_service.get_free_busy, start_time, end_time, calendar_id)
+    
+    async def get_free_busy_multi(self, calendar_ids:List[str], start_time:datetime, end_time:datetime,
+                                attendees:Optional[List[str]]=None) -> Dict[str, List[Dict]]:
+        return await self._call(
+            self.calendar_service.get_free_busy_multi, calendar_ids, start_time, end_time, attendees
+        )
+    
+    async def refresh_free_busy(self, calendar_ids:List[str], first_day:date,
+                                last_day:date) -> Dict[str, Dict[date, List[Dict]]]:
+        return await self._call(self.calendar_service.refresh_free_busy, calendar_ids, first_day, last_day)
+    
+    async def find_available_slots(self, start_date:datetime, end_date:datetime, 
+                                duration_minutes:int=60, step_minutes:int=60,
+                                attendees:Optional[List[str]]=None) -> List[Dict]:
+        return await self._call(
+            self.calendar_service.find_available_slots, start_date, end_date,
+            duration_minutes, step_minutes, attendees
+        )
+    
+    async def find_available_slots_range(self, start_date:datetime, end_date:datetime,
+                                        duration_minutes:int=60, step_minutes:int=60,
+                                        attendees:Optional[List[str]]=None) -> List[Dict]:
+        return await self._call(
+            self.calendar_service.find_available_slots_range, start_date, end_date,
+            duration_minutes, step_minutes, attendees
+        )
+    
+    async def find_slot_candidates(self, start_date:datetime, end_date:datetime, duration_minutes:int=60,
+                                step_minutes:int=60, attendees:Optional[List[str]]=None,
+                                multi_day:bool=False) -> Tuple[List[Dict], List[tuple]]:
+        return await self._call(
+            self.calendar_service.find_slot_candidates, start_date, end_date, duration_minutes,
+            step_minutes, attendees, multi_day
+        )
+    
+    async def create_event(self, title:str, start_time:datetime, end_time:datetime, 
+                        description:str="", attendees:List[str]=None) -> Optional[str]:
+        return await self._call(
+            self.calendar_service.create_event, title, start_time, end_time, description, attendees
+        )
+    
+    async def get_events_for_day(self, date:datetime) -> List[Dict]:
+        return await self._call(self.calendar_service.get_events_for_day, date)
+    
+    async def get_events_for_days(self, dates:List[datetime]) -> List[List[Dict]]:
+        return await self._call(self.calendar_service.get_events_for_days, dates)
+    
+    async def insert_event(self, title:str, start_time:datetime, end_time:datetime,
+                        description:str="", attendees:List[str]=None, event_id:Optional[str]=None) -> str:
+        return await self._call(
+            self.calendar_service.insert_event, title, start_time, end_time, description, attendees, event_id
+        )
+    
+    async def create_events(self, events:List[Dict]) -> List[Optional[str]]:
+        return await self._call(self.calendar_service.create_events, events)
+    
+    async def insert_events(self, events:List[Dict]) -> List:
+        return await self._call(self.calendar_service.insert_events, events)
+    
+    async def sync_mirror(self) -> int:
+        return await self._call(self.calendar_service.sync_mirror)
+    
+    async def warm_up(self):
+        await self._run(self.calendar_service.backend.warm_up)
+    
+    async def keep_credentials_fresh(self, retry_seconds:float=60):
+        while True:
+            try:
+                delay=await self._run(self.calendar_service.backend.refresh_credentials)
+            except Exception as e:
+                logger.warning("credential refresh failed: %s", e)
+                delay=retry_seconds
+            if delay is None:
+                return
+            await asyncio.sleep(delay)
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
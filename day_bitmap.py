@@ -0,0 +1,154 @@
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import Config
+from range_availability import LUNCH_END_HOUR, LUNCH_START_HOUR
+from slot_finder import Slot
+
+DAY_BITMAP_CELL_MINUTES=getattr(Config, "DAY_BITMAP_CELL_MINUTES", 5)
+
+@lru_cache(maxsize=64)
+def _width(cell_minutes:int) -> int:
+    return (Config.BUSINESS_HOURS_END - Config.BUSINESS_HOURS_START) * 60 // cell_minutes
+
+@lru_cache(maxsize=64)
+def _bookable_cells(cell_minutes:int) -> int:
+    # cells a slot may start in: business hours outside lunch, the same rule as is_bookable
+    mask=0
+    for cell in range(_width(cell_minutes)):
+        hour=Config.BUSINESS_HOURS_START + cell * cell_minutes // 60
+        if not LUNCH_START_HOUR <=hour < LUNCH_END_HOUR:
+            mask |=1 << cell
+    return mask
+
+@lru_cache(maxsize=1024)
+def _grid(first_cell:int, step_cells:int, last_cell:int) -> int:
+    # bits first_cell, first_cell + step_cells, ... up to last_cell
+    mask=0
+    for cell in range(first_cell, last_cell + 1, step_cells):
+        mask |=1 << cell
+    return mask
+
+class DayBitmap:
+    # one business day as a single int: bit i stands for the cell starting i cells after opening and
+    # is set while anything is busy in it. busy edges are rounded outwards to whole cells, which is
+    # exact for calendars whose events start and end on the cell grid. unions across calendars are one
+    # `|`, and "where do n free cells start" is a handful of shifts and ands over the whole day
+    __slots__=('day', 'cell_minutes', 'busy')
+
+    def __init__(self, day:date, cell_minutes:int=DAY_BITMAP_CELL_MINUTES, busy:int=0):
+        self.day=day
+        self.cell_minutes=cell_minutes
+        self.busy=busy
+
+    @classmethod
+    def from_periods(cls, day:date, periods:Iterable[Tuple[datetime, datetime]],
+                    cell_minutes:int=DAY_BITMAP_CELL_MINUTES) -> "DayBitmap":
+        bitmap=cls(day, cell_minutes)
+        for start, end in periods:
+            bitmap.mark_busy(start, end)
+        return bitmap
+
+    @property
+    def width(self) -> int:
+        return _width(self.cell_minutes)
+
+    @property
+    def opening(self) -> datetime:
+        return datetime.combine(self.day, datetime.min.time()).replace(hour=Config.BUSINESS_HOURS_START)
+
+    def _cell(self, value:datetime) -> float:
+        return (value - self.opening) / timedelta(minutes=self.cell_minutes)
+
+    def mark_busy(self, start:datetime, end:datetime):
+        if end <=start:
+            return
+        first=max(int(self._cell(start) // 1), 0)
+        last=min(-int(-self._cell(end) // 1), self.width)
+        if last > first:
+            self.busy |=((1 << (last - first)) - 1) << first
+
+    def union(self, *others:"DayBitmap") -> "DayBitmap":
+        # busy in any of the calendars: what's left free suits all of them
+        busy=self.busy
+        for other in others:
+            busy |=other.busy
+        return DayBitmap(self.day, self.cell_minutes, busy)
+
+    def intersection(self, *others:"DayBitmap") -> "DayBitmap":
+        # busy in every one of the calendars: what's left free suits at least one of them
+        busy=self.busy
+        for other in others:
+            busy &=other.busy
+        return DayBitmap(self.day, self.cell_minutes, busy)
+
+    __or__=union
+    __and__=intersection
+
+    def free_runs(self, cells:int) -> int:
+        # bit i set when cells i .. i+cells-1 are all free, found by doubling the run length:
+        # log2(cells) shift-and steps instead of a walk over the day
+        runs=~self.busy & ((1 << self.width) - 1)
+        length=1
+        while length < cells and runs:
+            shift=min(length, cells - length)
+            runs &=runs >> shift
+            length +=shift
+        return runs
+
+    def first_free_run(self, cells:int, from_cell:int=0) -> Optional[int]:
+        runs=self.free_runs(cells) >> from_cell << from_cell
+        return (runs & -runs).bit_length() - 1 if runs else None
+
+    def is_free(self, start:datetime, end:datetime) -> bool:
+        probe=DayBitmap(self.day, self.cell_minutes)
+        probe.mark_busy(start, end)
+        return not probe.busy & self.busy
+
+    def covers(self, start:datetime, end:datetime, duration_minutes:int, step_minutes:int) -> bool:
+        # whether free_slots answers exactly like find_free_slots for this query
+        cell=timedelta(minutes=self.cell_minutes)
+        return (start.date()==self.day and end <=self.opening + cell * self.width
+                and (start - self.opening) % cell==timedelta(0) and step_minutes % self.cell_minutes==0)
+
+    def free_slots(self, start:datetime, end:datetime, now:datetime, duration_minutes:int=60,
+                step_minutes:int=60) -> List[Slot]:
+        # find_free_slots for a window inside this day's business hours (see covers)
+        if self.day.weekday() >=5:
+            return []
+        step_cells=step_minutes // self.cell_minutes
+        duration_cells=-(-duration_minutes // self.cell_minutes)
+        offset=int(self._cell(start))
+        # grid points before opening can't be bookable; start at the first one after it
+        first_cell=offset if offset >=0 else offset % step_cells
+        last_cell=int((self._cell(end) * self.cell_minutes - duration_minutes) // self.cell_minutes)
+        if last_cell < first_cell:
+            return []
+        earliest=now + timedelta(minutes=15)
+        # a slot has to start strictly after now + 15 minutes
+        after_now=max(int(self._cell(earliest) // 1) + 1, 0) if earliest >=self.opening else 0
+        candidates=(self.free_runs(duration_cells) & _grid(first_cell, step_cells, last_cell)
+                    & _bookable_cells(self.cell_minutes)) >> after_now << after_now
+        slots=[]
+        opening=self.opening
+        duration=timedelta(minutes=duration_minutes)
+        cell=timedelta(minutes=self.cell_minutes)
+        while candidates:
+            lowest=candidates & -candidates
+            slot_start=opening + cell * (lowest.bit_length() - 1)
+            slots.append(Slot(slot_start, slot_start + duration))
+            candidates ^=lowest
+        return slots
+
+def day_bitmaps(periods:Sequence[Tuple[datetime, datetime]], days:Iterable[date],
+                cell_minutes:int=DAY_BITMAP_CELL_MINUTES) -> Dict[date, DayBitmap]:
+    # one bitmap per day, with every period marked on each day it touches
+    bitmaps={day:DayBitmap(day, cell_minutes) for day in days}
+    for start, end in periods:
+        day=start.date()
+        while day <=end.date():
+            if day in bitmaps:
+                bitmaps[day].mark_busy(start, end)
+            day +=timedelta(days=1)
+    return bitmaps
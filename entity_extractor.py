@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+import re
+import threading
+import time as clock
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from metrics import metrics
+from timeutil import local_time
+
+DATE_CACHE_MAX_ENTRIES=getattr(Config, "DATE_CACHE_MAX_ENTRIES", 4096)
+
+# resolving a phrase takes microseconds, so the default latency buckets would put everything in the first
+DATE_RESOLVE_SECONDS=metrics.histogram(
+    "entity_date_resolve_seconds", "Time to resolve a date phrase the date cache didn't have",
+    buckets=(0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.001)
+)
+
+WEEKDAYS=["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS={
+    "jan":1, "feb":2, "mar":3, "apr":4, "may":5, "jun":6,
+    "jul":7, "aug":8, "sep":9, "oct":10, "nov":11, "dec":12
+}
+NUMBER_WORDS={
+    "a":1, "an":1, "one":1, "two":2, "three":3, "four":4, "five":5,
+    "six":6, "seven":7, "eight":8, "nine":9, "ten":10
+}
+
+_MONTH=(r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+        r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?")
+_WEEKDAY=r"(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+_COUNT=r"(?:\d+|a|an|one|two|three|four|five|six|seven|eight|nine|ten)"
+_CLOCK=r"\d{1,2}(?::\d{2})?"
+
+# every entity kind is one named alternative, so a message is tokenized by a single finditer pass.
+# all alternatives share one leading \b, so positions inside words are rejected with a single test.
+# order matters where alternatives overlap: ranges before single times, explicit dates before numbers
+TOKEN_PATTERN=re.compile(
+    rf"\b(?:(?P<email>[\w.+-]+@[\w-]+(?:\.[\w-]+)+)"
+    rf"|(?P<between>between)\b"
+    rf"|(?P<range>(?P<range_start>{_CLOCK})\s*(?P<range_start_ampm>am|pm)?\s*(?:-|–|to|and)\s*"
+    rf"(?P<range_end>{_CLOCK})\s*(?P<range_end_ampm>am|pm)?)\b"
+    rf"|(?P<relative_day>day after tomorrow|today|tonight|tomorrow)\b"
+    rf"|(?:(?P<week_modifier>next|this|coming)\s+)?(?P<weekday>{_WEEKDAY})\b"
+    rf"|(?P<week>(?:next|this|coming)\s+week)\b"
+    rf"|(?P<month_span>(?:next|this|coming)\s+month)\b"
+    rf"|in\s+(?P<offset_count>{_COUNT})\s+(?P<offset_unit>days?|weeks?)\b"
+    rf"|(?P<day_month>(?P<dm_day>\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<dm_month>{_MONTH}))(?![a-z])"
+    rf"|(?P<month_day>(?P<md_month>{_MONTH})\s+(?P<md_day>\d{{1,2}})(?:st|nd|rd|th)?)\b"
+    rf"|(?P<numeric_date>(?P<nd_first>\d{{1,2}})[/.](?P<nd_second>\d{{1,2}})(?:[/.](?P<nd_year>\d{{2,4}}))?)\b"
+    rf"|(?P<duration>(?P<duration_count>\d+(?:\.\d+)?|{_COUNT}|half an?)\s*-?\s*"
+    rf"(?P<duration_unit>minutes?|mins?|hours?|hrs?|h))\b"
+    rf"|(?P<clock>(?P<clock_time>{_CLOCK})\s*(?P<clock_ampm>am|pm))\b"
+    rf"|(?P<noon>noon|midday)\b"
+    rf"|(?P<period>morning|afternoon|evening)\b)"
+)
+
+_MEETING_NOUN=r"(?:meetings|calls|check-?ins|sessions|1:1s|one-on-ones|syncs|interviews|standups)"
+_LENGTH_UNIT=r"(?:minutes?|mins?|hours?|hrs?|h)"
+
+# phrases that turn one booking into several. they are blanked out before the normal entity pass,
+# so "2 hours apart" can't be read as the meeting length or "next 8 weeks" as a date
+SERIES_PATTERN=re.compile(
+    rf"\b(?:(?:an?\s+)?(?P<count>couple\s+of|\d+|one|two|three|four|five|six|seven|eight|nine|ten)\s+(?:(?:[\w.-]+\s+){{0,2}}?){_MEETING_NOUN}"
+    rf"|(?P<recurrence>weekly|daily|every\s+(?:week|weekday|day)|each\s+(?:week|weekday|day))"
+    rf"|(?:every|each)\s+(?P<every_weekday>{_WEEKDAY})"
+    rf"|for\s+(?:the\s+)?(?:next\s+|coming\s+)?(?P<span_count>{_COUNT})\s+(?P<span_unit>weeks?|days?)"
+    rf"|(?P<no_back_to_back>not|no|never)\s+back\s*-?\s*to\s*-?\s*back"
+    rf"|(?:at\s+least\s+)?(?P<gap_count>\d+|{_COUNT}|half an?)\s*-?\s*(?P<gap_unit>{_LENGTH_UNIT})\s+apart"
+    rf"|(?P<one_per_day>(?:on\s+)?(?:different|separate)\s+days|one\s+(?:a|per)\s+day)"
+    rf"|(?:at\s+most|no\s+more\s+than|max(?:imum)?(?:\s+of)?)\s+(?P<per_day_count>{_COUNT})\s+(?:a|per|each)\s+day"
+    rf")\b"
+)
+
+RECURRENCE_WORD=re.compile(r"\b(?:weekly|daily)\b")
+
+@dataclass
+class MeetingSeries:
+    count:Optional[int]=None
+    recurrence:Optional[str]=None
+    span_days:Optional[int]=None
+    min_gap_minutes:int=0
+    max_per_day:Optional[int]=None
+    # the message with the series phrases blanked, for the normal entity pass
+    remainder:str=""
+
+@dataclass
+class ExtractedEntities:
+    date:Optional[date]=None
+    date_phrase:Optional[str]=None
+    date_range:Optional[Tuple[date, date]]=None
+    time_period:Optional[str]=None
+    start_time:Optional[time]=None
+    end_time:Optional[time]=None
+    duration_minutes:Optional[int]=None
+    attendees:List[str]=field(default_factory=list)
+    confidence:float=0.0
+
+    @property
+    def time_window(self) -> Optional[Tuple[time, time]]:
+        if self.start_time is None:
+            return None
+        return (self.start_time, self.end_time)
+
+def _to_24h(hour:int, ampm:Optional[str]) -> int:
+    if ampm=="pm" and hour < 12:
+        return hour + 12
+    if ampm=="am" and hour==12:
+        return 0
+    return hour
+
+def _parse_clock(value:str) -> Tuple[int, int]:
+    hour, _, minute=value.partition(":")
+    return int(hour), int(minute or 0)
+
+def _count(value:str) -> float:
+    if value.startswith("half"):
+        return 0.5
+    return NUMBER_WORDS[value] if value in NUMBER_WORDS else float(value)
+
+def _make_time(hour:int, minute:int) -> Optional[time]:
+    if 0 <=hour < 24 and 0 <=minute < 60:
+        return time(hour, minute)
+    return None
+
+def _make_date(year:int, month:int, day:int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+class DateCache:
+    # resolved date phrases keyed by (kind, phrase, today): "friday", "next monday" or "12/20" only
+    # resolve differently once the date changes. at midnight in Config.TIMEZONE the days that are over
+    # are dropped; the day before is kept for users west of the calendar who are still on it
+    def __init__(self, max_entries:int=DATE_CACHE_MAX_ENTRIES):
+        self.max_entries=max_entries
+        self.hits=0
+        self.misses=0
+        self._entries=OrderedDict()
+        self._lock=threading.Lock()
+        self._expires_at=0.0
+
+    def get(self, key:tuple) -> Optional[tuple]:
+        with self._lock:
+            if clock.monotonic() >=self._expires_at:
+                self._expire()
+            value=self._entries.get(key)
+            if value is None:
+                self.misses +=1
+                return None
+            self._entries.move_to_end(key)
+            self.hits +=1
+            return value
+
+    def put(self, key:tuple, value:tuple):
+        with self._lock:
+            self._entries[key]=value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _expire(self):
+        now=local_time().now()
+        oldest=now.date() - timedelta(days=1)
+        for key in [key for key in self._entries if key[2] < oldest]:
+            del self._entries[key]
+        midnight=datetime.combine(now.date() + timedelta(days=1), time())
+        self._expires_at=clock.monotonic() + (midnight - now).total_seconds()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups=self.hits + self.misses
+            return {
+                "hits":self.hits,
+                "misses":self.misses,
+                "hit_rate":self.hits / lookups if lookups else 0.0,
+                "entries":len(self._entries)
+            }
+
+class EntityExtractor:
+    def __init__(self, date_cache:Optional[DateCache]=None):
+        self.date_cache=date_cache or DateCache()
+
+    def extract(self, text:str, today:date) -> ExtractedEntities:
+        result=ExtractedEntities()
+        scores=[]
+        after_between=False
+        bare_range=None
+        for match in TOKEN_PATTERN.finditer(text.lower()):
+            # nested groups close before their parent, so lastgroup names the whole alternative
+            kind="offset" if match.lastgroup=="offset_unit" else match.lastgroup
+            if kind=="email":
+                result.attendees.append(match.group("email"))
+                continue
+            if kind=="between":
+                after_between=True
+                continue
+            if kind=="range":
+                if not self._is_bare_range(match, after_between):
+                    if result.start_time is None:
+                        scores.append(self._apply_range(result, match))
+                elif bare_range is None and "-" in match.group("range"):
+                    # "12-20" could be a date or "9-10" an hour range; decide once the whole message is seen
+                    bare_range=match
+            elif kind in ("relative_day", "weekday", "week", "month_span", "offset", "day_month", "month_day",
+                        "numeric_date"):
+                if result.date is None:
+                    scores.append(self._apply_date(result, kind, match, today))
+            elif kind=="duration":
+                if result.duration_minutes is None:
+                    minutes=_count(match.group("duration_count")) * (
+                        1 if match.group("duration_unit").startswith("m") else 60
+                    )
+                    result.duration_minutes=int(round(minutes))
+                    scores.append(1.0)
+            elif kind=="clock":
+                if result.start_time is None:
+                    hour, minute=_parse_clock(match.group("clock_time"))
+                    result.start_time=_make_time(_to_24h(hour, match.group("clock_ampm")), minute)
+                    scores.append(1.0 if result.start_time else 0.0)
+            elif kind=="noon":
+                if result.start_time is None:
+                    result.start_time=time(12, 0)
+                    scores.append(1.0)
+            elif kind=="period":
+                if result.time_period is None:
+                    result.time_period=match.group("period")
+                    scores.append(1.0)
+            after_between=False
+        if bare_range is not None:
+            if result.date is None:
+                first, second=bare_range.group("range_start"), bare_range.group("range_end")
+                scores.append(self._apply_numeric_date(result, f"{first}-{second}", int(first), int(second), None, today))
+            elif result.start_time is None:
+                scores.append(self._apply_range(result, bare_range))
+        result.confidence=round(sum(scores) / len(scores), 2) if scores else 0.0
+        return result
+
+    def extract_series(self, text:str, default_gap_minutes:int=30) -> MeetingSeries:
+        series=MeetingSeries()
+        lowered=text.lower()
+        kept=[]
+        last_end=0
+        for match in SERIES_PATTERN.finditer(lowered):
+            kept.append(lowered[last_end:match.start()])
+            last_end=match.end()
+            if match.group("count") is not None:
+                if series.count is None:
+                    series.count=2 if match.group("count").startswith("couple") else int(_count(match.group("count")))
+                # the meeting length inside "three 30-minute check-ins" stays for the entity pass
+                kept.append(lowered[match.end("count"):match.end()])
+                recurrence=RECURRENCE_WORD.search(match.group(0))
+                if recurrence and series.recurrence is None:
+                    series.recurrence=self._recurrence(recurrence.group(0))
+            elif match.group("recurrence") is not None:
+                series.recurrence=self._recurrence(match.group("recurrence"))
+            elif match.group("every_weekday") is not None:
+                # "every monday" is weekly, on the monday the entity pass still gets to see
+                series.recurrence="weekly"
+                kept.append(match.group("every_weekday"))
+            elif match.group("span_count") is not None:
+                series.span_days=int(_count(match.group("span_count"))) * (
+                    7 if match.group("span_unit").startswith("week") else 1
+                )
+            elif match.group("no_back_to_back") is not None:
+                series.min_gap_minutes=max(series.min_gap_minutes, default_gap_minutes)
+            elif match.group("gap_count") is not None:
+                minutes=_count(match.group("gap_count")) * (1 if match.group("gap_unit").startswith("m") else 60)
+                series.min_gap_minutes=max(series.min_gap_minutes, int(round(minutes)))
+            elif match.group("one_per_day") is not None:
+                series.max_per_day=1
+            else:
+                series.max_per_day=int(_count(match.group("per_day_count")))
+        kept.append(lowered[last_end:])
+        series.remainder=" ".join("".join(kept).split())
+        return series
+
+    @staticmethod
+    def _recurrence(phrase:str) -> str:
+        return "weekly" if phrase.endswith(("week", "weekly")) else "daily"
+
+    @staticmethod
+    def _is_bare_range(match:re.Match, after_between:bool) -> bool:
+        return not (after_between or match.group("range_start_ampm") or match.group("range_end_ampm")
+                    or ":" in match.group("range"))
+
+    def _apply_range(self, result:ExtractedEntities, match:re.Match) -> float:
+        start_ampm, end_ampm=match.group("range_start_ampm"), match.group("range_end_ampm")
+        start_hour, start_minute=_parse_clock(match.group("range_start"))
+        end_hour, end_minute=_parse_clock(match.group("range_end"))
+        score=1.0
+        if end_ampm is None and start_ampm is None:
+            # "between 3-5": business-hours reading, afternoon for small hours
+            end_ampm="pm" if end_hour < 8 or end_hour==12 else "am"
+            score=0.7
+        end_hour=_to_24h(end_hour, end_ampm)
+        if start_ampm is None:
+            start_hour_24=_to_24h(start_hour, end_ampm)
+            if start_hour_24 > end_hour or (start_hour_24==end_hour and start_minute >=end_minute):
+                start_hour_24=_to_24h(start_hour, "am" if end_ampm=="pm" else "pm")
+        else:
+            start_hour_24=_to_24h(start_hour, start_ampm)
+        result.start_time=_make_time(start_hour_24, start_minute)
+        result.end_time=_make_time(end_hour, end_minute)
+        if result.start_time is None or result.end_time is None or result.end_time <=result.start_time:
+            result.start_time=result.end_time=None
+            return 0.0
+        return score
+
+    def _apply_date(self, result:ExtractedEntities, kind:str, match:re.Match, today:date) -> float:
+        key=(kind, " ".join(match.group(0).split()), today)
+        resolved=self.date_cache.get(key)
+        if resolved is None:
+            # only misses are timed; hits are counted by the cache itself
+            started=clock.perf_counter()
+            scratch=ExtractedEntities()
+            score=self._resolve_date(scratch, kind, match, today)
+            resolved=(scratch.date, scratch.date_range, scratch.date_phrase, score)
+            DATE_RESOLVE_SECONDS.observe(clock.perf_counter() - started)
+            self.date_cache.put(key, resolved)
+        result.date, result.date_range, result.date_phrase, _=resolved
+        return resolved[3]
+
+    def _resolve_date(self, result:ExtractedEntities, kind:str, match:re.Match, today:date) -> float:
+        phrase=" ".join(match.group(0).split())
+        result.date_phrase=phrase
+        if kind=="relative_day":
+            offsets={"today":0, "tonight":0, "tomorrow":1, "day after tomorrow":2}
+            result.date=today + timedelta(days=offsets[match.group("relative_day")])
+            return 1.0
+        if kind=="weekday":
+            next_week=match.group("week_modifier")=="next"
+            days_ahead=(WEEKDAYS.index(match.group("weekday")) - today.weekday()) % 7
+            if days_ahead==0:
+                days_ahead=7 if next_week else 0
+            elif next_week:
+                days_ahead +=7
+            result.date=today + timedelta(days=days_ahead)
+            return 1.0
+        if kind=="week":
+            monday=today - timedelta(days=today.weekday())
+            if not match.group("week").startswith("this"):
+                monday +=timedelta(days=7)
+            first_day=max(monday, today)
+            result.date=first_day
+            result.date_range=(first_day, monday + timedelta(days=4))
+            return 1.0
+        if kind=="month_span":
+            first_of_month=today.replace(day=1)
+            if not match.group("month_span").startswith("this"):
+                first_of_month=(first_of_month + timedelta(days=31)).replace(day=1)
+            last_of_month=(first_of_month + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+            first_day=max(first_of_month, today)
+            result.date=first_day
+            result.date_range=(first_day, last_of_month)
+            return 1.0
+        if kind=="offset":
+            days=int(_count(match.group("offset_count"))) * (7 if match.group("offset_unit").startswith("week") else 1)
+            result.date=today + timedelta(days=days)
+            return 1.0
+        if kind=="day_month":
+            return self._apply_month_date(result, match.group("dm_month"), match.group("dm_day"), today)
+        if kind=="month_day":
+            return self._apply_month_date(result, match.group("md_month"), match.group("md_day"), today)
+        first, second=int(match.group("nd_first")), int(match.group("nd_second"))
+        return self._apply_numeric_date(result, phrase, first, second, match.group("nd_year"), today)
+
+    @staticmethod
+    def _apply_month_date(result:ExtractedEntities, month_name:str, day:str, today:date) -> float:
+        result.date=_make_date(today.year, MONTHS[month_name[:3]], int(day))
+        if result.date is None:
+            result.date_phrase=None
+            return 0.0
+        return 1.0
+
+    @staticmethod
+    def _apply_numeric_date(result:ExtractedEntities, phrase:str, first:int, second:int,
+                            year:Optional[str], today:date) -> float:
+        # month/day like dateutil's default, falling back to day/month when the first part can't be a month
+        full_year=today.year if year is None else (2000 + int(year) if len(year)==2 else int(year))
+        parsed=_make_date(full_year, first, second)
+        score=0.7 if first <=12 and second <=12 and first !=second else 1.0
+        if parsed is None:
+            parsed=_make_date(full_year, second, first)
+            score=1.0
+        if parsed is None:
+            return 0.0
+        result.date=parsed
+        result.date_phrase=phrase
+        return score
+
+entity_extractor=EntityExtractor()
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, Optional
+
+from config import Config
+
+FREEBUSY_CACHE_TTL_SECONDS=getattr(Config, "FREEBUSY_CACHE_TTL_SECONDS", 60)
+FREEBUSY_CACHE_MAX_ENTRIES=getattr(Config, "FREEBUSY_CACHE_MAX_ENTRIES", 2048)
+
+class FreeBusyCache:
+    def __init__(self, ttl_seconds:float=FREEBUSY_CACHE_TTL_SECONDS,
+                max_entries:int=FREEBUSY_CACHE_MAX_ENTRIES):
+        self.ttl_seconds=ttl_seconds
+        self.max_entries=max_entries
+        self.hits=0
+        self.misses=0
+        self._entries=OrderedDict()
+        self._lock=threading.Lock()
+
+    def get(self, calendar_id:str, day:date) -> Optional[List[Dict]]:
+        key=(calendar_id, day)
+        with self._lock:
+            entry=self._entries.get(key)
+            if entry is None or entry[0] <=time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses +=1
+                return None
+            self._entries.move_to_end(key)
+            self.hits +=1
+            return list(entry[1])
+
+    def put(self, calendar_id:str, day:date, busy:List[Dict]):
+        key=(calendar_id, day)
+        with self._lock:
+            self._entries[key]=(time.monotonic() + self.ttl_seconds, list(busy))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add_busy(self, calendar_id:str, day:date, interval:Dict):
+        # write-through patch for events we just created, so the next lookup can't offer the slot again
+        key=(calendar_id, day)
+        with self._lock:
+            entry=self._entries.get(key)
+            if entry is not None:
+                entry[1].append(interval)
+
+    def invalidate(self, calendar_id:str, day:Optional[date]=None):
+        with self._lock:
+            if day is not None:
+                self._entries.pop((calendar_id, day), None)
+                return
+            for key in [key for key in self._entries if key[0]==calendar_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups=self.hits + self.misses
+            return {
+                "hits":self.hits,
+                "misses":self.misses,
+                "hit_rate":self.hits / lookups if lookups else 0.0,
+                "entries":len(self._entries)
+            }
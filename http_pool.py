@@ -0,0 +1,75 @@
+import contextlib
+import queue
+import threading
+from typing import Callable, Dict
+
+from config import Config
+
+CALENDAR_HTTP_POOL_SIZE=getattr(Config, "CALENDAR_HTTP_POOL_SIZE", 8)
+CALENDAR_HTTP_TIMEOUT_SECONDS=getattr(Config, "CALENDAR_HTTP_TIMEOUT_SECONDS", 30)
+CALENDAR_HTTP_ACQUIRE_TIMEOUT_SECONDS=getattr(Config, "CALENDAR_HTTP_ACQUIRE_TIMEOUT_SECONDS", 10)
+
+class HttpPoolExhausted(Exception):
+    pass
+
+class HttpPool:
+    # httplib2.Http objects are not thread-safe but keep their connections alive, so each thread
+    # checks one out for the duration of a request. all of them talk to the same API host, so the
+    # pool size is the per-host connection limit
+    def __init__(self, factory:Callable, size:int=CALENDAR_HTTP_POOL_SIZE,
+                acquire_timeout:float=CALENDAR_HTTP_ACQUIRE_TIMEOUT_SECONDS):
+        self.factory=factory
+        self.size=size
+        self.acquire_timeout=acquire_timeout
+        self.created=0
+        self.checkouts=0
+        self.waits=0
+        # most recently used first, so the warmest keep-alive connections are reused
+        self._idle=queue.LifoQueue()
+        self._lock=threading.Lock()
+
+    @contextlib.contextmanager
+    def connection(self):
+        http=self._acquire()
+        try:
+            yield http
+        finally:
+            self._idle.put(http)
+
+    def _acquire(self):
+        with self._lock:
+            self.checkouts +=1
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create=self.created < self.size
+            if create:
+                self.created +=1
+            else:
+                self.waits +=1
+        if create:
+            try:
+                return self.factory()
+            except Exception:
+                # the slot was never filled: give it back, or every failed build shrinks the pool for good
+                with self._lock:
+                    self.created -=1
+                raise
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise HttpPoolExhausted(
+                f"no calendar connection free after {self.acquire_timeout}s ({self.size} in use)"
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size":self.size,
+                "created":self.created,
+                "idle":self._idle.qsize(),
+                "checkouts":self.checkouts,
+                "waits":self.waits
+            }
@@ -0,0 +1,81 @@
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+from config import Config
+
+INTENT_RULES_PATH=getattr(
+    Config, "INTENT_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_rules.json")
+)
+GENERAL_INTENT="general"
+
+class IntentClassifier:
+    def __init__(self, rules_path:str=INTENT_RULES_PATH):
+        with open(rules_path, encoding="utf-8") as rules_file:
+            self.rules=json.load(rules_file)["intents"]
+        self.compiled_rules=[]
+        # rules with "refines" stay out of the combined matcher, where every rule costs a scan of every
+        # message; they are searched only once one of the intents they refine has matched, and only when
+        # one of their "keywords" (plain substrings, a much cheaper scan) is in the message
+        self.refinements={}
+        parts=[]
+        for index, rule in enumerate(self.rules):
+            if rule.get("refines"):
+                pattern=re.compile("|".join(f"(?:{pattern})" for pattern in rule["patterns"]))
+                keywords=re.compile("|".join(re.escape(word) for word in rule.get("keywords", ()))) if rule.get("keywords") else None
+                for base in rule["refines"]:
+                    self.refinements.setdefault(base, []).append((rule["name"], keywords, pattern))
+                continue
+            group=f"_intent{index}"
+            entity_names=tuple(
+                name for pattern in rule["patterns"] for name in re.compile(pattern).groupindex
+            )
+            self.compiled_rules.append((group, rule["name"], tuple(rule.get("context", ())), entity_names))
+            # one optional lookahead per intent: every intent is tested from position 0 in a
+            # single match() call, so an early match for one intent can't hide a later one.
+            # rule patterns are written in lowercase and matched against the lowercased message,
+            # which is much faster than re.IGNORECASE
+            alternatives="|".join(f"(?:{pattern})" for pattern in rule["patterns"])
+            parts.append(f"(?:(?=(?s:.*?)(?P<{group}>{alternatives})))?")
+        self.matcher=re.compile("".join(parts))
+
+    def classify(self, message:str, history:Optional[List[Dict]]=None) -> Dict:
+        text=message.lower()
+        result=self._classify(text, history)
+        for name, keywords, pattern in self.refinements.get(result["intent"], ()):
+            if keywords is not None and not keywords.search(text):
+                continue
+            match=pattern.search(text)
+            if match:
+                return {"intent":name, "entities":{
+                    entity:value for entity, value in match.groupdict().items() if value is not None
+                }}
+        return result
+
+    def _classify(self, text:str, history:Optional[List[Dict]]) -> Dict:
+        groups=self.matcher.match(text).groupdict()
+        last_bot_message=None
+        for group, name, context, entity_names in self.compiled_rules:
+            if groups[group] is None:
+                continue
+            if context:
+                if last_bot_message is None:
+                    last_bot_message=self._last_bot_message(history or [])
+                if not any(phrase in last_bot_message for phrase in context):
+                    continue
+            entities={
+                entity:groups[entity] for entity in entity_names if groups[entity] is not None
+            }
+            return {"intent":name, "entities":entities}
+        return {"intent":GENERAL_INTENT, "entities":{}}
+
+    @staticmethod
+    def _last_bot_message(history:List[Dict]) -> str:
+        for msg in reversed(history[-3:]):
+            if msg.get("role")=="assistant":
+                return msg.get("content", "").lower()
+        return ""
+
+intent_classifier=IntentClassifier()
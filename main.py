@@ -1,14 +1,34 @@
-from fastapi import FastAPI, HTTPException
+import time
+_import_started=time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from datetime import datetime
 from typing import List, Dict, Optional
+import asyncio
+import json
+import logging
+import uuid
 import uvicorn
 
 from booking_agent import BookingAgent
+from bulk_booking import BULK_BOOKING_MAX_ITEMS, BulkBooker
+from calendar_mirror import CALENDAR_MIRROR_WEBHOOK_TOKEN
 from config import Config
+from entity_extractor import entity_extractor
+from metrics import metrics
+from profiling import ProfilingMiddleware
+from rate_limit import RateLimitExceeded, retry_after_seconds
+from timeutil import known_zone
 
 Config.validate()
 
+LOG_LEVEL=getattr(Config, "LOG_LEVEL", "INFO")
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger=logging.getLogger(__name__)
+
 app=FastAPI(title="AI Booking Agent", version="1.0.0")
 
 app.add_middleware(
@@ -18,9 +38,89 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# opt-in per request with the X-Profile header, or for a share of requests with PROFILE_SAMPLE_RATE
+app.add_middleware(ProfilingMiddleware)
 
 booking_agent=BookingAgent()
 
+CALENDAR_WARM_ON_STARTUP=getattr(Config, "CALENDAR_WARM_ON_STARTUP", True)
+
+CHAT_SECONDS=metrics.histogram(
+    "booking_chat_request_seconds", "Chat request latency by endpoint and detected intent",
+    labels=("endpoint", "intent")
+)
+
+def _cache_lookups():
+    cache=booking_agent.calendar_service.calendar_service.freebusy_cache.stats()
+    index=booking_agent.availability_index
+    dates=entity_extractor.date_cache
+    return {
+        ("freebusy_cache", "hit"):cache["hits"], ("freebusy_cache", "miss"):cache["misses"],
+        ("availability_index", "hit"):index.hits, ("availability_index", "miss"):index.misses,
+        ("date_resolution", "hit"):dates.hits, ("date_resolution", "miss"):dates.misses
+    }
+
+# read from the live objects at scrape time; booking_agent is looked up then too, so a swapped agent is picked up
+metrics.callback(
+    "booking_cache_lookups_total", "Free/busy cache, availability index and date resolution lookups", _cache_lookups,
+    labels=("cache", "result"), kind="counter"
+)
+metrics.callback(
+    "booking_cache_hit_ratio", "Share of lookups answered from cache",
+    lambda:{(name,):stats["hit_rate"] for name, stats in (
+        ("freebusy_cache", booking_agent.calendar_service.calendar_service.freebusy_cache.stats()),
+        ("availability_index", booking_agent.availability_index.stats()),
+        ("date_resolution", entity_extractor.date_cache.stats())
+    )},
+    labels=("cache",)
+)
+metrics.callback(
+    "booking_active_sessions", "Sessions held by the session store", lambda:len(booking_agent.session_store)
+)
+metrics.callback(
+    "calendar_freebusy_queries_total", "Free/busy queries sent to the Calendar API",
+    lambda:booking_agent.calendar_service.calendar_service.freebusy_queries, kind="counter"
+)
+
+# the calendar client is built lazily, so booting only costs imports; /health reports the timings
+startup_report={
+    "import_ms":round((time.perf_counter() - _import_started) * 1000, 1),
+    "startup_ms":None,
+    "calendar_warm_ms":None,
+    "calendar_error":None
+}
+background_tasks=[]
+
+async def warm_calendar():
+    started=time.perf_counter()
+    try:
+        await booking_agent.calendar_service.warm_up()
+        startup_report["calendar_warm_ms"]=round((time.perf_counter() - started) * 1000, 1)
+        logger.info("calendar client ready in %s ms", startup_report['calendar_warm_ms'])
+    except Exception as e:
+        startup_report["calendar_error"]=str(e)
+        logger.warning("calendar warm-up failed: %s", e)
+        return
+    await booking_agent.calendar_service.keep_credentials_fresh()
+
+@app.on_event("startup")
+async def startup_event():
+    if CALENDAR_WARM_ON_STARTUP:
+        background_tasks.append(asyncio.create_task(warm_calendar()))
+    background_tasks.append(asyncio.create_task(booking_agent.booking_writer.replay_pending()))
+    booking_agent.availability_index.start()
+    booking_agent.mirror_poller.start()
+    startup_report["startup_ms"]=round((time.perf_counter() - _import_started) * 1000, 1)
+    logger.info("serving after %s ms (imports %s ms)", startup_report['startup_ms'], startup_report['import_ms'])
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    await booking_agent.availability_index.stop()
+    await booking_agent.mirror_poller.stop()
+    booking_agent.calendar_service.shutdown()
+
 class ChatMessage(BaseModel):
     role:str
     content:str
@@ -28,11 +128,34 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message:str
     conversation_history:Optional[List[ChatMessage]]=[]
+    session_id:Optional[str]=None
+    # delta mode: the server keeps the transcript and the client sends how many messages it already has
+    cursor:Optional[int]=None
+    # IANA zone name such as "America/New_York"; remembered for the session once sent
+    timezone:Optional[str]=None
 
 class ChatResponse(BaseModel):
     response:str
     conversation_history:List[ChatMessage]
     booking_confirmed:bool=False
+    session_id:str
+    cursor:Optional[int]=None
+    # set when the calendar is rate limited: seconds until the client should try again
+    retry_after:Optional[int]=None
+
+class BulkBookingItem(BaseModel):
+    title:str="Meeting"
+    duration_minutes:int=60
+    # the meeting must start and end inside this window; naive times are in Config.TIMEZONE
+    window_start:datetime
+    window_end:datetime
+    attendees:List[str]=[]
+    description:str=""
+    # idempotency key: resubmitting an item with the same key and window returns the booking already made
+    key:Optional[str]=None
+
+class BulkBookingRequest(BaseModel):
+    bookings:List[BulkBookingItem]
 
 @app.get("/")
 async def root():
@@ -40,43 +163,194 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status":"healthy", "message":"Booking agent is operational"}
+    calendar_service=booking_agent.calendar_service.calendar_service
+    http_pool=getattr(calendar_service.backend, "pool", None)
+    return {
+        "status":"healthy",
+        "message":"Booking agent is operational",
+        "freebusy_cache":{
+            **calendar_service.freebusy_cache.stats(),
+            "api_queries":calendar_service.freebusy_queries,
+            "coalesced":calendar_service.freebusy_inflight.stats()["shared"]
+        },
+        "rate_limit":calendar_service.rate_limiter.stats(),
+        "availability_index":booking_agent.availability_index.stats(),
+        "date_cache":entity_extractor.date_cache.stats(),
+        "startup":{**startup_report, "calendar_ready":calendar_service.backend.ready},
+        "http_pool":http_pool.stats() if http_pool else None,
+        "bookings":await booking_agent.booking_writer.stats(),
+        "calendar_mirror":{
+            **calendar_service.mirror.stats(),
+            "notifications":booking_agent.mirror_poller.notifications
+        } if calendar_service.mirror else None
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/calendar/notifications")
+async def calendar_notifications(request:Request):
+    # receiver for Calendar push notifications (events.watch). the message carries no event data,
+    # only a nudge, so it wakes the mirror poller to pull the changes with its sync token
+    if CALENDAR_MIRROR_WEBHOOK_TOKEN and request.headers.get("X-Goog-Channel-Token") !=CALENDAR_MIRROR_WEBHOOK_TOKEN:
+        raise HTTPException(status_code=403, detail="unknown notification channel")
+    # "sync" is the handshake sent when a channel is created, there is nothing to fetch yet
+    if request.headers.get("X-Goog-Resource-State") !="sync":
+        booking_agent.mirror_poller.notify()
+    return {"status":"ok"}
+
+@app.post("/bookings/bulk")
+async def bulk_bookings_endpoint(request:BulkBookingRequest):
+    if len(request.bookings) > BULK_BOOKING_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"at most {BULK_BOOKING_MAX_ITEMS} bookings per request")
+    keys=[item.key for item in request.bookings if item.key]
+    if len(keys) !=len(set(keys)):
+        raise HTTPException(status_code=400, detail="booking keys must be unique")
+    for index, item in enumerate(request.bookings):
+        if item.duration_minutes <=0 or item.window_end <=item.window_start:
+            raise HTTPException(status_code=400, detail=f"booking {index}: needs a positive duration and a non-empty window")
+    bulk_booker=BulkBooker(
+        booking_agent.calendar_service, booking_agent.booking_writer, booking_agent.availability_index
+    )
+
+    async def results():
+        # one JSON line per booking as it settles: unschedulable ones first, then each insert batch
+        try:
+            async for result in bulk_booker.run([item.model_dump() for item in request.bookings]):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            # the status line is long gone; the last line tells the client the rest never settled
+            logger.error("bulk booking stopped: %s", e)
+            yield json.dumps({"status":"aborted", "error":str(e)}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def _history_for(request:ChatRequest) -> Optional[List[Dict]]:
+    # delta mode: no client history, the agent uses the session transcript
+    if request.cursor is not None:
+        return None
+    return [
+        {"role":msg.role, "content":msg.content}
+        for msg in request.conversation_history
+    ]
+
+def _build_chat_response(request:ChatRequest, session_id:str, result:Dict) -> ChatResponse:
+    messages=result["state"]["messages"]
+    if request.cursor is not None:
+        transcript_offset=result["cursor"] - len(messages)
+        messages=messages[max(request.cursor - transcript_offset, 0):]
+    updated_history=[
+        ChatMessage(role=msg["role"], content=msg["content"])
+        for msg in messages
+    ]
+    
+    return ChatResponse(
+        response=result["response"],
+        conversation_history=updated_history,
+        booking_confirmed=result.get("booking_confirmed", False),
+        session_id=session_id,
+        cursor=result.get("cursor")
+    )
+
+def _error_chat_response(request:ChatRequest, session_id:str, error:Optional[Exception]=None) -> ChatResponse:
+    error_response="i had trouble processing your request.try again?"
+    retry_after=None
+    if isinstance(error, RateLimitExceeded):
+        # back-pressure from the calendar rate limiter: answer now rather than queue until a timeout
+        retry_after=retry_after_seconds(error)
+        error_response=f"I'm handling a lot of requests right now. Please try again in {retry_after} seconds."
+    
+    preserved_history=[] if request.cursor is not None else list(request.conversation_history)
+    preserved_history.append(ChatMessage(role="user", content=request.message))
+    preserved_history.append(ChatMessage(role="assistant", content=error_response))
+    
+    return ChatResponse(
+        response=error_response,
+        conversation_history=preserved_history,
+        booking_confirmed=False,
+        session_id=session_id,
+        cursor=request.cursor,
+        retry_after=retry_after
+    )
+
+def _check_timezone(request:ChatRequest):
+    if request.timezone and not known_zone(request.timezone):
+        raise HTTPException(status_code=400, detail=f"unknown timezone {request.timezone!r}")
+
+def _sse_event(event:str, data:Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request:ChatRequest):
+    _check_timezone(request)
+    session_id=request.session_id or uuid.uuid4().hex
+    started=time.perf_counter()
+    intent="error"
     try:
-        conversation_history=[
-            {"role":msg.role, "content":msg.content}
-            for msg in request.conversation_history
-        ]
-        result=booking_agent.process_message(
+        result=await booking_agent.process_message(
             message=request.message,
-            conversation_history=conversation_history
-        )
-        
-        updated_history=[
-            ChatMessage(role=msg["role"], content=msg["content"])
-            for msg in result["state"]["messages"]
-        ]
-        
-        return ChatResponse(
-            response=result["response"],
-            conversation_history=updated_history,
-            booking_confirmed=result.get("booking_confirmed", False)
+            conversation_history=_history_for(request),
+            session_id=session_id,
+            timezone=request.timezone
         )
+        intent=result.get("intent", "unknown")
+        return _build_chat_response(request, session_id, result)
     
     except Exception as e:
-        error_response="i had trouble processing your request.try again?"
-        
-        preserved_history=list(request.conversation_history)
-        preserved_history.append(ChatMessage(role="user", content=request.message))
-        preserved_history.append(ChatMessage(role="assistant", content=error_response))
-        
-        return ChatResponse(
-            response=error_response,
-            conversation_history=preserved_history,
-            booking_confirmed=False
-        )
+        return _error_chat_response(request, session_id, e)
+    finally:
+        CHAT_SECONDS.observe(time.perf_counter() - started, "chat", intent)
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request:ChatRequest):
+    _check_timezone(request)
+    session_id=request.session_id or uuid.uuid4().hex
+    sections=asyncio.Queue()
+
+    async def events():
+        started=time.perf_counter()
+        intent="error"
+        # ack before any calendar work so the client can render immediately
+        yield _sse_event("ack", {"session_id":session_id})
+        task=asyncio.create_task(booking_agent.process_message(
+            message=request.message,
+            conversation_history=_history_for(request),
+            session_id=session_id,
+            on_section=sections.put_nowait,
+            timezone=request.timezone
+        ))
+        streamed=False
+        try:
+            while True:
+                getter=asyncio.create_task(sections.get())
+                done, _=await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                streamed=True
+                yield _sse_event("section", {"text":getter.result()})
+            # sections queued in the same step the handler returned
+            while not sections.empty():
+                streamed=True
+                yield _sse_event("section", {"text":sections.get_nowait()})
+            result=task.result()
+            if not streamed:
+                yield _sse_event("section", {"text":result["response"]})
+            intent=result.get("intent", "unknown")
+            response=_build_chat_response(request, session_id, result)
+        except Exception as e:
+            response=_error_chat_response(request, session_id, e)
+            if not streamed:
+                yield _sse_event("section", {"text":response.response})
+        CHAT_SECONDS.observe(time.perf_counter() - started, "stream", intent)
+        yield _sse_event("state", response.model_dump())
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control":"no-cache", "X-Accel-Buffering":"no"}
+    )
 
 if __name__=="__main__":
     uvicorn.run(
@@ -0,0 +1,164 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from config import Config
+
+METRICS_ENABLED=getattr(Config, "METRICS_ENABLED", True)
+
+# seconds, from a cache hit to a slow Calendar API round trip
+LATENCY_BUCKETS=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+
+def _format_labels(names:Sequence[str], values:Sequence[str], extra:str="") -> str:
+    pairs=[f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value:float) -> str:
+    if value==float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value !=int(value) else str(int(value))
+
+class Counter:
+    def __init__(self, name:str, help_text:str, labels:Sequence[str]=()):
+        self.name=name
+        self.help_text=help_text
+        self.labels=tuple(labels)
+        self._values={}
+        self._lock=threading.Lock()
+
+    def inc(self, *label_values, amount:float=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[label_values]=self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        lines=[f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values=sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name:str, help_text:str, labels:Sequence[str]=(), buckets:Sequence[float]=LATENCY_BUCKETS):
+        self.name=name
+        self.help_text=help_text
+        self.labels=tuple(labels)
+        self.buckets=tuple(sorted(buckets))
+        # per label set: [count in each bucket (non-cumulative, last one is +Inf), sum, count]
+        self._series={}
+        self._lock=threading.Lock()
+
+    def observe(self, value:float, *label_values):
+        if not METRICS_ENABLED:
+            return
+        index=bisect_left(self.buckets, value)
+        with self._lock:
+            series=self._series.get(label_values)
+            if series is None:
+                series=self._series[label_values]=[[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] +=1
+            series[1] +=value
+            series[2] +=1
+
+    @contextmanager
+    def time(self, *label_values) -> Iterator[None]:
+        started=time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def snapshot(self, *label_values) -> Optional[Tuple[List[int], float, int]]:
+        with self._lock:
+            series=self._series.get(label_values)
+            return (list(series[0]), series[1], series[2]) if series else None
+
+    def render(self) -> List[str]:
+        lines=[f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series=sorted((label_values, (list(counts), total, count)) for label_values, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in series:
+            cumulative=0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative +=bucket_count
+                le=f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            labels=_format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class CallbackMetric:
+    # a value read from elsewhere at scrape time, such as a cache's own hit counters or a store's size.
+    # func returns a number, or {label values tuple:number} when the metric has labels
+    def __init__(self, name:str, help_text:str, func:Callable, labels:Sequence[str]=(), kind:str="gauge"):
+        self.name=name
+        self.help_text=help_text
+        self.func=func
+        self.labels=tuple(labels)
+        self.kind=kind
+
+    def render(self) -> List[str]:
+        lines=[f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            values=self.func()
+        except Exception:
+            # a broken source shouldn't take the whole scrape down with it
+            return lines
+        if values is None:
+            return lines
+        if not isinstance(values, dict):
+            values={():values}
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics={}
+        self._lock=threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            # modules re-imported by a benchmark or a reloader keep the series they already have
+            existing=self._metrics.get(metric.name)
+            if existing is not None and type(existing) is type(metric) and not isinstance(metric, CallbackMetric):
+                return existing
+            self._metrics[metric.name]=metric
+            return metric
+
+    def counter(self, name:str, help_text:str, labels:Sequence[str]=()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name:str, help_text:str, labels:Sequence[str]=(),
+                buckets:Sequence[float]=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def callback(self, name:str, help_text:str, func:Callable, labels:Sequence[str]=(),
+                kind:str="gauge") -> CallbackMetric:
+        return self._register(CallbackMetric(name, help_text, func, labels, kind))
+
+    def render(self) -> str:
+        # Prometheus text exposition format, version 0.0.4
+        with self._lock:
+            metrics=[self._metrics[name] for name in sorted(self._metrics)]
+        lines=[]
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics=MetricsRegistry()
@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import contextvars
+import glob
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+
+PROFILE_SAMPLE_RATE=getattr(Config, "PROFILE_SAMPLE_RATE", 0.0)
+PROFILE_DIR=getattr(Config, "PROFILE_DIR", "profiles")
+PROFILE_HEADER=getattr(Config, "PROFILE_HEADER", "X-Profile")
+PROFILE_PATHS=getattr(Config, "PROFILE_PATHS", ("/chat", "/chat/stream"))
+
+logger=logging.getLogger(__name__)
+
+class _Frame:
+    def __init__(self, stack:Tuple[str, ...]):
+        self.stack=stack
+        self.children_seconds=0.0
+
+class Profile:
+    # wall-clock spans of one request. each finished span adds its self time (its own duration minus
+    # the spans nested in it) under its full stack, which is exactly what a folded flame graph wants
+    def __init__(self, name:str, profile_id:Optional[str]=None):
+        self.name=name
+        self.profile_id=profile_id or uuid.uuid4().hex[:12]
+        self.started=time.time()
+        self.self_seconds={}
+        self._lock=threading.Lock()
+
+    def add(self, stack:Tuple[str, ...], self_seconds:float):
+        with self._lock:
+            self.self_seconds[stack]=self.self_seconds.get(stack, 0.0) + max(self_seconds, 0.0)
+
+    def add_child(self, frame:Optional[_Frame], seconds:float):
+        if frame is not None:
+            with self._lock:
+                frame.children_seconds +=seconds
+
+    def folded(self) -> str:
+        # flamegraph.pl / speedscope "collapsed stack" lines, in microseconds
+        return "".join(
+            f"{';'.join(stack)} {round(seconds * 1e6)}\n"
+            for stack, seconds in sorted(self.self_seconds.items()) if seconds > 0
+        )
+
+_profile=contextvars.ContextVar("profile", default=None)
+_frame=contextvars.ContextVar("profile_frame", default=None)
+_NOT_PROFILED=nullcontext()
+
+def span(name:str):
+    # a no-op unless the current request is being profiled, so it can sit on hot paths
+    if _profile.get() is None:
+        return _NOT_PROFILED
+    return _span(name)
+
+@contextmanager
+def _span(name:str) -> Iterator[None]:
+    profile=_profile.get()
+    parent=_frame.get()
+    frame=_Frame((parent.stack if parent else (profile.name,)) + (name,))
+    token=_frame.set(frame)
+    started=time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed=time.perf_counter() - started
+        _frame.reset(token)
+        profile.add(frame.stack, elapsed - frame.children_seconds)
+        profile.add_child(parent, elapsed)
+
+def record(name:str, seconds:float):
+    # a span measured elsewhere, such as time a job spent queued before a worker picked it up
+    profile=_profile.get()
+    if profile is None:
+        return
+    parent=_frame.get()
+    profile.add((parent.stack if parent else (profile.name,)) + (name,), seconds)
+    profile.add_child(parent, seconds)
+
+@contextmanager
+def profile_request(name:str) -> Iterator[Profile]:
+    profile=Profile(name)
+    profile_token=_profile.set(profile)
+    frame_token=_frame.set(None)
+    started=time.perf_counter()
+    try:
+        yield profile
+    finally:
+        # everything not inside a named span is the request's own time
+        elapsed=time.perf_counter() - started
+        with profile._lock:
+            nested=sum(seconds for stack, seconds in profile.self_seconds.items() if len(stack) > 1)
+        profile.add((name,), elapsed - nested)
+        _frame.reset(frame_token)
+        _profile.reset(profile_token)
+
+def write_profile(profile:Profile, directory:str=PROFILE_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path=os.path.join(directory, f"{int(profile.started * 1000)}-{profile.profile_id}.folded")
+    with open(path, "w") as handle:
+        handle.write(profile.folded())
+    return path
+
+class ProfilingMiddleware:
+    # ASGI middleware: profiles a request when it carries the profile header or is picked by the
+    # sampling rate, and writes the folded stacks once the response (streamed or not) has been sent
+    def __init__(self, app, sample_rate:float=PROFILE_SAMPLE_RATE, directory:str=PROFILE_DIR,
+                header:str=PROFILE_HEADER, paths:Tuple[str, ...]=PROFILE_PATHS):
+        self.app=app
+        self.sample_rate=sample_rate
+        self.directory=directory
+        self.header=header.lower().encode()
+        self.paths=set(paths)
+        self.captured=0
+
+    def _wanted(self, scope:Dict) -> bool:
+        if scope["type"] !="http" or scope["path"] not in self.paths:
+            return False
+        for key, value in scope["headers"]:
+            if key==self.header:
+                return value not in (b"0", b"false", b"")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self._wanted(scope):
+            return await self.app(scope, receive, send)
+        with profile_request(f"{scope['method']} {scope['path']}") as profile:
+            async def send_with_id(message):
+                if message["type"]=="http.response.start":
+                    message["headers"]=list(message.get("headers", [])) + [
+                        (b"x-profile-id", profile.profile_id.encode())
+                    ]
+                await send(message)
+            await self.app(scope, receive, send_with_id)
+        try:
+            path=await asyncio.to_thread(write_profile, profile, self.directory)
+            self.captured +=1
+            logger.debug("profile written to %s", path)
+        except OSError as e:
+            logger.warning("could not write profile: %s", e)
+
+def load_profiles(directory:str) -> List[Dict[Tuple[str, ...], float]]:
+    profiles=[]
+    for path in sorted(glob.glob(os.path.join(directory, "*.folded"))):
+        stacks={}
+        with open(path) as handle:
+            for line in handle:
+                stack, _, micros=line.rstrip("\n").rpartition(" ")
+                if stack:
+                    stacks[tuple(stack.split(";"))]=int(micros) / 1e6
+        profiles.append(stacks)
+    return profiles
+
+def slowest_stages(profiles:List[Dict[Tuple[str, ...], float]], top:int=10,
+                inclusive:bool=False) -> List[Dict]:
+    # per stage across all captured requests: total, mean per request it appeared in, and worst case
+    per_stage={}
+    for stacks in profiles:
+        seen={}
+        for stack, seconds in stacks.items():
+            if inclusive:
+                # a stage's inclusive time is its own plus everything under it
+                for depth in range(1, len(stack) + 1):
+                    seen[stack[:depth]]=seen.get(stack[:depth], 0.0) + seconds
+            else:
+                seen[stack]=seen.get(stack, 0.0) + seconds
+        for stack, seconds in seen.items():
+            totals=per_stage.setdefault(stack, [0.0, 0, 0.0])
+            totals[0] +=seconds
+            totals[1] +=1
+            totals[2]=max(totals[2], seconds)
+    ranked=sorted(per_stage.items(), key=lambda item:(-item[1][0], item[0]))[:top]
+    return [
+        {"stage":";".join(stack), "total_ms":total * 1000, "requests":count,
+        "mean_ms":total / count * 1000, "max_ms":worst * 1000}
+        for stack, (total, count, worst) in ranked
+    ]
+
+def main():
+    parser=argparse.ArgumentParser(description="aggregate captured request profiles")
+    parser.add_argument("--dir", default=PROFILE_DIR)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--inclusive", action="store_true", help="rank stages including the time of stages nested in them")
+    args=parser.parse_args()
+
+    profiles=load_profiles(args.dir)
+    if not profiles:
+        print(f"no profiles in {args.dir}")
+        return
+    kind="inclusive" if args.inclusive else "self"
+    print(f"{len(profiles)} profiled requests, top {args.top} stages by total {kind} time")
+    print(f"{'total ms':>10}{'mean ms':>10}{'max ms':>10}{'requests':>10}  stage")
+    for row in slowest_stages(profiles, args.top, args.inclusive):
+        print(f"{row['total_ms']:>10.2f}{row['mean_ms']:>10.2f}{row['max_ms']:>10.2f}{row['requests']:>10}  {row['stage']}")
+
+if __name__=="__main__":
+    main()
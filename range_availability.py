@@ -0,0 +1,74 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from config import Config
+from slot_finder import Slot
+
+# slot times are handled as whole minutes since 1970-01-01 in local, naive time
+EPOCH=datetime(1970, 1, 1)
+EPOCH_ORDINAL=EPOCH.toordinal()
+MINUTES_PER_DAY=24 * 60
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY=3
+LUNCH_START_HOUR=12
+LUNCH_END_HOUR=14
+
+def to_minutes(value:datetime) -> int:
+    # wall-clock fields only, so an aware datetime counts in its own zone; seconds are dropped
+    return (value.toordinal() - EPOCH_ORDINAL) * MINUTES_PER_DAY + value.hour * 60 + value.minute
+
+def to_minutes_ceil(value:datetime) -> int:
+    return to_minutes(value) + (1 if value.second or value.microsecond else 0)
+
+def busy_arrays(busy_periods:List[Tuple[datetime, datetime]]) -> Tuple[np.ndarray, np.ndarray]:
+    # busy starts in order, with the running maximum of their ends: every slot test becomes one
+    # searchsorted, and overlapping or nested periods need no merging first
+    if not busy_periods:
+        empty=np.empty(0, dtype=np.int64)
+        return empty, empty
+    # ends round up, so a period ending at 10:00:30 still blocks a 10:00 slot
+    periods=np.array([(to_minutes(start), to_minutes_ceil(end)) for start, end in busy_periods], dtype=np.int64)
+    periods=periods[np.argsort(periods[:, 0], kind='stable')]
+    return periods[:, 0], np.maximum.accumulate(periods[:, 1])
+
+def free_slot_starts(start:datetime, end:datetime, busy_periods:List[Tuple[datetime, datetime]],
+                    now:datetime, duration_minutes:int=60, step_minutes:int=60) -> np.ndarray:
+    # the same slots find_free_slots gives for [start, end), for the whole span at once
+    first, last=to_minutes(start), to_minutes(end) - duration_minutes
+    if last < first:
+        return np.empty(0, dtype=np.int64)
+    grid=np.arange(first, last + 1, step_minutes, dtype=np.int64)
+    earliest=(now.replace(tzinfo=None) + timedelta(minutes=15) - EPOCH).total_seconds()
+
+    minute_of_day=grid % MINUTES_PER_DAY
+    weekday=(grid // MINUTES_PER_DAY + EPOCH_WEEKDAY) % 7
+    bookable=(
+        (minute_of_day >=Config.BUSINESS_HOURS_START * 60) & (minute_of_day < Config.BUSINESS_HOURS_END * 60)
+        & ~((minute_of_day >=LUNCH_START_HOUR * 60) & (minute_of_day < LUNCH_END_HOUR * 60))
+        & (weekday < 5)
+        & (grid * 60 > earliest)
+    )
+
+    busy_starts, busy_ends=busy_arrays(busy_periods)
+    if len(busy_starts):
+        # periods starting before the slot ends; the slot is taken if the latest end among them is past its start
+        before_end=np.searchsorted(busy_starts, grid + duration_minutes, side='left')
+        latest_end=np.where(before_end > 0, busy_ends[np.maximum(before_end - 1, 0)], np.iinfo(np.int64).min)
+        bookable &=latest_end <=grid
+    return grid[bookable]
+
+def find_free_slots_range(start:datetime, end:datetime, busy_periods:List[Tuple[datetime, datetime]],
+                        now:datetime, duration_minutes:int=60, step_minutes:int=60) -> List[Slot]:
+    starts=free_slot_starts(start, end, busy_periods, now, duration_minutes, step_minutes)
+    # numpy builds the datetime objects in one go; the display strings wait until something reads them
+    slot_starts=starts.astype('datetime64[m]').astype(object).tolist()
+    slot_ends=(starts + duration_minutes).astype('datetime64[m]').astype(object).tolist()
+    return [Slot(slot_start, slot_end) for slot_start, slot_end in zip(slot_starts, slot_ends)]
+
+def slots_by_day(slots:List[Dict]) -> Dict[date, List[Dict]]:
+    days={}
+    for slot in slots:
+        days.setdefault(slot['start'].date(), []).append(slot)
+    return days
@@ -0,0 +1,138 @@
+import contextvars
+import math
+import threading
+import time
+from typing import Callable, Dict, Hashable
+
+from config import Config
+
+# the Calendar API's default per-user quota works out to about 10 queries per second
+CALENDAR_RATE_LIMIT_PER_SECOND=getattr(Config, "CALENDAR_RATE_LIMIT_PER_SECOND", 10)
+CALENDAR_RATE_LIMIT_BURST=getattr(Config, "CALENDAR_RATE_LIMIT_BURST", 20)
+CALENDAR_RATE_LIMIT_MAX_WAIT_SECONDS=getattr(Config, "CALENDAR_RATE_LIMIT_MAX_WAIT_SECONDS", 2.0)
+CALENDAR_RATE_LIMIT_MAX_QUEUE=getattr(Config, "CALENDAR_RATE_LIMIT_MAX_QUEUE", 32)
+
+# how long the current job already queued before reaching the limiter, e.g. for a worker thread: it
+# counts against max_wait, so a caller never waits much longer than max_wait in total
+_queued_seconds=contextvars.ContextVar("rate_limit_queued_seconds", default=0.0)
+
+def set_queued_seconds(seconds:float) -> contextvars.Token:
+    return _queued_seconds.set(seconds)
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after:float):
+        super().__init__(f"calendar rate limit reached, retry in {retry_after:.1f}s")
+        self.retry_after=retry_after
+
+class TokenBucket:
+    # callers take their tokens up front, going into debt if the bucket is empty, and sleep until
+    # the debt is paid off. the wait is known at reservation time, so a caller that would wait
+    # longer than max_wait, or find max_queue others already waiting, is turned away immediately
+    def __init__(self, rate:float=CALENDAR_RATE_LIMIT_PER_SECOND, burst:float=CALENDAR_RATE_LIMIT_BURST,
+                max_wait:float=CALENDAR_RATE_LIMIT_MAX_WAIT_SECONDS, max_queue:int=CALENDAR_RATE_LIMIT_MAX_QUEUE):
+        self.rate=rate
+        self.burst=burst
+        self.max_wait=max_wait
+        self.max_queue=max_queue
+        self.acquired=0
+        self.delayed=0
+        self.rejected=0
+        self.waiting=0
+        self.wait_seconds=0.0
+        self._tokens=float(burst)
+        self._updated=time.monotonic()
+        self._lock=threading.Lock()
+
+    def acquire(self, tokens:float=1):
+        wait=self._reserve(tokens)
+        if wait <=0:
+            return
+        try:
+            time.sleep(wait)
+        finally:
+            with self._lock:
+                self.waiting -=1
+
+    def _reserve(self, tokens:float) -> float:
+        if self.rate <=0:
+            return 0.0
+        # a batch bigger than the bucket could never be paid for in one go
+        tokens=min(tokens, self.burst)
+        with self._lock:
+            self._refill()
+            wait=max(0.0, (tokens - self._tokens) / self.rate)
+            if wait > max(0.0, self.max_wait - _queued_seconds.get()) or (wait > 0 and self.waiting >=self.max_queue):
+                self.rejected +=1
+                raise RateLimitExceeded(wait)
+            self._tokens -=tokens
+            self.acquired +=1
+            if wait > 0:
+                self.waiting +=1
+                self.delayed +=1
+                self.wait_seconds +=wait
+            return wait
+
+    def _refill(self):
+        now=time.monotonic()
+        self._tokens=min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated=now
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "rate":self.rate,
+                "burst":self.burst,
+                "acquired":self.acquired,
+                "delayed":self.delayed,
+                "rejected":self.rejected,
+                "waiting":self.waiting,
+                "wait_seconds":round(self.wait_seconds, 3)
+            }
+
+class _Call:
+    def __init__(self):
+        self.done=threading.Event()
+        self.result=None
+        self.error=None
+
+class SingleFlight:
+    # concurrent calls with the same key share one execution: the first caller runs it and the
+    # rest block until its result (or exception) is ready. nothing is cached past that point
+    def __init__(self):
+        self.executed=0
+        self.shared=0
+        self._calls={}
+        self._lock=threading.Lock()
+
+    def do(self, key:Hashable, func:Callable, *args, **kwargs):
+        with self._lock:
+            call=self._calls.get(key)
+            leader=call is None
+            if leader:
+                call=_Call()
+                self._calls[key]=call
+                self.executed +=1
+            else:
+                self.shared +=1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result=func(*args, **kwargs)
+            return call.result
+        except BaseException as error:
+            call.error=error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"executed":self.executed, "shared":self.shared, "in_flight":len(self._calls)}
+
+def retry_after_seconds(error:RateLimitExceeded) -> int:
+    return max(1, math.ceil(error.retry_after))
@@ -0,0 +1,194 @@
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import Config
+from range_availability import MINUTES_PER_DAY, to_minutes
+from slot_finder import merge_intervals
+from slot_ranking import SlotRanker, slot_ranker
+
+SCHEDULER_STEP_MINUTES=getattr(Config, "SCHEDULER_STEP_MINUTES", 30)
+SCHEDULER_TIME_BUDGET_MS=getattr(Config, "SCHEDULER_TIME_BUDGET_MS", 50)
+SCHEDULER_MAX_MEETINGS=getattr(Config, "SCHEDULER_MAX_MEETINGS", 20)
+SCHEDULER_DEFAULT_GAP_MINUTES=getattr(Config, "SCHEDULER_DEFAULT_GAP_MINUTES", 30)
+SCHEDULER_DEFAULT_OCCURRENCES=getattr(Config, "SCHEDULER_DEFAULT_OCCURRENCES", 4)
+SCHEDULER_WEIGHT_CONSISTENCY=getattr(Config, "SCHEDULER_WEIGHT_CONSISTENCY", 2.0)
+
+class _OutOfTime(Exception):
+    pass
+
+@dataclass
+class ScheduleResult:
+    slots:List[Dict]=field(default_factory=list)
+    requested:int=0
+    score:float=0.0
+    # every meeting placed; optimal only when the search also finished inside its budget
+    complete:bool=False
+    optimal:bool=False
+    timed_out:bool=False
+    nodes:int=0
+    elapsed_ms:float=0.0
+
+class Scheduler:
+    # places several meetings at once. free slot starts become bit positions on one grid, every meeting
+    # gets a bitset of the positions inside its window, and a depth-first branch and bound search picks
+    # one position per meeting: a pick clears the positions too close to it (duration plus minimum gap)
+    # and, once its day is full, the rest of that day from every later meeting's bitset, so a dead end
+    # shows up as an empty bitset right away. the first dive is the greedy answer; the rest of the
+    # budget goes to improving the total slot score
+    def __init__(self, step_minutes:int=SCHEDULER_STEP_MINUTES, time_budget_ms:float=SCHEDULER_TIME_BUDGET_MS,
+                consistency_weight:float=SCHEDULER_WEIGHT_CONSISTENCY):
+        self.step_minutes=step_minutes
+        self.time_budget_ms=time_budget_ms
+        self.consistency_weight=consistency_weight
+
+    def solve(self, slots:List[Dict], busy_periods:Sequence[Tuple[datetime, datetime]],
+            windows:List[Tuple[datetime, datetime]], duration_minutes:int, min_gap_minutes:int=0,
+            max_per_day:Optional[int]=None, recurrence:Optional[str]=None,
+            preferred_hours:Optional[Sequence[int]]=None, time_budget_ms:Optional[float]=None) -> ScheduleResult:
+        # slots are the free slots for duration_minutes on this scheduler's step grid, windows hold one
+        # (start, end) per meeting. recurrence "daily" or "weekly" rewards keeping the same time across
+        # occurrences; preferred_hours replaces the ranker's preferred start hours
+        started=time.perf_counter()
+        budget=self.time_budget_ms if time_budget_ms is None else time_budget_ms
+        deadline=started + budget / 1000
+        result=ScheduleResult(requested=len(windows))
+        if not windows or not slots:
+            return result
+
+        step=self.step_minutes
+        origin=min(to_minutes(slot['start']) for slot in slots)
+        by_position={}
+        for slot in slots:
+            offset=to_minutes(slot['start']) - origin
+            if offset % step==0:
+                by_position[offset // step]=slot
+
+        ranker=SlotRanker(preferred_hours=preferred_hours) if preferred_hours else slot_ranker
+        merged=merge_intervals(busy_periods)
+        busy_starts=[start for start, _ in merged]
+        scores={position:ranker.score(slot, merged, busy_starts) for position, slot in by_position.items()}
+
+        day_of={}
+        day_masks={}
+        keys={}
+        for position, slot in by_position.items():
+            day=slot['start'].date()
+            day_of[position]=day
+            day_masks[day]=day_masks.get(day, 0) | 1 << position
+            minute_of_day=(origin + position * step) % MINUTES_PER_DAY
+            keys[position]=(day.weekday(), minute_of_day) if recurrence=="weekly" else minute_of_day
+
+        # meetings in window order. identical windows are interchangeable, so each one only looks at the
+        # candidates ranked below the one taken before it: every set of picks is still reachable, once
+        order=sorted(range(len(windows)), key=lambda index:(windows[index], index))
+        candidates=[]
+        for index in order:
+            window_start, window_end=windows[index]
+            mask=0
+            for position, slot in by_position.items():
+                if window_start <=slot['start'] and slot['end'] <=window_end:
+                    mask |=1 << position
+            candidates.append(mask)
+        same_as_previous=[
+            position > 0 and windows[order[position]]==windows[order[position - 1]] for position in range(len(order))
+        ]
+        # a meeting with nowhere to go can't be placed whatever the others do; the rest still can
+        placeable=[position for position, mask in enumerate(candidates) if mask]
+        candidates=[candidates[position] for position in placeable]
+        same_as_previous=[same_as_previous[position] and position - 1 in placeable for position in placeable]
+        count=len(candidates)
+        if not count:
+            result.elapsed_ms=(time.perf_counter() - started) * 1000
+            return result
+
+        bonus=self.consistency_weight if recurrence else 0.0
+        ranked=[]
+        for mask in candidates:
+            positions=[position for position in by_position if mask >> position & 1]
+            positions.sort(key=lambda position:(-scores[position], position))
+            ranked.append(positions)
+        # the most the meetings from j on could still add, for pruning. picks within a run of identical
+        # windows go down the ranking, so the i-th of them can at best get the i-th best score
+        remaining_bound=[0.0] * (count + 1)
+        run=[0] * count
+        for position in range(1, count):
+            run[position]=run[position - 1] + 1 if same_as_previous[position] else 0
+        for position in range(count - 1, -1, -1):
+            best_possible=scores[ranked[position][min(run[position], len(ranked[position]) - 1)]]
+            remaining_bound[position]=remaining_bound[position + 1] + best_possible + (bonus if position else 0.0)
+
+        reach=-(-(duration_minutes + min_gap_minutes) // step)
+        best_total=float("-inf")
+        best=None
+        deepest=[]
+        nodes=0
+
+        def conflicts(position:int) -> int:
+            # every position closer than duration plus gap, on either side
+            low=position - reach + 1
+            if low >=0:
+                return ((1 << (2 * reach - 1)) - 1) << low
+            return (1 << (position + reach)) - 1
+
+        def search(depth:int, masks:List[int], day_counts:Dict, picked:List[int], total:float, first_rank:int):
+            nonlocal best_total, best, deepest, nodes
+            if depth==count:
+                if total > best_total:
+                    best_total=total
+                    best=list(picked)
+                return
+            if len(picked) > len(deepest):
+                deepest=list(picked)
+            previous_key=keys[picked[-1]] if bonus and picked else None
+            mask=masks[0]
+            for rank in range(first_rank if same_as_previous[depth] else 0, len(ranked[depth])):
+                position=ranked[depth][rank]
+                if not mask >> position & 1:
+                    continue
+                # candidates come best first, so once even the best case can't win nothing after it can
+                if total + scores[position] + bonus + remaining_bound[depth + 1] <=best_total:
+                    break
+                gain=scores[position] + (bonus if previous_key is not None and keys[position]==previous_key else 0.0)
+                if total + gain + remaining_bound[depth + 1] <=best_total:
+                    continue
+                nodes +=1
+                # a clock read is cheap next to a node; checking only every so many let a slow stretch overrun
+                if time.perf_counter() > deadline:
+                    raise _OutOfTime()
+                blocked=conflicts(position)
+                day=day_of[position]
+                day_count=day_counts.get(day, 0) + 1
+                if max_per_day and day_count >=max_per_day:
+                    blocked |=day_masks[day]
+                next_masks=[]
+                for later in masks[1:]:
+                    later &=~blocked
+                    if not later:
+                        break
+                    next_masks.append(later)
+                else:
+                    picked.append(position)
+                    search(depth + 1, next_masks, {**day_counts, day:day_count}, picked, total + gain, rank + 1)
+                    picked.pop()
+
+        # the setup above spends the same budget: a search that starts past the deadline can't finish in it
+        timed_out=time.perf_counter() > deadline
+        if not timed_out:
+            try:
+                search(0, candidates, {}, [], 0.0, 0)
+            except _OutOfTime:
+                timed_out=True
+
+        chosen=best if best is not None else deepest
+        result.slots=sorted((by_position[position] for position in chosen), key=lambda slot:slot['start'])
+        result.score=best_total if best is not None else 0.0
+        result.complete=best is not None and count==len(windows)
+        result.optimal=result.complete and not timed_out
+        result.timed_out=timed_out
+        result.nodes=nodes
+        result.elapsed_ms=(time.perf_counter() - started) * 1000
+        return result
+
+scheduler=Scheduler()
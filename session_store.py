@@ -0,0 +1,190 @@
+import abc
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from config import Config
+
+SESSION_TTL_SECONDS=getattr(Config, "SESSION_TTL_SECONDS", 1800)
+SESSION_MAX_ENTRIES=getattr(Config, "SESSION_MAX_ENTRIES", 10000)
+SESSION_BACKEND=getattr(Config, "SESSION_BACKEND", "memory")
+SESSION_DB_PATH=getattr(Config, "SESSION_DB_PATH", "sessions.db")
+SESSION_MAX_TRANSCRIPT=getattr(Config, "SESSION_MAX_TRANSCRIPT", 200)
+
+def new_session_state() -> Dict:
+    return {
+        "current_slots":[],
+        "selected_slot":None,
+        "booking_request_id":None,
+        "booking_details":{},
+        "proposed_meetings":[],
+        "proposal_id":None,
+        "messages":[],
+        "transcript_offset":0,
+        "timezone":None
+    }
+
+def clear_booking_state(state:Dict):
+    state["current_slots"]=[]
+    state["selected_slot"]=None
+    state["booking_request_id"]=None
+    state["booking_details"]={}
+    state["proposed_meetings"]=[]
+    state["proposal_id"]=None
+
+def trim_transcript(state:Dict, max_messages:int=SESSION_MAX_TRANSCRIPT):
+    # cursors are absolute message indexes, so dropped messages move the offset forward
+    overflow=len(state["messages"]) - max_messages
+    if overflow > 0:
+        del state["messages"][:overflow]
+        state["transcript_offset"] +=overflow
+
+def transcript_session_id(messages:List[Dict]) -> str:
+    # read fallback for clients that send the whole history and never the session id: the transcript
+    # returned to them is exactly what they send back next turn
+    transcript=json.dumps([[msg["role"], msg["content"]] for msg in messages], separators=(",", ":"))
+    return "transcript-" + hashlib.sha256(transcript.encode("utf-8")).hexdigest()
+
+class SessionStore(abc.ABC):
+    def __init__(self, ttl_seconds:int=SESSION_TTL_SECONDS, max_entries:int=SESSION_MAX_ENTRIES):
+        self.ttl_seconds=ttl_seconds
+        self.max_entries=max_entries
+
+    @abc.abstractmethod
+    def load(self, session_id:str) -> Dict:
+        ...
+
+    @abc.abstractmethod
+    def save(self, session_id:str, state:Dict):
+        ...
+
+    @abc.abstractmethod
+    def delete(self, session_id:str):
+        ...
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        ...
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, ttl_seconds:int=SESSION_TTL_SECONDS, max_entries:int=SESSION_MAX_ENTRIES):
+        super().__init__(ttl_seconds, max_entries)
+        self._entries=OrderedDict()
+        self._lock=threading.Lock()
+
+    def load(self, session_id:str) -> Dict:
+        now=time.monotonic()
+        with self._lock:
+            entry=self._entries.get(session_id)
+            if entry is None:
+                return new_session_state()
+            expires_at, state=entry
+            if expires_at <=now:
+                del self._entries[session_id]
+                return new_session_state()
+            self._entries.move_to_end(session_id)
+            return pickle.loads(state)
+
+    def save(self, session_id:str, state:Dict):
+        # states are stored pickled so callers never share mutable slot lists between turns
+        payload=pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        now=time.monotonic()
+        with self._lock:
+            self._entries[session_id]=(now + self.ttl_seconds, payload)
+            self._entries.move_to_end(session_id)
+            self._evict(now)
+
+    def delete(self, session_id:str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def _evict(self, now:float):
+        while self._entries:
+            oldest_id, (expires_at, _)=next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <=self.max_entries:
+                break
+            del self._entries[oldest_id]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, path:str=SESSION_DB_PATH, ttl_seconds:int=SESSION_TTL_SECONDS,
+                max_entries:int=SESSION_MAX_ENTRIES):
+        super().__init__(ttl_seconds, max_entries)
+        self.path=path
+        self._local=threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, state BLOB NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions(accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn=getattr(self._local, "conn", None)
+        if conn is None:
+            conn=sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn=conn
+        return conn
+
+    def load(self, session_id:str) -> Dict:
+        now=time.time()
+        conn=self._connect()
+        row=conn.execute(
+            "SELECT state, expires_at FROM sessions WHERE session_id=?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return new_session_state()
+        if row[1] <=now:
+            conn.execute("DELETE FROM sessions WHERE session_id=?", (session_id,))
+            return new_session_state()
+        conn.execute("UPDATE sessions SET accessed_at=? WHERE session_id=?", (now, session_id))
+        return pickle.loads(row[0])
+
+    def save(self, session_id:str, state:Dict):
+        now=time.time()
+        payload=pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        conn=self._connect()
+        conn.execute(
+            "INSERT INTO sessions(session_id, state, expires_at, accessed_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET state=excluded.state, "
+            "expires_at=excluded.expires_at, accessed_at=excluded.accessed_at",
+            (session_id, payload, now + self.ttl_seconds, now)
+        )
+        self._evict(conn, now)
+
+    def delete(self, session_id:str):
+        self._connect().execute("DELETE FROM sessions WHERE session_id=?", (session_id,))
+
+    def _evict(self, conn:sqlite3.Connection, now:float):
+        conn.execute("DELETE FROM sessions WHERE expires_at <=?", (now,))
+        conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+def create_session_store(backend:Optional[str]=None) -> SessionStore:
+    backend=(backend or SESSION_BACKEND).lower()
+    if backend=="memory":
+        return MemorySessionStore()
+    if backend=="sqlite":
+        directory=os.path.dirname(SESSION_DB_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SQLiteSessionStore(SESSION_DB_PATH)
+    raise ValueError(f"unknown session backend:{backend}")
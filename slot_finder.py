@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from config import Config
+
+class Slot:
+    # a free slot. two fields per slot instead of a four-key dict: the display strings are formatted
+    # when read, and slot['start'] style access keeps working everywhere the dicts were used
+    __slots__=('start', 'end')
+    KEYS=('start', 'end', 'start_str', 'end_str')
+
+    def __init__(self, start:datetime, end:datetime):
+        self.start=start
+        self.end=end
+
+    def __getitem__(self, key:str):
+        if key=='start':
+            return self.start
+        if key=='end':
+            return self.end
+        if key=='start_str':
+            return self.start.strftime(Config.DATETIME_FORMAT)
+        if key=='end_str':
+            return self.end.strftime(Config.DATETIME_FORMAT)
+        raise KeyError(key)
+
+    def get(self, key:str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.KEYS
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Slot):
+            return self.start==other.start and self.end==other.end
+        if isinstance(other, dict):
+            return dict(self)==other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.start, self.end))
+
+    def __repr__(self) -> str:
+        return f"Slot({self.start!r}, {self.end!r})"
+
+def merge_intervals(intervals:List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    merged=[]
+    for start, end in sorted(intervals, key=lambda interval:interval[0]):
+        if merged and start <=merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1]=(merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def is_bookable(slot_start:datetime, now:datetime) -> bool:
+    return (Config.BUSINESS_HOURS_START <=slot_start.hour < Config.BUSINESS_HOURS_END and
+            slot_start > now + timedelta(minutes=15) and
+            slot_start.weekday() < 5 and
+            not (12 <=slot_start.hour < 14))
+
+def find_free_slots(start:datetime, end:datetime, busy_periods:List[Tuple[datetime, datetime]],
+                    now:datetime, duration_minutes:int=60, step_minutes:int=60) -> List[Slot]:
+    # candidates sit on the grid start + k*step; after a conflict we jump straight to the
+    # first grid point past the merged busy block instead of re-testing every step inside it
+    merged=merge_intervals(busy_periods)
+    duration=timedelta(minutes=duration_minutes)
+    step=timedelta(minutes=step_minutes)
+    slots=[]
+    busy_index=0
+    current_time=start
+
+    while current_time + duration <=end:
+        while busy_index < len(merged) and merged[busy_index][1] <=current_time:
+            busy_index +=1
+        slot_end=current_time + duration
+        if busy_index < len(merged) and merged[busy_index][0] < slot_end:
+            steps=-((current_time - merged[busy_index][1]) // step)
+            current_time +=step * max(steps, 1)
+            continue
+
+        if is_bookable(current_time, now):
+            slots.append(Slot(current_time, slot_end))
+        current_time +=step
+
+    return slots
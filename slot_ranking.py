@@ -0,0 +1,107 @@
+import heapq
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+from config import Config
+from slot_finder import merge_intervals
+
+SLOT_PREFERRED_HOURS=getattr(Config, "SLOT_PREFERRED_HOURS", (10, 11, 15, 16))
+SLOT_BUFFER_MINUTES=getattr(Config, "SLOT_BUFFER_MINUTES", 30)
+SLOT_MIN_USEFUL_MINUTES=getattr(Config, "SLOT_MIN_USEFUL_MINUTES", 30)
+SLOT_SUGGESTIONS=getattr(Config, "SLOT_SUGGESTIONS", 5)
+SLOT_WEIGHT_PREFERENCE=getattr(Config, "SLOT_WEIGHT_PREFERENCE", 3.0)
+SLOT_WEIGHT_BUFFER=getattr(Config, "SLOT_WEIGHT_BUFFER", 1.0)
+SLOT_WEIGHT_FRAGMENTATION=getattr(Config, "SLOT_WEIGHT_FRAGMENTATION", 1.0)
+SLOT_WEIGHT_SPREAD=getattr(Config, "SLOT_WEIGHT_SPREAD", 1.5)
+ZERO=timedelta(0)
+
+@lru_cache(maxsize=1024)
+def _business_hours(day:date) -> Tuple[datetime, datetime]:
+    midnight=datetime.combine(day, datetime.min.time())
+    return midnight.replace(hour=Config.BUSINESS_HOURS_START), midnight.replace(hour=Config.BUSINESS_HOURS_END)
+
+class SlotRanker:
+    # scores each free slot on its own (preferred hour, breathing room next to meetings, free time it
+    # leaves stranded), then picks the best k greedily from a heap with a penalty per pick already on
+    # the same day, so a week-long window doesn't come back as five slots on Monday morning
+    def __init__(self, preferred_hours:Sequence[int]=SLOT_PREFERRED_HOURS,
+                buffer_minutes:int=SLOT_BUFFER_MINUTES, min_useful_minutes:int=SLOT_MIN_USEFUL_MINUTES,
+                preference_weight:float=SLOT_WEIGHT_PREFERENCE, buffer_weight:float=SLOT_WEIGHT_BUFFER,
+                fragmentation_weight:float=SLOT_WEIGHT_FRAGMENTATION, spread_weight:float=SLOT_WEIGHT_SPREAD):
+        self.preferred_hours=frozenset(preferred_hours)
+        self.buffer=timedelta(minutes=buffer_minutes)
+        self.min_useful=timedelta(minutes=min_useful_minutes)
+        self.preference_weight=preference_weight
+        self.buffer_weight=buffer_weight
+        self.fragmentation_weight=fragmentation_weight
+        self.spread_weight=spread_weight
+        # the distance from each hour of the day to the nearest preferred one, worked out once
+        self._preference=[self._hour_preference(hour) for hour in range(24)]
+
+    def _hour_preference(self, hour:int) -> float:
+        if not self.preferred_hours:
+            return 0.0
+        distance=min(abs(hour - preferred) for preferred in self.preferred_hours)
+        return 1.0 / (1 + distance)
+
+    def rank(self, slots:List[Dict], busy_periods:Sequence[Tuple[datetime, datetime]]=(),
+            k:int=SLOT_SUGGESTIONS) -> List[Dict]:
+        if k <=0 or not slots:
+            return []
+        merged=merge_intervals(busy_periods)
+        busy_starts=[start for start, _ in merged]
+
+        # (negated score, start, end, index): the smallest entry is the best slot, and ties always
+        # go to the earlier slot, so the same calendar gives the same suggestions every time
+        scores=[self.score(slot, merged, busy_starts) for slot in slots]
+        heap=[(-score, slot['start'], slot['end'], index) for index, (slot, score) in enumerate(zip(slots, scores))]
+        heapq.heapify(heap)
+
+        picked=[]
+        picks_per_day={}
+        while heap and len(picked) < k:
+            key, start, end, index=heapq.heappop(heap)
+            # scores only ever drop as days fill up, so an entry still at least as good as the next
+            # one once its day's penalty is applied is the true best; otherwise it goes back in
+            day=start.date()
+            penalized=self.spread_weight * picks_per_day.get(day, 0) - scores[index]
+            if penalized > key and heap and (penalized, start, end, index) > heap[0]:
+                heapq.heappush(heap, (penalized, start, end, index))
+                continue
+            picked.append(slots[index])
+            picks_per_day[day]=picks_per_day.get(day, 0) + 1
+        return picked
+
+    def score(self, slot:Dict, merged:List[Tuple[datetime, datetime]], busy_starts:List[datetime]) -> float:
+        start, end=slot['start'], slot['end']
+        day_start, day_end=_business_hours(start.date())
+
+        # the free stretch holding this slot runs from the previous meeting to the next one that day
+        position=bisect_right(busy_starts, start)
+        previous_end=merged[position - 1][1] if position > 0 else day_start
+        next_start=merged[position][0] if position < len(merged) else day_end
+        before=start - previous_end if previous_end > day_start else None
+        after=next_start - end if next_start < day_end else None
+
+        buffer_score=1.0
+        if before is not None and before < self.buffer:
+            buffer_score -=0.5 * (1 - before / self.buffer)
+        if after is not None and after < self.buffer:
+            buffer_score -=0.5 * (1 - after / self.buffer)
+
+        # leftover pieces too short for anything useful count against the slot
+        fragmentation_score=1.0
+        if ZERO < (start - day_start if before is None else before) < self.min_useful:
+            fragmentation_score -=0.5
+        if ZERO < (day_end - end if after is None else after) < self.min_useful:
+            fragmentation_score -=0.5
+
+        return (
+            self.preference_weight * self._preference[start.hour]
+            + self.buffer_weight * buffer_score
+            + self.fragmentation_weight * fragmentation_score
+        )
+
+slot_ranker=SlotRanker()
@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 from datetime import datetime
 from typing import List, Dict
 
@@ -43,20 +44,26 @@ if "conversation_history" not in st.session_state:
     st.session_state.conversation_history = []
 if "booking_confirmed" not in st.session_state:
     st.session_state.booking_confirmed = False
+if "session_id" not in st.session_state:
+    st.session_state.session_id = None
+if "cursor" not in st.session_state:
+    st.session_state.cursor = 0
 
 def send_message(message: str) -> Dict:
     try:
+        # the server keeps the transcript, so only the new message and our cursor go over the wire
         payload = {
             "message": message,
-            "conversation_history": [
-                {"role": msg["role"], "content": msg["content"]}
-                for msg in st.session_state.conversation_history
-            ]
+            "session_id": st.session_state.session_id,
+            "cursor": st.session_state.cursor
         }
         
         response = requests.post("http://localhost:8000/chat", json=payload, timeout=30)
         if response.status_code == 200:
-            return response.json()
+            result = response.json()
+            st.session_state.session_id = result.get("session_id")
+            st.session_state.cursor = result.get("cursor") or st.session_state.cursor
+            return result
         else:
             return {
                 "response": "is server running?",
@@ -70,6 +77,48 @@ def send_message(message: str) -> Dict:
             "booking_confirmed": False
         }
 
+def stream_message(message: str, placeholder) -> Dict:
+    # server-sent events: an ack, the reply section by section, then the final state
+    payload = {
+        "message": message,
+        "session_id": st.session_state.session_id,
+        "cursor": st.session_state.cursor
+    }
+    text = ""
+    result = None
+    try:
+        with requests.post("http://localhost:8000/chat/stream", json=payload, stream=True, timeout=30) as response:
+            if response.status_code != 200:
+                return send_message(message)
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):])
+                    if event == "ack":
+                        st.session_state.session_id = data.get("session_id")
+                        placeholder.markdown('<div class="assistant-message"><strong>AI Assistant:</strong><br>...</div>',
+                                        unsafe_allow_html=True)
+                    elif event == "section":
+                        text += data["text"]
+                        formatted_content = text.replace('\n', '<br>')
+                        placeholder.markdown(f'<div class="assistant-message"><strong>AI Assistant:</strong><br>{formatted_content}</div>',
+                                        unsafe_allow_html=True)
+                    elif event == "state":
+                        result = data
+    except:
+        pass
+    if result is None:
+        return {
+            "response": text or "Please make sure the backend server is running.",
+            "conversation_history": st.session_state.conversation_history,
+            "booking_confirmed": False
+        }
+    st.session_state.session_id = result.get("session_id")
+    st.session_state.cursor = result.get("cursor") or st.session_state.cursor
+    return result
+
 def display_message(message: Dict):
     role = message["role"]
     content = message["content"]
@@ -124,6 +173,8 @@ with st.sidebar:
     if st.button("New Conversation"):
         st.session_state.conversation_history = []
         st.session_state.booking_confirmed = False
+        st.session_state.session_id = None
+        st.session_state.cursor = 0
         st.rerun()
 
 st.markdown("### Conversation")
@@ -154,8 +205,8 @@ if user_input:
         "content": user_input
     })
     
-    with st.spinner("🤖 Processing..."):
-        result = send_message(user_input)
+    display_message({"role": "user", "content": user_input})
+    result = stream_message(user_input, st.empty())
     st.session_state.conversation_history.append({
         "role":"assistant",
         "content":result["response"]
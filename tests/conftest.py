@@ -0,0 +1,10 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+# main builds its BookingAgent at import time: the fake calendar and an in-memory journal keep the tests offline
+Config.CALENDAR_BACKEND="fake"
+Config.BOOKING_JOURNAL_PATH=":memory:"
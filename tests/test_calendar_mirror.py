@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from typing import Dict, Set, Tuple
+
+import pytest
+
+from calendar_backends import FakeCalendarBackend
+from calendar_mirror import CalendarMirror
+from calendar_service import CalendarService
+from config import Config
+from rate_limit import TokenBucket
+
+class ExpiringTokenBackend(FakeCalendarBackend):
+    # answers the next incremental sync with 410 Gone, as the API does once a sync token has expired
+    def __init__(self):
+        super().__init__(pattern="empty")
+        self.expire=False
+
+    def sync_events(self, calendar_id:str, sync_token=None, *args) -> Dict:
+        if sync_token is not None and self.expire:
+            self.expire=False
+            raise self._http_error(410)
+        return super().sync_events(calendar_id, sync_token, *args)
+
+@pytest.fixture
+def backend():
+    return ExpiringTokenBackend()
+
+@pytest.fixture
+def service(backend, tmp_path):
+    return CalendarService(
+        backend=backend, rate_limiter=TokenBucket(rate=0), mirror=CalendarMirror(str(tmp_path / "mirror.db"), days=14)
+    )
+
+def window(service:CalendarService):
+    return service.mirror.full_sync_window(datetime.now(service.timezone).date())
+
+def event_body(service:CalendarService, day_offset:int, hour:int, title:str) -> Dict:
+    first_day, _=window(service)
+    start=service.timezone.localize(datetime.combine(first_day + timedelta(days=day_offset), datetime.min.time()).replace(hour=hour))
+    return {
+        'summary':title,
+        'start':{'dateTime':start.isoformat(), 'timeZone':Config.TIMEZONE},
+        'end':{'dateTime':(start + timedelta(hours=1)).isoformat(), 'timeZone':Config.TIMEZONE}
+    }
+
+def event_starts(service:CalendarService, events) -> Set[Tuple]:
+    return {(event['id'], service._parse_utc(event['start']['dateTime']).timestamp()) for event in events}
+
+def in_sync(service:CalendarService, backend:FakeCalendarBackend) -> bool:
+    window_start, window_end=service._days_window(*window(service))
+    truth=backend.list_events(Config.CALENDAR_ID, window_start.isoformat(), window_end.isoformat())['items']
+    mirrored=service.mirror.events_between(Config.CALENDAR_ID, window_start, window_end)
+    return event_starts(service, mirrored)==event_starts(service, truth)
+
+def test_incremental_sync_follows_inserts_updates_and_deletes(service, backend):
+    created=[backend.insert_event(Config.CALENDAR_ID, event_body(service, day, 10, f"Event {day}"))['id'] for day in range(3)]
+    assert service.sync_mirror()==3
+    assert in_sync(service, backend)
+
+    backend.insert_event(Config.CALENDAR_ID, event_body(service, 4, 11, "New"))
+    backend.update_event(Config.CALENDAR_ID, created[0], event_body(service, 5, 15, "Moved"))
+    backend.delete_event(Config.CALENDAR_ID, created[1])
+    assert service.sync_mirror()==3
+    assert in_sync(service, backend)
+    assert service.mirror.full_syncs==1
+    assert service.mirror.incremental_syncs==1
+
+    # nothing changed: an incremental sync that brings back no events
+    assert service.sync_mirror()==0
+    assert service.mirror.incremental_syncs==2
+
+def test_expired_sync_token_runs_a_full_sync(service, backend):
+    backend.insert_event(Config.CALENDAR_ID, event_body(service, 1, 10, "Kept"))
+    service.sync_mirror()
+    backend.insert_event(Config.CALENDAR_ID, event_body(service, 2, 10, "Added"))
+    backend.expire=True
+    # the full sync brings back the whole window, not only what changed
+    assert service.sync_mirror()==2
+    assert service.mirror.full_syncs==2
+    assert service.mirror.incremental_syncs==0
+    assert in_sync(service, backend)
+
+def test_covers_only_the_synced_window(service):
+    first_day, last_day=window(service)
+    assert not service.mirror.covers([Config.CALENDAR_ID], first_day, last_day)
+    service.sync_mirror()
+    assert service.mirror.covers([Config.CALENDAR_ID], first_day, last_day)
+    assert not service.mirror.covers([Config.CALENDAR_ID], first_day - timedelta(days=1), last_day)
+    assert not service.mirror.covers([Config.CALENDAR_ID], first_day, last_day + timedelta(days=1))
+    assert not service.mirror.covers(["someone@example.com"], first_day, last_day)
@@ -0,0 +1,32 @@
+import json
+import os
+from datetime import date
+from typing import Dict
+
+import pytest
+
+from entity_extractor import ExtractedEntities, entity_extractor
+
+GOLDEN_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), "entity_golden.jsonl")
+# golden dates are resolved against a fixed Wednesday so the file never goes stale
+REFERENCE_DAY=date(2025, 1, 8)
+
+def load_cases():
+    with open(GOLDEN_PATH, encoding="utf-8") as golden_file:
+        return [json.loads(line) for line in golden_file if line.strip()]
+
+def as_golden(result:ExtractedEntities) -> Dict:
+    return {
+        "date":result.date.isoformat() if result.date else None,
+        "date_range":[day.isoformat() for day in result.date_range] if result.date_range else None,
+        "time_period":result.time_period,
+        "start_time":result.start_time.strftime("%H:%M") if result.start_time else None,
+        "end_time":result.end_time.strftime("%H:%M") if result.end_time else None,
+        "duration_minutes":result.duration_minutes,
+        "attendees":result.attendees,
+        "confidence":result.confidence
+    }
+
+@pytest.mark.parametrize("case", load_cases(), ids=lambda case:case["text"])
+def test_golden_utterance(case):
+    assert as_golden(entity_extractor.extract(case["text"], REFERENCE_DAY))==case["expected"]
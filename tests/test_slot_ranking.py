@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+import pytest
+
+from slot_ranking import SlotRanker
+
+def at(day:int, clock:str, minutes:int) -> Dict:
+    # a slot on the given day of the week of Monday 2025-01-06
+    start=datetime(2025, 1, 6 + day, *map(int, clock.split(":")))
+    return {'start':start, 'end':start + timedelta(minutes=minutes)}
+
+def busy_at(day:int, clock:str, minutes:int) -> Tuple[datetime, datetime]:
+    slot=at(day, clock, minutes)
+    return slot['start'], slot['end']
+
+# one case per scoring dimension with the others weighted out, then the tie-break; business hours 9-18.
+# (name, ranker, candidates, busy, k, expected picks in order)
+RANKING_CASES=[
+    ("preferred hours", SlotRanker(preferred_hours=(10, 15), buffer_weight=0, fragmentation_weight=0, spread_weight=0),
+    [at(0, f"{hour}:00", 60) for hour in range(9, 18)], [], 3,
+    ["Mon 10:00-11:00", "Mon 15:00-16:00", "Mon 09:00-10:00"]),
+    # right after the 10-11 meeting: no gap scores 0.5, 15 minutes 0.75, the full 30 minutes 1.0
+    ("buffer", SlotRanker(preference_weight=0, fragmentation_weight=0, spread_weight=0),
+    [at(0, "9:30", 30), at(0, "11:00", 30), at(0, "11:15", 30), at(0, "11:30", 30), at(0, "9:00", 30)],
+    [busy_at(0, "10:00", 60)], 3,
+    ["Mon 09:00-09:30", "Mon 11:30-12:00", "Mon 11:15-11:45"]),
+    # between meetings at 10 and 12, a slot that strands 15 minutes on both sides scores 0
+    ("fragmentation", SlotRanker(preference_weight=0, buffer_weight=0, spread_weight=0),
+    [at(0, "9:15", 30), at(0, "11:15", 30), at(0, "9:00", 30), at(0, "11:00", 30), at(0, "13:15", 30)],
+    [busy_at(0, "10:00", 60), busy_at(0, "12:00", 60)], 3,
+    ["Mon 09:00-09:30", "Mon 11:00-11:30", "Mon 13:15-13:45"]),
+    # Monday's slots score 5, Tuesday's 9:00 scores 3.5: a second Monday pick drops to 3
+    ("day spread", SlotRanker(preferred_hours=(10, 11, 15), spread_weight=2.0),
+    [at(0, "10:00", 60), at(0, "11:00", 60), at(0, "15:00", 60), at(1, "9:00", 60)], [], 3,
+    ["Mon 10:00-11:00", "Tue 09:00-10:00", "Mon 11:00-12:00"]),
+    ("no day spread", SlotRanker(preferred_hours=(10, 11, 15), spread_weight=0),
+    [at(0, "10:00", 60), at(0, "11:00", 60), at(0, "15:00", 60), at(1, "9:00", 60)], [], 3,
+    ["Mon 10:00-11:00", "Mon 11:00-12:00", "Mon 15:00-16:00"]),
+    # equal scores go to the earlier start, then the earlier end, whatever the input order
+    ("tie-break", SlotRanker(preferred_hours=(10, 16)),
+    [at(0, "16:00", 60), at(0, "10:00", 60), at(0, "10:00", 30)], [], 3,
+    ["Mon 10:00-10:30", "Mon 10:00-11:00", "Mon 16:00-17:00"])
+]
+
+@pytest.mark.parametrize("name,ranker,slots,busy,k,expected", RANKING_CASES, ids=[case[0] for case in RANKING_CASES])
+def test_fixed_calendar_ranking(name, ranker, slots, busy, k, expected):
+    picked=[f"{slot['start']:%a %H:%M}-{slot['end']:%H:%M}" for slot in ranker.rank(slots, busy, k)]
+    assert picked==expected
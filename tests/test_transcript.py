@@ -0,0 +1,95 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from booking_agent import BookingAgent
+from booking_journal import BookingJournal
+from calendar_backends import FakeCalendarBackend
+from calendar_service import CalendarService
+from rate_limit import TokenBucket
+from session_store import SESSION_MAX_TRANSCRIPT, MemorySessionStore, new_session_state, trim_transcript
+
+def build_history(turns:int):
+    history=[]
+    for turn in range(turns):
+        history.append({"role":"user", "content":f"check my availability on friday ({turn})"})
+        history.append({"role":"assistant", "content":f"reply {turn}"})
+    return history
+
+@pytest.fixture
+def client():
+    main.booking_agent=BookingAgent(
+        calendar_service=CalendarService(backend=FakeCalendarBackend(), rate_limiter=TokenBucket(rate=0), mirror=None),
+        session_store=MemorySessionStore(), booking_journal=BookingJournal(":memory:")
+    )
+    return TestClient(main.app)
+
+def stored_session(session_id:str, messages):
+    state=new_session_state()
+    state["messages"]=messages
+    main.booking_agent.session_store.save(session_id, state)
+
+def test_cursor_returns_only_new_messages(client):
+    stored_session("delta", build_history(5))
+    body=client.post("/chat", json={"message":"hello", "session_id":"delta", "cursor":10}).json()
+    assert body["cursor"]==12
+    assert [msg["role"] for msg in body["conversation_history"]]==["user", "assistant"]
+    assert body["conversation_history"][0]["content"]=="hello"
+
+def test_stale_cursor_replays_missed_messages(client):
+    stored_session("delta", build_history(5))
+    client.post("/chat", json={"message":"hello", "session_id":"delta", "cursor":10})
+    # the client never saw the last reply: resending its old cursor gets that turn again along with the new one
+    body=client.post("/chat", json={"message":"hi", "session_id":"delta", "cursor":10}).json()
+    assert body["cursor"]==14
+    assert [msg["content"] for msg in body["conversation_history"][::2]]==["hello", "hi"]
+
+def test_trim_transcript_moves_offset():
+    state=new_session_state()
+    state["messages"]=build_history(5)
+    trim_transcript(state, max_messages=4)
+    assert state["messages"]==build_history(5)[6:]
+    assert state["transcript_offset"]==6
+
+def test_trimmed_transcript_keeps_absolute_cursor(client):
+    stored_session("long", build_history(SESSION_MAX_TRANSCRIPT))
+    cursor=SESSION_MAX_TRANSCRIPT * 2
+    body=client.post("/chat", json={"message":"hello", "session_id":"long", "cursor":cursor}).json()
+    state=main.booking_agent.session_store.load("long")
+    assert body["cursor"]==cursor + 2
+    assert len(state["messages"])==SESSION_MAX_TRANSCRIPT
+    assert state["transcript_offset"]==cursor + 2 - SESSION_MAX_TRANSCRIPT
+    # a cursor from before the trim gets everything still kept
+    body=client.post("/chat", json={"message":"hi", "session_id":"long", "cursor":0}).json()
+    assert len(body["conversation_history"])==SESSION_MAX_TRANSCRIPT
+
+def legacy_turns(client:TestClient, messages):
+    # a client that only ever sends back the history it was given, never the session id
+    history=[]
+    replies=[]
+    for message in messages:
+        body=client.post("/chat", json={"message":message, "conversation_history":history}).json()
+        history=body["conversation_history"]
+        replies.append(body)
+    return replies
+
+def test_legacy_client_books_without_session_id(client):
+    replies=legacy_turns(client, ["book a meeting on monday morning", "2", "yes"])
+    assert "2." in replies[0]["response"]
+    assert "Please select a number" not in replies[1]["response"]
+    assert replies[2]["booking_confirmed"]
+
+def test_legacy_clients_get_their_own_sessions(client):
+    first=legacy_turns(client, ["book a meeting on monday morning"])[0]
+    second=legacy_turns(client, ["book a meeting on monday morning"])[0]
+    assert first["session_id"] !=second["session_id"]
+
+def test_retried_legacy_turn_keeps_its_state(client):
+    listing=legacy_turns(client, ["book a meeting on monday morning"])[0]
+    history=listing["conversation_history"]
+    # the first try of the selection was lost on the way back: the client sends the same turn again
+    for _ in range(2):
+        body=client.post("/chat", json={"message":"2", "conversation_history":history}).json()
+        assert "Please select a number" not in body["response"]
+    confirmed=client.post("/chat", json={"message":"yes", "conversation_history":body["conversation_history"]}).json()
+    assert confirmed["booking_confirmed"]
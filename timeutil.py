@@ -0,0 +1,149 @@
+import contextvars
+import threading
+from bisect import bisect_right
+from datetime import datetime, timedelta, tzinfo, UTC
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+import pytz
+
+from config import Config
+
+TIMEZONE_HORIZON_DAYS=getattr(Config, "TIMEZONE_HORIZON_DAYS", 730)
+
+# the zone of whoever the current request is for; None means Config.TIMEZONE
+_user_zone=contextvars.ContextVar("user_zone", default=None)
+
+@lru_cache(maxsize=256)
+def zone(name:Optional[str]=None) -> tzinfo:
+    # raises pytz.UnknownTimeZoneError for names outside the tz database
+    return pytz.timezone(name or Config.TIMEZONE)
+
+def known_zone(name:str) -> bool:
+    try:
+        zone(name)
+    except pytz.UnknownTimeZoneError:
+        return False
+    return True
+
+class LocalTime:
+    # one zone's UTC offsets as a table: the instants (naive UTC) where the offset changes over the
+    # horizon and the offset in force from each one on. converting a UTC time is then one bisect and one
+    # addition instead of a pytz astimezone; anything outside the table goes through pytz as before
+    def __init__(self, name:Optional[str]=None, horizon_days:int=TIMEZONE_HORIZON_DAYS):
+        self.name=name or Config.TIMEZONE
+        self.zone=zone(self.name)
+        self.horizon_days=horizon_days
+        self._lock=threading.Lock()
+        self._table=self._build(datetime.now(UTC).replace(tzinfo=None))
+
+    def _exact_offset(self, utc:datetime) -> timedelta:
+        return pytz.utc.localize(utc).astimezone(self.zone).utcoffset()
+
+    def _build(self, around:datetime) -> tuple:
+        # a year back for recent history, the horizon ahead for everything bookable
+        low=(around - timedelta(days=366)).replace(hour=0, minute=0, second=0, microsecond=0)
+        high=low + timedelta(days=366 + self.horizon_days)
+        transitions=[]
+        offsets=[self._exact_offset(low)]
+        day=low
+        while day < high:
+            following=day + timedelta(days=1)
+            if self._exact_offset(following) !=offsets[-1]:
+                # narrow the change down to the second it happens
+                before, after=day, following
+                while after - before > timedelta(seconds=1):
+                    middle=before + (after - before) / 2
+                    if self._exact_offset(middle)==offsets[-1]:
+                        before=middle
+                    else:
+                        after=middle
+                after=after.replace(microsecond=0)
+                transitions.append(after)
+                offsets.append(self._exact_offset(after))
+            day=following
+        # rebuilt once now is halfway through the horizon, so the table always reaches well ahead
+        return transitions, offsets, low, high, around + timedelta(days=self.horizon_days // 2)
+
+    def _current_table(self, utc_now:datetime) -> tuple:
+        table=self._table
+        if utc_now >=table[4]:
+            with self._lock:
+                if utc_now >=self._table[4]:
+                    self._table=self._build(utc_now)
+                table=self._table
+        return table
+
+    def offset(self, utc:datetime) -> timedelta:
+        transitions, offsets, low, high, _=self._table
+        if low <=utc < high:
+            return offsets[bisect_right(transitions, utc)]
+        return self._exact_offset(utc)
+
+    def now(self) -> datetime:
+        utc_now=datetime.now(UTC).replace(tzinfo=None)
+        transitions, offsets, low, high, _=self._current_table(utc_now)
+        return utc_now + offsets[bisect_right(transitions, utc_now)]
+
+    def to_local(self, value:datetime) -> datetime:
+        # aware -> naive local time in this zone; naive values are taken to be local already
+        if value.tzinfo is None:
+            return value
+        utc=value.replace(tzinfo=None) - value.utcoffset()
+        return utc + self.offset(utc)
+
+    def localize(self, value:datetime) -> datetime:
+        # naive local time -> aware; pytz picks the side of a DST change the same way it always has
+        if value.tzinfo is None:
+            return self.zone.localize(value)
+        return value
+
+    def to_utc(self, value:datetime) -> datetime:
+        return self.localize(value).astimezone(pytz.UTC)
+
+    def parse_many(self, values:Iterable[str]) -> List[datetime]:
+        # ISO timestamps -> naive local times in one pass. UTC values ("...Z", what free/busy sends when
+        # asked for UTC, or "+00:00") skip the offset parsing entirely; other offsets are honoured; values
+        # without one, and all-day dates, are taken as local already. raises ValueError on the first
+        # malformed value
+        transitions, offsets, low, high, _=self._table
+        constant=offsets[0] if not transitions else None
+        parse=datetime.fromisoformat
+        local=[]
+        append=local.append
+        for value in values:
+            if value[-1:]=='Z':
+                utc=parse(value[:-1])
+            elif value[-6:]=='+00:00':
+                utc=parse(value[:-6])
+            elif 'T' in value:
+                parsed=parse(value)
+                if parsed.tzinfo is None:
+                    append(parsed)
+                    continue
+                utc=parsed.replace(tzinfo=None) - parsed.utcoffset()
+            else:
+                append(parse(value))
+                continue
+            if low <=utc < high:
+                append(utc + (constant if constant is not None else offsets[bisect_right(transitions, utc)]))
+            else:
+                append(utc + self._exact_offset(utc))
+        return local
+
+@lru_cache(maxsize=256)
+def local_time(name:Optional[str]=None) -> LocalTime:
+    return LocalTime(name or Config.TIMEZONE)
+
+def set_user_zone(name:Optional[str]) -> contextvars.Token:
+    return _user_zone.set(name)
+
+def reset_user_zone(token:contextvars.Token):
+    _user_zone.reset(token)
+
+def user_zone() -> str:
+    return _user_zone.get() or Config.TIMEZONE
+
+def user_now() -> datetime:
+    # the current wall-clock time where the user is: what "today" and "tomorrow" mean to them
+    return local_time(user_zone()).now()